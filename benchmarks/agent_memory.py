@@ -0,0 +1,78 @@
+"""
+Memory footprint of agents and tasks.
+
+Builds the tasks and agents of a configuration (with its behavior tree and decision-making plugin),
+runs `--ticks` kinematic updates so that the agents' tracks are filled as in a long run,
+and reports the memory allocated per agent and per task, measured with `tracemalloc`, against the baseline
+measured before agents, tasks and nodes had `__slots__` and the agent track was a ring buffer.
+With `--check`, exits with an error if a measurement is outside its expected range (a memory regression).
+
+Usage:
+    python benchmarks/agent_memory.py --config=config.yaml --agents 1000 10000 --ticks 400 --check
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # `bt_xml/` is resolved from the repository root
+
+# Measured with `config.yaml`, 1000 and 10000 agents, 400 ticks (the figures do not depend on the agent quantity)
+BASELINE_BYTES_PER_AGENT = 47440  # Attribute dicts, and a track list of up to `agent_track_size` tuples
+BASELINE_BYTES_PER_TASK = 309
+EXPECTED_BYTES_PER_AGENT = (4000, 7000)  # About 5550 since `__slots__` and the float32 ring buffer track
+EXPECTED_BYTES_PER_TASK = (150, 280)  # About 237
+
+
+def measure(config_file, agent_quantity, ticks):
+    import random
+    from modules.utils import load_config
+    config = load_config(config_file)
+    config['agents']['quantity'] = agent_quantity
+    rng = random.Random(0)
+
+    import pygame
+    pygame.init()
+    from modules.task import TaskStore, generate_tasks
+    from modules.agent import generate_agents
+
+    tasks = TaskStore(config)  # Task colors are generated here, outside the measurement
+    tracemalloc.start()
+    before_tasks = tracemalloc.get_traced_memory()[0]
+    generate_tasks(tasks, config, rng)
+    before_agents = tracemalloc.get_traced_memory()[0]
+    agents = generate_agents(tasks, config, rng, 0)
+    for _ in range(ticks):
+        for agent in agents:
+            agent.update()
+    after_agents = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after_agents - before_agents) / len(agents), (before_agents - before_tasks) / len(tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory allocated per agent and per task.")
+    parser.add_argument("--config", type=str, default="config.yaml", help="Path to the configuration file (default: config.yaml)")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000], help="Agent quantities to measure (default: 1000)")
+    parser.add_argument("--ticks", type=int, default=400, help="Kinematic updates before measuring (default: 400, the default `agent_track_size`)")
+    parser.add_argument("--check", action="store_true", help="Exit with an error if a measurement is outside its expected range")
+    args = parser.parse_args()
+
+    if len(args.agents) > 1:
+        # Each measurement runs in a fresh interpreter so that allocations of one measurement do not affect the next
+        import subprocess
+        for agent_quantity in args.agents:
+            subprocess.run([sys.executable, __file__, f"--config={args.config}", "--agents", str(agent_quantity), "--ticks", str(args.ticks)] + (["--check"] if args.check else []), check=True)
+    else:
+        agent_quantity = args.agents[0]
+        bytes_per_agent, bytes_per_task = measure(args.config, agent_quantity, args.ticks)
+        print(f"agents: {agent_quantity:>6}; ticks: {args.ticks:>4}; "
+              f"bytes/agent: {bytes_per_agent:>10.1f} ({bytes_per_agent / BASELINE_BYTES_PER_AGENT:.0%} of baseline {BASELINE_BYTES_PER_AGENT}); "
+              f"bytes/task: {bytes_per_task:>8.1f} ({bytes_per_task / BASELINE_BYTES_PER_TASK:.0%} of baseline {BASELINE_BYTES_PER_TASK})")
+        if args.check:
+            in_range = (EXPECTED_BYTES_PER_AGENT[0] <= bytes_per_agent <= EXPECTED_BYTES_PER_AGENT[1]
+                        and EXPECTED_BYTES_PER_TASK[0] <= bytes_per_task <= EXPECTED_BYTES_PER_TASK[1])
+            if not in_range:
+                sys.exit(f"Outside the expected range: {EXPECTED_BYTES_PER_AGENT} bytes/agent, {EXPECTED_BYTES_PER_TASK} bytes/task")
@@ -0,0 +1,87 @@
+"""
+Startup time of a simulation run.
+
+Runs fresh Python processes which import the simulator, build the simulation of a configuration (saving options off)
+and run its first tick, and reports the median time of each stage over `--repeats` processes.
+Also lists the reporting dependencies loaded by then (none are expected: they are imported when results are saved),
+and, with `--top`, the modules with the largest cumulative import time (`python -X importtime`).
+
+Usage:
+    python benchmarks/startup_time.py --config=config.yaml --repeats 5 --top 10
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTING_MODULES = ['pandas', 'matplotlib', 'imageio', 'PIL']
+
+# Run in a fresh process: imports, construction of the simulation and first tick, timed separately
+STARTUP_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+from modules.utils import load_config, load_plugin
+from modules.simulation import Simulation
+from modules.result_saver import ResultSaver
+imported = time.perf_counter()
+config = load_config(sys.argv[1])
+config['simulation']['rendering_mode'] = 'None'
+config['simulation']['saving_options'] = {}
+load_plugin(config['decision_making']['plugin'])
+plugin_imported = time.perf_counter()
+simulation = Simulation(config, seed=0)
+built = time.perf_counter()
+simulation.step()
+stepped = time.perf_counter()
+print(json.dumps({
+    'import': imported - start, 'plugin import': plugin_imported - imported,
+    'construction': built - plugin_imported, 'first tick': stepped - built, 'total': stepped - start,
+    'reporting modules': [name for name in %r if name in sys.modules],
+}))
+""" % (REPORTING_MODULES,)
+
+
+def run_startup(config_file):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, config_file], cwd=REPOSITORY, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_times(top):
+    """Modules with the largest cumulative import time (in seconds), from `python -X importtime`."""
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import modules.simulation, modules.result_saver'],
+                            cwd=REPOSITORY, env=env, capture_output=True, text=True, check=True).stderr
+    times = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'cumulative' not in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(times, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of a simulation run')
+    parser.add_argument('--config', type=str, default='config.yaml', help='Path to the configuration file (default: config.yaml)')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of processes to run (default: 5)')
+    parser.add_argument('--top', type=int, default=0, help='Number of modules with the largest import time to list (default: 0)')
+    args = parser.parse_args()
+
+    results = [run_startup(args.config) for _ in range(args.repeats)]
+    print(f"Startup of {args.config} (median of {args.repeats} processes)")
+    for stage in ['import', 'plugin import', 'construction', 'first tick', 'total']:
+        print(f"  {stage:>14}: {statistics.median(result[stage] for result in results) * 1000:8.1f} ms")
+    print(f"  Reporting modules loaded: {', '.join(results[0]['reporting modules']) or 'none'}")
+
+    if args.top > 0:
+        print("Largest cumulative import times")
+        for seconds, name in import_times(args.top):
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
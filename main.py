@@ -1,108 +1,93 @@
+import time
 import pygame
 import asyncio
+import numpy as np
 import argparse
 import cProfile
-import importlib
-
-from modules.utils import pre_render_text, set_config, ResultSaver
-
-# Parse command line arguments
-parser = argparse.ArgumentParser(description='SPACE (Swarm Planning And Control Evalution) Simulator')
-parser.add_argument('--config', type=str, default='config.yaml', help='Path to the configuration file (default: --config=config.yaml)')
-args = parser.parse_args()
-
-# Load configuration
-set_config(args.config)
-from modules.utils import config  # Import the global config after setting it
-
-sampling_freq = config['simulation']['sampling_freq']
-sampling_time = 1.0 / sampling_freq  # in seconds
-max_simulation_time = config.get('simulation').get('max_simulation_time', 0)
-screen_height = config['simulation']['screen_height']
-screen_width = config['simulation']['screen_width']
-gif_recording_fps = config['simulation']['gif_recording_fps']
-profiling_mode = config['simulation']['profiling_mode']
-rendering_mode = config.get('simulation').get('rendering_mode', "Screen")
-speed_up_factor = config.get('simulation').get('speed_up_factor', 1)
-rendering_options = config.get('simulation').get('rendering_options', {})
-
-save_gif = config.get('simulation').get('saving_options').get('save_gif', False)
-save_timewise_result_csv = config.get('simulation').get('saving_options').get('save_timewise_result_csv', False)
-save_agentwise_result_csv = config.get('simulation').get('saving_options').get('save_agentwise_result_csv', False)
-save_config_yaml = config.get('simulation').get('saving_options').get('save_config_yaml', False)
-
-# Dynamically import the decision-making module
-decision_making_module_path = config['decision_making']['plugin']
-module_path, _ = decision_making_module_path.rsplit('.', 1)
-decision_making_module = importlib.import_module(module_path)
-
-# Initialize pygame
-pygame.init()
-if rendering_mode == "Screen":
-    screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
-else:
-    screen = None  # No screen initialization if rendering is disabled
-
-# screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
-# background_color = (173, 255, 47)
-background_color = (224, 224, 224)
-
-# Set logo and title
-logo_image_path = 'assets/logo.jpg'  # Change to the path of your logo image
-logo = pygame.image.load(logo_image_path)
-pygame.display.set_icon(logo)
-pygame.display.set_caption('SPACE(Swarm Planning And Control Evaluation) Simulator')  # Change to your desired game title
-
-# Initialize tasks
-from modules.task import generate_tasks
-tasks = generate_tasks()
-
-# Initialize agents with behavior trees, giving them the information of current tasks
-from modules.agent import generate_agents
-agents = generate_agents(tasks)
-
-# Pre-rendered text for performance improvement
-mission_completed_text = pre_render_text("MISSION COMPLETED", 72, (0, 0, 0))
-
-# Dynamic task generation parameters
-dynamic_task_generation = config['tasks'].get('dynamic_task_generation', {})
-generation_enabled = dynamic_task_generation.get('enabled', False)
-generation_interval = dynamic_task_generation.get('interval_seconds', 10)
-max_generations = dynamic_task_generation.get('max_generations', 5)
-tasks_per_generation = dynamic_task_generation.get('tasks_per_generation', 5)
-
-# Initialize data recording
-data_records = []
-result_saver = ResultSaver(args.config)
+
+from modules.utils import pre_render_text, render_text, get_label_step, load_config
+from modules.result_saver import ResultSaver
+from modules.simulation import Simulation
+from modules.renderer import (RendererProcess, TaskLayer, AgentSprites, add_dirty_rects, agent_drawing_mode,
+                              communication_links, draw_agent_dots, draw_segments)
+
+# Simulation loop drawn by a renderer process, which draws the latest state at its own frame rate
+def renderer_process_loop(simulation, result_saver):
+    rendering_options = simulation.config['simulation'].get('rendering_options') or {}
+    renderer = RendererProcess(simulation, result_saver, rendering_options.get('frame_rate', 30))
+    try:
+        while renderer.running and not simulation.time_over:
+            if renderer.paused or simulation.mission_completed:
+                time.sleep(0.01)  # Wait for the window to be closed (or unpaused), as in `Screen` mode
+                continue
+            # Not paced by the display: the renderer only reads the state it has time to draw
+            simulation.step()
+            renderer.publish(simulation, force=simulation.mission_completed)
+    finally:
+        renderer.close()
 
 # Main game loop
-async def game_loop():
+async def game_loop(simulation, result_saver):
+    config = simulation.config
+    sampling_freq = config['simulation']['sampling_freq']
+    screen_height = config['simulation']['screen_height']
+    screen_width = config['simulation']['screen_width']
+    gif_recording_fps = config['simulation']['gif_recording_fps']
+    rendering_mode = config.get('simulation').get('rendering_mode', "Screen")
+    speed_up_factor = config.get('simulation').get('speed_up_factor', 1)
+    rendering_options = config.get('simulation').get('rendering_options', {})
+    save_gif = config.get('simulation').get('saving_options').get('save_gif', False)
+
+    agents = simulation.agents
+    tasks = simulation.tasks
+    decision_making_module = simulation.decision_making_module
+
+    if rendering_mode == "Process":
+        renderer_process_loop(simulation, result_saver)
+        simulation.save_results(result_saver)
+        return
+
+    # Initialize pygame
+    pygame.init()
+    if rendering_mode == "Screen":
+        screen = pygame.display.set_mode((screen_width, screen_height), pygame.RESIZABLE)
+        task_layer = TaskLayer(screen.get_size(), config['simulation']['task_visualisation_factor'],
+                               rendering_options.get('task_id', False), get_label_step(rendering_options))
+        last_dirty_rects = []  # Regions drawn over the task layer in the last frame
+        drawing_mode = agent_drawing_mode(len(simulation.agents), rendering_options)
+        agent_sprites = AgentSprites()
+    else:
+        screen = None  # No screen initialization if rendering is disabled
+
+    # Set logo and title
+    logo_image_path = 'assets/logo.jpg'  # Change to the path of your logo image
+    logo = pygame.image.load(logo_image_path)
+    pygame.display.set_icon(logo)
+    pygame.display.set_caption('SPACE(Swarm Planning And Control Evaluation) Simulator')  # Change to your desired game title
+
+    # Pre-rendered text for performance improvement
+    mission_completed_text = render_text("MISSION COMPLETED", 72, (0, 0, 0))
+
     running = True
     clock = pygame.time.Clock()
     game_paused = False
-    mission_completed = False
-
-    # Initialize simulation time
-    simulation_time = 0.0
     last_print_time = 0.0   # Variable to track the last time tasks_left was printed
 
-    # Initialize dynamic task generation time
-    generation_count = 0
-    last_generation_time = 0.0
-
     # Recording variables
     recording = False
-    frames = []    
+    frames = []
     if save_gif and rendering_mode == "Screen":
         recording = True
         frames = [] # Clear any existing frames
-        last_frame_time = simulation_time
-        print("Recording started...") 
+        last_frame_time = simulation.simulation_time
+        print("Recording started...")
 
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED) and rendering_mode == "Screen":
+                task_layer.invalidate(screen.get_size())  # Redraw the whole screen
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE or event.key == pygame.K_q:
                     running = False
@@ -112,118 +97,103 @@ async def game_loop():
                     if not recording:
                         recording = True
                         frames = [] # Clear any existing frames
-                        last_frame_time = simulation_time
-                        print("Recording started...") 
+                        last_frame_time = simulation.simulation_time
+                        print("Recording started...")
                     else:
                         recording = False
                         print("Recording stopped.")
-                        result_saver.save_gif(frames)            
+                        result_saver.save_gif(frames)
 
-        if max_simulation_time > 0 and simulation_time > max_simulation_time:
+        if simulation.time_over:
             running = False
 
-        if not game_paused and not mission_completed:
-            # Run behavior trees for each agent without rendering
-            for agent in agents:
-                await agent.run_tree()    
-                agent.update()
-
-            # Status retrieval
-            simulation_time += sampling_time
-            tasks_left = sum(1 for task in tasks if not task.completed)
-            if tasks_left == 0:
-                mission_completed = not generation_enabled or generation_count == max_generations
-
-            # Dynamic task generation
-            if generation_enabled and generation_count < max_generations:                
-                if simulation_time - last_generation_time >= generation_interval:
-                    new_task_id_start = len(tasks)
-                    new_tasks = generate_tasks(task_quantity=tasks_per_generation, task_id_start = new_task_id_start)
-                    tasks.extend(new_tasks)
-                    last_generation_time = simulation_time
-                    generation_count += 1
-                    if rendering_mode != "None":
-                        print(f"[{simulation_time:.2f}] Added {tasks_per_generation} new tasks: Generation {generation_count}.")
-
-            # Record data if time recording mode is enabled
-            if save_timewise_result_csv:
-                agents_total_distance_moved = sum(agent.distance_moved for agent in agents)
-                agents_total_task_amount_done = sum(agent.task_amount_done for agent in agents)
-                remaining_tasks = len([task for task in tasks if not task.completed])
-                tasks_total_amount_left = sum(task.amount for task in tasks)
-                
-                data_records.append([
-                    simulation_time, 
-                    agents_total_distance_moved,
-                    agents_total_task_amount_done,
-                    remaining_tasks,
-                    tasks_total_amount_left
-                ])
+        if not game_paused and not simulation.mission_completed:
+            # Run behavior trees for each agent without rendering, and update tasks
+            simulation.step()
+            simulation_time = simulation.simulation_time
+            tasks_left = simulation.tasks_left
+            mission_completed = simulation.mission_completed
 
             # Rendering
             if rendering_mode == "Screen":
-                screen.fill(background_color)
-
-
+                # Tasks are drawn on a cached layer, updated where they changed; the regions drawn over it in the last
+                # frame are restored from it, and only the regions changed are updated on the display
+                num_tasks = len(tasks)
+                redrawn_rects = task_layer.update(tasks.positions[:num_tasks], tasks.amounts[:num_tasks], tasks.completed[:num_tasks], tasks.colors)
+                for rect in last_dirty_rects + redrawn_rects:
+                    screen.blit(task_layer.surface, rect, rect)
+                dirty_rects = []
 
                 # Draw agents network topology
                 if rendering_options.get('agent_communication_topology'):
-                    for agent in agents:
-                        agent.draw_communication_topology(screen, agents)
+                    if drawing_mode == 'Polygon':
+                        for agent in agents:
+                            add_dirty_rects(dirty_rects, agent.draw_communication_topology(screen, agents))
+                    else:
+                        add_dirty_rects(dirty_rects, draw_segments(screen, *communication_links(agents), (200, 200, 200)))
 
                 # Draw agents
-                for agent in agents:                    
+                for agent in (agents if drawing_mode != 'Dot' else []):
                     if rendering_options.get('agent_path_to_assigned_tasks'): # Draw each agent's path to its assigned tasks
-                        agent.draw_path_to_assigned_tasks(screen)                    
+                        add_dirty_rects(dirty_rects, agent.draw_path_to_assigned_tasks(screen))
                     if rendering_options.get('agent_tail'): # Draw each agent's trajectory tail
-                        agent.draw_tail(screen)
+                        add_dirty_rects(dirty_rects, agent.draw_tail(screen))
                     if rendering_options.get('agent_id'): # Draw each agent's ID
-                        agent.draw_agent_id(screen)
+                        add_dirty_rects(dirty_rects, agent.draw_agent_id(screen))
                     if rendering_options.get('agent_assigned_task_id'): # Draw each agent's assigned task ID
-                        agent.draw_assigned_task_id(screen)
+                        add_dirty_rects(dirty_rects, agent.draw_assigned_task_id(screen))
                     if rendering_options.get('agent_work_done'): # Draw each agent's assigned task ID
-                        agent.draw_work_done(screen)
-                    if rendering_options.get('agent_situation_awareness_circle'): # Draw each agent's situation awareness radius circle    
-                        agent.draw_situation_awareness_circle(screen)
-                    agent.draw(screen)
-
-                # Draw tasks with task_id displayed
-                for task in tasks:
-                    task.draw(screen)
-                    if rendering_options.get('task_id'): # Draw each task's ID
-                        task.draw_task_id(screen)
-                        
-
-                # Display task quantity and elapsed simulation time                
+                        add_dirty_rects(dirty_rects, agent.draw_work_done(screen))
+                    if rendering_options.get('agent_situation_awareness_circle'): # Draw each agent's situation awareness radius circle
+                        add_dirty_rects(dirty_rects, agent.draw_situation_awareness_circle(screen))
+                    if drawing_mode == 'Polygon':
+                        add_dirty_rects(dirty_rects, agent.draw(screen))
+                if drawing_mode != 'Polygon': # Large swarms: all the agents at once
+                    for agent in agents:
+                        agent.update_color()
+                    x = np.array([agent.position.x for agent in agents])
+                    y = np.array([agent.position.y for agent in agents])
+                    colors = [agent.color for agent in agents]
+                    if drawing_mode == 'Sprite':
+                        add_dirty_rects(dirty_rects, agent_sprites.draw(screen, x, y, np.array([agent.rotation for agent in agents]), colors))
+                    else:
+                        add_dirty_rects(dirty_rects, draw_agent_dots(screen, x, y, colors))
+
+                # Display task quantity and elapsed simulation time
                 task_time_text = pre_render_text(f'Tasks left: {tasks_left}; Time: {simulation_time:.2f}s', 36, (0, 0, 0))
-                screen.blit(task_time_text, (screen_width - 350, 20))
+                dirty_rects.append(screen.blit(task_time_text, (screen_width - 350, 20)))
 
                 # Call draw_decision_making_status from the imported module if it exists
+                # (it returns the region drawn; if it does not, the whole screen is redrawn)
                 if hasattr(decision_making_module, 'draw_decision_making_status'):
-                    decision_making_module.draw_decision_making_status(screen, agent)                
+                    status_rect = decision_making_module.draw_decision_making_status(screen, agent)
+                    if status_rect is None:
+                        dirty_rects.append(screen.get_rect())
+                    else:
+                        add_dirty_rects(dirty_rects, status_rect)
 
                 # Check if all tasks are completed
                 if mission_completed:
                     text_rect = mission_completed_text.get_rect(center=(screen_width // 2, screen_height // 2))
-                    screen.blit(mission_completed_text, text_rect)
-
+                    dirty_rects.append(screen.blit(mission_completed_text, text_rect))
 
-                pygame.display.flip()
+                pygame.display.update(last_dirty_rects + redrawn_rects + dirty_rects)
+                last_dirty_rects = dirty_rects
                 clock.tick(sampling_freq*speed_up_factor)
 
                 # Capture frame for recording
                 if recording:
                     if simulation_time - last_frame_time > 1.0/gif_recording_fps: # Capture frame if 0.5 seconds elapsed
                         frame = pygame.surfarray.array3d(screen)
-                        frames.append(frame)            
-                        last_frame_time = simulation_time                
+                        frames.append(frame)
+                        last_frame_time = simulation_time
 
-            elif rendering_mode == "Terminal": 
+            elif rendering_mode == "Terminal":
                 print(f'[{simulation_time:.2f}] Tasks left: {tasks_left}')
-                if simulation_time - last_print_time > 0.5:                    
+                if simulation_time - last_print_time > 0.5:
                     last_print_time = simulation_time
-                    
-                if mission_completed:                    
+
+                if mission_completed:
                     print(f'MISSION COMPLETED')
                     running = False
             else: # if rendering_mode is None
@@ -236,34 +206,34 @@ async def game_loop():
     pygame.quit()
 
     # Save gif
-    if save_gif and rendering_mode == "Screen":        
+    if save_gif and rendering_mode == "Screen":
         recording = False
         print("Recording stopped.")
-        result_saver.save_gif(frames)           
-
-    # Save time series data
-    if save_timewise_result_csv:        
-        csv_file_path = result_saver.save_to_csv("timewise", data_records, ['time', 'agents_total_distance_moved', 'agents_total_task_amount_done', 'remaining_tasks', 'tasks_total_amount_left'])          
-        result_saver.plot_timewise_result(csv_file_path)
-    
-    # Save agent-wise data            
-    if save_agentwise_result_csv:        
-        variables_to_save = ['agent_id', 'task_amount_done', 'distance_moved']
-        agentwise_results = result_saver.get_agentwise_results(agents, variables_to_save)                        
-        csv_file_path = result_saver.save_to_csv('agentwise', agentwise_results, variables_to_save)
-        
-        result_saver.plot_boxplot(csv_file_path, variables_to_save[1:])
-
-    # Save yaml 
-    if save_config_yaml:                
-        result_saver.save_config_yaml()    
+        result_saver.save_gif(frames)
+
+    # Save time series data, agent-wise data and yaml
+    simulation.save_results(result_saver)
 
 def main():
-    asyncio.run(game_loop())
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='SPACE (Swarm Planning And Control Evalution) Simulator')
+    parser.add_argument('--config', type=str, default='config.yaml', help='Path to the configuration file (default: --config=config.yaml)')
+    args = parser.parse_args()
+
+    # Load configuration
+    config = load_config(args.config)
+    simulation = Simulation(config)
+    result_saver = ResultSaver(config, args.config)
+    simulation.stream_results(result_saver)
+
+    try:
+        if config['simulation']['profiling_mode']:
+            cProfile.runctx('asyncio.run(game_loop(simulation, result_saver))', globals(), locals(), sort='cumulative')
+        else:
+            asyncio.run(game_loop(simulation, result_saver))
+    finally:
+        simulation.close()
 
 # Run the game
-if __name__ == "__main__":    
-    if profiling_mode:
-        cProfile.run('main()', sort='cumulative')
-    else:
-        main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
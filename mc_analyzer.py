@@ -7,14 +7,64 @@ import matplotlib.patches as patches
 import seaborn as sns
 import yaml
 import numpy as np
+import pickle
+from modules.run_catalog import RunCatalog
+from modules.early_stopping import t_quantile
+from modules.result_writer import read_results
+from modules.result_dataset import ResultDataset
+
+# Final timewise results compared between cases run by run (see `analyze_paired_differences()`)
+PAIRED_METRICS = ['time', 'agents_total_distance_moved', 'agents_total_task_amount_done']
+# Columns of the result files used by the analysis, by kind
+RESULT_COLUMNS = {'timewise': ['time', 'agents_total_distance_moved', 'agents_total_task_amount_done'],
+                  'agentwise': ['task_amount_done', 'distance_moved']}
+
+
+def concatenate_runs(data, columns):
+    """
+    Runs as one DataFrame with a `run_id` column, sorted by run: `data` is either such a DataFrame (e.g. from `ResultDataset`),
+    or a list of DataFrames, one per run, with the given `columns`.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if not data:
+        return pd.DataFrame({column: np.zeros(0) for column in columns + ['run_id']})
+    return pd.concat([frame.assign(run_id=run_id) for run_id, frame in enumerate(data)], ignore_index=True)
+
+def run_bounds(run_ids):
+    """First row and number of rows of each run, given the `run_id` of the rows sorted by run."""
+    if len(run_ids) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    starts = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+    return starts, np.diff(np.r_[starts, len(run_ids)])
+
+def grouped_gini(values, starts, lengths):
+    """Gini coefficient of the values of each run (rows `starts[i]` to `starts[i] + lengths[i]`); 0 if they sum to 0."""
+    run_index = np.repeat(np.arange(len(starts)), lengths)
+    sorted_values = values[np.lexsort((values, run_index))]  # Sorted within each run
+    ranks = np.arange(1, len(values) + 1) - np.repeat(starts, lengths)
+    cumulative_total = np.bincount(run_index, weights=ranks * sorted_values, minlength=len(starts))
+    sum_values = np.bincount(run_index, weights=values, minlength=len(starts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini = (2 * cumulative_total) / (lengths * sum_values) - (lengths + 1) / lengths
+    return np.where(sum_values == 0, 0.0, gini)
 
 class MonteCarloAnalyzer:
     def __init__(self, config_path):
         self.config = self.load_config(config_path)
         self.output_folder = self.config['output_folder']
-        self.case_names = self.config['cases']
-        self.xticklabels = self.config['xticklabels']
-        self.colors = self.config.get('colors', [])  # Load colors from YAML config        
+        catalog_path = self.config.get('catalog')
+        self.catalog = RunCatalog(catalog_path) if catalog_path and os.path.exists(catalog_path) else None  # Catalog written by `mc_runner.py`
+        self.case_names = self.config.get('cases') or self.get_sweep_case_names(self.config.get('sweep'))
+        self.xticklabels = self.config.get('xticklabels') or [case_name.split('[', 1)[-1].rstrip(']') for case_name in self.case_names]
+        self.colors = self.config.get('colors') or [0] * len(self.case_names)  # Load colors from YAML config        
+        self.dataset_options = self.config.get('dataset') or {}
+        self.datasets = {}
+        self.statistics_cache_path = os.path.join(self.output_folder, 'dataset', 'statistics.pkl')
+        self.statistics_cache = {}  # (kind, case) -> (run ids, statistics), see `case_statistics()`
+        if os.path.exists(self.statistics_cache_path):
+            with open(self.statistics_cache_path, 'rb') as f:
+                self.statistics_cache = pickle.load(f)
         os.makedirs(self.output_folder, exist_ok=True)
 
     def load_config(self, config_path):
@@ -23,93 +73,181 @@ class MonteCarloAnalyzer:
             config = yaml.safe_load(file)
         return config
 
-    def load_data(self, filepath_pattern):
-        """Load data from CSV files matching the given file pattern."""
-        all_files = glob.glob(filepath_pattern)
+    def get_sweep_case_names(self, sweep_name):
+        """Names of the cases of the sweep `sweep_name` in the run catalog."""
+        if sweep_name is None or self.catalog is None:
+            raise ValueError("[ERROR] Set `cases`, or `sweep` and an existing `catalog`")
+        return [case_name for case_name, _ in self.catalog.cases() if case_name.startswith(f"{sweep_name}[")]
+
+    def result_files(self, case_path, kind):
+        """
+        Paths of the `kind` (`timewise` or `agentwise`) result files of a case: from the run catalog if it has runs of the case
+        (i.e. `case_path` is a configuration file listed in `mc_runner.yaml`), otherwise the result files `{case_path}_*_{kind}.csv`
+        (or `.csv.gz`).
+        """
+        if self.catalog is not None:
+            result_files = self.catalog.result_files(case_path, kind)
+            if result_files:
+                print(f"Analysing {len(result_files)} results: {case_path} ({kind}, from {self.catalog.path})")
+                return result_files
+        return self.find_files(f"{case_path}_*_{kind}.csv*")  # `.csv` or `.csv.gz`
+
+    def find_files(self, filepath_pattern):
+        """Files matching the given file pattern, including those saved by `mc_runner.py` workers (`worker_XX` subfolders)."""
+        directory, file_pattern = os.path.split(filepath_pattern)
+        all_files = glob.glob(filepath_pattern) + glob.glob(os.path.join(directory, 'worker_*', file_pattern))
         print(f"Analysing {len(all_files)} results: {filepath_pattern}")
-        all_data = [pd.read_csv(filename) for filename in all_files]
-        return all_data
+        return all_files
+
+    def get_dataset(self, kind):
+        """
+        Consolidated dataset of the `kind` results of all the cases (see `ResultDataset`), kept in the `dataset` subfolder
+        of the output folder: only the result files added or changed since the last analysis are read.
+        """
+        if kind not in self.datasets:
+            dataset = ResultDataset(os.path.join(self.output_folder, 'dataset'), kind, self.dataset_options.get('workers'), RESULT_COLUMNS[kind])
+            num_read = dataset.update({case_path: self.result_files(case_path, kind) for case_path in self.case_names})
+            print(f"Read {num_read} new or changed {kind} result files ({len(dataset.files)} in {dataset.data_path})")
+            self.datasets[kind] = dataset
+        return self.datasets[kind]
+
+    def load_case_data(self, case_path, kind):
+        """Load the `kind` (`timewise` or `agentwise`) results of a case: one DataFrame per run."""
+        if self.dataset_options.get('enabled', True):
+            return self.get_dataset(kind).runs(case_path)
+        return [read_results(filename) for filename in self.result_files(case_path, kind)]
+
+    def load_data(self, filepath_pattern):
+        """Load data from CSV files matching the given file pattern, including those saved by `mc_runner.py` workers (`worker_XX` subfolders)."""
+        return [read_results(filename) for filename in self.find_files(filepath_pattern)]
+
+    def load_final_values_by_seed(self, case_path):
+        """Final timewise results of the runs of a case by seed, from the run catalog."""
+        result_files = self.catalog.result_files_by_seed(case_path, 'timewise') if self.catalog is not None else {}
+        if not result_files:
+            raise ValueError(f"[ERROR] Paired differences need the timewise results of `{case_path}` in the run catalog")
+        if self.dataset_options.get('enabled', True) and case_path in self.case_names:
+            dataset = self.get_dataset('timewise')
+            starts, lengths = run_bounds(dataset.data['run_id'].to_numpy())
+            final_values = dataset.data.iloc[starts + lengths - 1].set_index('run_id')[PAIRED_METRICS]
+            return {seed: final_values.loc[dataset.run_id(filename)] for seed, filename in result_files.items()}
+        return {seed: read_results(filename, columns=PAIRED_METRICS).iloc[-1] for seed, filename in result_files.items()}
+
+    def analyze_paired_differences(self, baseline, confidence=0.95):
+        """
+        Differences of the final timewise results of each case from the `baseline` case, paired by seed.
+        With `common_random_numbers` in `mc_runner.yaml`, both runs of a pair face the same scenario, which cancels
+        out of the difference: compare `std_paired` with `std_unpaired`, the standard deviation the difference would
+        have between independent runs.
+        """
+        baseline_values = self.load_final_values_by_seed(baseline)
+        rows = []
+        for case_path in self.case_names:
+            if case_path == baseline:
+                continue
+            case_values = self.load_final_values_by_seed(case_path)
+            seeds = [seed for seed in case_values if seed in baseline_values]
+            if len(seeds) < 2:
+                print(f"[WARNING] Fewer than 2 runs of {case_path} share their seed with {baseline}: no paired differences")
+                continue
+            for metric in PAIRED_METRICS:
+                values = np.array([case_values[seed][metric] for seed in seeds])
+                baseline_metric_values = np.array([baseline_values[seed][metric] for seed in seeds])
+                differences = values - baseline_metric_values
+                std_paired = np.std(differences, ddof=1)
+                rows.append({'case': case_path,
+                             'baseline': baseline,
+                             'metric': metric,
+                             'num_pairs': len(seeds),
+                             'mean_difference': differences.mean(),
+                             'ci_half_width': t_quantile(0.5 + confidence / 2, len(seeds) - 1) * std_paired / np.sqrt(len(seeds)),
+                             'std_paired': std_paired,
+                             'std_unpaired': np.sqrt(np.var(values, ddof=1) + np.var(baseline_metric_values, ddof=1))})
+        return pd.DataFrame(rows)
 
     def gini_coefficient(self, data):
         """Calculate the Gini coefficient for a list of data."""
-        n = len(data)
-        if n == 0:
+        if len(data) == 0:
             return 0
-        sorted_data = sorted(data)
-        cumulative_total = sum((i + 1) * val for i, val in enumerate(sorted_data))
-        sum_values = sum(sorted_data)
-        if sum_values == 0:
-            return 0
-        return (2 * cumulative_total) / (n * sum_values) - (n + 1) / n
-
+        return float(grouped_gini(np.asarray(data, dtype=float), np.array([0]), np.array([len(data)]))[0])
 
     def analyze_timewise_data(self, data_list):
-        """Perform timewise data analysis."""
-        final_times = []
-        final_distances = []
-        final_tasks_done = []
-        quartile_distances = [[] for _ in range(4)]
-        quartile_tasks_done = [[] for _ in range(4)]
-        
-        for data in data_list:
-            final_time = data['time'].iloc[-1]
-            final_distance = data['agents_total_distance_moved'].iloc[-1]
-            final_tasks = data['agents_total_task_amount_done'].iloc[-1]
-            
-            final_times.append(final_time)
-            final_distances.append(final_distance)
-            final_tasks_done.append(final_tasks)
-            
-            # Calculate quartiles
-            quartile_indices = [int(len(data) * q) - 1 for q in [0.25, 0.5, 0.75, 1.0]]
-            quartile_indices = [0] + quartile_indices  # Include the start index
-            for i in range(4):
-                start = quartile_indices[i]
-                end = quartile_indices[i + 1]
-                time_difference = data['time'].iloc[end] - data['time'].iloc[start]
-                if time_difference > 0:            
-                    quartile_distances[i].append((data['agents_total_distance_moved'].iloc[end] - data['agents_total_distance_moved'].iloc[start]) / time_difference)
-                    quartile_tasks_done[i].append((data['agents_total_task_amount_done'].iloc[end] - data['agents_total_task_amount_done'].iloc[start]) / time_difference)
-        
-        return {"final_times": final_times, 
-                "final_distances": final_distances, 
-                "final_tasks_done": final_tasks_done, 
-                "quartile_distances": quartile_distances, 
+        """
+        Perform timewise data analysis.
+        The runs are given as a list of DataFrames, or as one DataFrame with a `run_id` column, sorted by run (see `concatenate_runs()`).
+        """
+        data = concatenate_runs(data_list, RESULT_COLUMNS['timewise'])
+        starts, lengths = run_bounds(data['run_id'].to_numpy())
+        time = data['time'].to_numpy()
+        distance = data['agents_total_distance_moved'].to_numpy()
+        tasks_done = data['agents_total_task_amount_done'].to_numpy()
+        last_rows = starts + lengths - 1
+
+        # Calculate quartiles: rows at 0, 25, 50, 75 and 100% of each run (a negative index counts from the end, as `iloc`)
+        quartile_indices = [np.zeros_like(lengths)] + [(lengths * q).astype(int) - 1 for q in [0.25, 0.5, 0.75, 1.0]]
+        quartile_rows = [starts + np.where(indices < 0, indices + lengths, indices) for indices in quartile_indices]
+        quartile_distances = []
+        quartile_tasks_done = []
+        for i in range(4):
+            start = quartile_rows[i]
+            end = quartile_rows[i + 1]
+            time_difference = time[end] - time[start]
+            valid = time_difference > 0
+            quartile_distances.append(((distance[end] - distance[start])[valid] / time_difference[valid]).tolist())
+            quartile_tasks_done.append(((tasks_done[end] - tasks_done[start])[valid] / time_difference[valid]).tolist())
+
+        return {"final_times": time[last_rows].tolist(),
+                "final_distances": distance[last_rows].tolist(),
+                "final_tasks_done": tasks_done[last_rows].tolist(),
+                "quartile_distances": quartile_distances,
                 "quartile_tasks_done": quartile_tasks_done}
 
     def analyze_agentwise_data(self, data_list):
-        """Perform agentwise data analysis."""
-        gini_coeff_task_amount_done = []
-        gini_coeff_distance_moved = []
-        average_task_amount_done_per_agent = []
-        average_distance_moved_per_agent = []
-        std_task_amount_done = []
-        std_distance_moved = []
-        
-        for data in data_list:
-            task_amount_done = data['task_amount_done'].tolist()
-            distance_moved = data['distance_moved'].tolist()
-            
-            gini_task = self.gini_coefficient(task_amount_done)
-            gini_distance = self.gini_coefficient(distance_moved)
-            
-            gini_coeff_task_amount_done.append(gini_task)
-            gini_coeff_distance_moved.append(gini_distance)
-
-            average_task_amount_done_per_agent.append(sum(task_amount_done)/len(task_amount_done))
-            average_distance_moved_per_agent.append(sum(distance_moved)/len(distance_moved))
+        """
+        Perform agentwise data analysis.
+        The runs are given as a list of DataFrames, or as one DataFrame with a `run_id` column, sorted by run (see `concatenate_runs()`).
+        """
+        data = concatenate_runs(data_list, RESULT_COLUMNS['agentwise'])
+        starts, lengths = run_bounds(data['run_id'].to_numpy())
+        statistics = {}
+        for column in ['task_amount_done', 'distance_moved']:
+            values = data[column].to_numpy(dtype=float)
+            run_index = np.repeat(np.arange(len(starts)), lengths)
+            mean = np.bincount(run_index, weights=values, minlength=len(starts)) / lengths
+            std = np.sqrt(np.bincount(run_index, weights=(values - mean[run_index]) ** 2, minlength=len(starts)) / lengths)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                coefficient_of_variation = std / mean
+            statistics[column] = (grouped_gini(values, starts, lengths).tolist(), mean.tolist(), coefficient_of_variation.tolist())
 
-            std_task_amount_done.append(np.std(task_amount_done)/np.mean(task_amount_done))
-            std_distance_moved.append(np.std(distance_moved)/np.mean(distance_moved))
-        
-        return {"gini_coeff_task_amount_done": gini_coeff_task_amount_done, 
-                "gini_coeff_distance_moved": gini_coeff_distance_moved, 
-                "average_task_amount_done_per_agent": average_task_amount_done_per_agent, 
-                "average_distance_moved_per_agent": average_distance_moved_per_agent, 
-                "std_task_amount_done": std_task_amount_done, 
-                "std_distance_moved": std_distance_moved
+        return {"gini_coeff_task_amount_done": statistics['task_amount_done'][0],
+                "gini_coeff_distance_moved": statistics['distance_moved'][0],
+                "average_task_amount_done_per_agent": statistics['task_amount_done'][1],
+                "average_distance_moved_per_agent": statistics['distance_moved'][1],
+                "std_task_amount_done": statistics['task_amount_done'][2],
+                "std_distance_moved": statistics['distance_moved'][2]
                 }
 
+    def case_statistics(self, case_path, kind):
+        """
+        Statistics of the `kind` results of a case (`analyze_timewise_data()` or `analyze_agentwise_data()`).
+        With the dataset, they are cached in `statistics.pkl` next to it, and only recomputed when the runs of the case change,
+        so that plots can be restyled (`ylim`, colors, labels) without going through the results again.
+        """
+        analyze = {'timewise': self.analyze_timewise_data, 'agentwise': self.analyze_agentwise_data}[kind]
+        if not self.dataset_options.get('enabled', True):
+            return analyze(self.load_case_data(case_path, kind))
+
+        dataset = self.get_dataset(kind)
+        run_ids = sorted(entry['run_id'] for entry in dataset.files.values() if entry['case'] == case_path)
+        cached = self.statistics_cache.get((kind, case_path))
+        if cached is not None and cached[0] == run_ids:
+            return cached[1]
+        statistics = analyze(dataset.case_data(case_path))
+        self.statistics_cache[(kind, case_path)] = (run_ids, statistics)
+        with open(self.statistics_cache_path, 'wb') as f:
+            pickle.dump(self.statistics_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return statistics
+
     def plot_box_plots(self, data, xticklabels, title, ylabel, filename, ylim = None):
         """Plot and save box plots."""
         plt.figure(figsize=(6, 3))
@@ -163,13 +301,16 @@ class MonteCarloAnalyzer:
         timewise_case_data = {}
         agentwise_case_data = {}
         
-        for idx, case_path in enumerate(self.config['cases']):
+        for idx, case_path in enumerate(self.case_names):
             case_name = case_path
-            timewise_data_list = self.load_data(f"{case_path}_*_timewise.csv")
-            timewise_case_data[case_name] = self.analyze_timewise_data(timewise_data_list)
-
-            agentwise_data_list = self.load_data(f"{case_path}_*_agentwise.csv")
-            agentwise_case_data[case_name] = self.analyze_agentwise_data(agentwise_data_list)
+            timewise_case_data[case_name] = self.case_statistics(case_path, "timewise")
+            agentwise_case_data[case_name] = self.case_statistics(case_path, "agentwise")
+        for case_path in self.case_names:
+            if not timewise_case_data[case_path]["final_times"]:
+                print(f"[WARNING] No results of {case_path}")
+        if not any(timewise_case_data[case_path]["final_times"] for case_path in self.case_names):
+            print(f"[WARNING] No results to analyse: nothing is plotted to {self.output_folder}")
+            return
         
         # Plotting the results
         self.plot_box_plots([timewise_case_data[case]["final_times"] for case in self.case_names], 
@@ -199,6 +340,14 @@ class MonteCarloAnalyzer:
         self.plot_box_plots([agentwise_case_data[case]["average_distance_moved_per_agent"] for case in self.case_names],
                             self.xticklabels, 'Average Distance Moved Per Agent', 'Distance', 'agent_distance_moved.png')        
 
+        # Differences from a baseline case, run by run
+        if self.config.get('paired_baseline'):
+            paired_differences = self.analyze_paired_differences(self.config['paired_baseline'])
+            paired_differences.to_csv(os.path.join(self.output_folder, 'paired_differences.csv'), index=False)
+            for row in paired_differences.itertuples():
+                print(f"{row.case} - {row.baseline}: {row.metric}: {row.mean_difference:.4g} ± {row.ci_half_width:.3g} "
+                      f"({row.num_pairs} pairs; std paired: {row.std_paired:.3g}, unpaired: {row.std_unpaired:.3g})")
+
         # self.plot_box_plots([agentwise_case_data[case]["std_task_amount_done"] for case in self.case_names],
         #                     self.xticklabels, 'Std/Ave of Task Amount Done', 'Coefficient of Variation', 'std_task_amount_done.png')
         
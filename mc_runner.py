@@ -1,26 +1,284 @@
-import subprocess
+import os
+import sys
 import yaml
+import random
 import argparse
 import time
+import math
+import multiprocessing
+from collections import namedtuple
+from modules.utils import derive_rng, load_config
+from modules.run_catalog import RunCatalog, run_key
+from modules.sweep import expand_sweep
+from modules.early_stopping import EarlyStopping
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 
 
-def run_simulation(config_file):
-    """Run the SPACE simulator with the given configuration file and save the results."""
-    command = f"python main.py --config={config_file}"
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-        # print(result.stdout)  # Output the result for debugging or logging
-    except subprocess.CalledProcessError as e:
-        print(f"Error during simulation: {e.stderr}")  # Output the error for debugging or logging
+# A run to schedule: `config` is its resolved configuration (seed included), `key` its `run_key()`,
+# and `parameters` the sweep parameters of its case (None if the case is a configuration file)
+Run = namedtuple('Run', ['case_name', 'run_index', 'config', 'key', 'parameters', 'attempt'])
 
+# Worker process state, set by `init_worker()` and kept across the runs of the worker
+worker_id = None
 
-def monte_carlo_test(config_file, num_runs):
-    """Perform Monte Carlo testing by running the simulation multiple times."""
-    for i in range(num_runs):        
-        print(f"Running simulation {i+1}/{num_runs}...")
-        run_simulation(config_file)
 
-    print("Monte Carlo testing complete")
+def init_worker(worker_counter):
+    """Initialise a worker process: assign it an id (used for its output subfolder) and silence its output."""
+    global worker_id
+    with worker_counter.get_lock():
+        worker_id = worker_counter.value
+        worker_counter.value += 1
+    sys.stdout = open(os.devnull, 'w')
+
+
+def run_simulations(configs, run_indices, keys):
+    """
+    Run the SPACE simulator with the given resolved configurations in this worker, and save the results.
+    Several configurations (runs of the same case) are run in lockstep by a `BatchSimulation`.
+    Results are not plotted (see `plot_results()`).
+    Returns the saved files, the run time (per run) and the final timewise results of each run.
+    """
+    from modules.result_saver import ResultSaver
+    from modules.simulation import Simulation
+    from modules.batch_simulation import BatchSimulation
+
+    start_time = time.time()
+    batch = BatchSimulation(configs) if len(configs) > 1 else None
+    simulations = batch.replicas if batch is not None else [Simulation(configs[0])]
+
+    # The timewise results are written during the runs
+    result_savers = []
+    for simulation, run_index, key in zip(simulations, run_indices, keys):
+        result_saver = ResultSaver(simulation.config, output_subfolder=f"worker_{worker_id:02d}", run_tag=f"r{run_index:04d}_{key[:12]}", plot_mode="None")
+        simulation.stream_results(result_saver)
+        result_savers.append(result_saver)
+
+    if batch is not None:
+        batch.run()
+    else:
+        simulations[0].run()
+    run_time = (time.time() - start_time) / len(configs)
+
+    return [(simulation.save_results(result_saver), run_time, simulation.final_values())
+            for simulation, result_saver in zip(simulations, result_savers)]
+
+
+def plot_results(result_files_list):
+    """Plot the saved results of several runs in this worker; returns the number of runs plotted."""
+    from modules.result_plots import plot_result_files
+    for result_files in result_files_list:
+        plot_result_files(result_files)
+    return len(result_files_list)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class MonteCarloRunner:
+    """
+    Runs the Monte Carlo simulations of several cases on a pool of worker processes.
+
+    - The workers are kept alive across runs, so that imports are done once per worker.
+    - Each run gets its own seed, derived from the batch `seed`, the case and the run index.
+    - Each worker saves its results to its own subfolder (`worker_XX`) of the output folder of the case.
+    - Failed runs are retried up to `max_retries` times with the same seed; a broken pool is restarted.
+    - With a `catalog`, saved runs are recorded in a `RunCatalog` and runs whose key already has results are skipped,
+      so that an interrupted or extended campaign only runs what is missing.
+    - With `replicas_per_batch` > 1, the runs of a case are run by batches of replicas in lockstep (`BatchSimulation`).
+    - With `early_stopping`, the number of runs of each case is adapted to the variance of its results.
+    - With `common_random_numbers`, the seed of a run depends only on its run index: run `i` of every case faces the
+      same scenario (see `Simulation`), so that cases (e.g. plugins) can be compared run by run.
+    - Results are not plotted after each run. With `plot_results`, the results of the runs are plotted once all the
+      runs are done, in one batch per worker of the pool.
+    """
+    def __init__(self, num_workers=None, max_retries=2, seed=None, catalog=None, replicas_per_batch=1, common_random_numbers=False, plot_results=False):
+        self.num_workers = num_workers or os.cpu_count()
+        self.max_retries = max_retries
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        self.seed = seed
+        self.catalog = RunCatalog(catalog) if catalog is not None else None
+        self.replicas_per_batch = replicas_per_batch
+        self.common_random_numbers = common_random_numbers
+        self.plot_results = plot_results
+        self.worker_counter = multiprocessing.Value('i', 0)
+        self.pool = None
+
+    def run_seed(self, case_name, run_index):
+        if self.common_random_numbers:
+            return derive_rng(self.seed, 'scenario', run_index).randrange(2**32)
+        return derive_rng(self.seed, case_name, run_index).randrange(2**32)
+
+    def start_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.num_workers, initializer=init_worker, initargs=(self.worker_counter,))
+
+    def submit(self, futures, batch):
+        future = self.pool.submit(run_simulations, [run.config for run in batch], [run.run_index for run in batch], [run.key for run in batch])
+        futures[future] = batch
+
+    def plot(self, result_files_list):
+        """Plot the saved results of runs on the worker pool, in one batch of runs per worker."""
+        start_time = time.time()
+        batch_size = max(1, math.ceil(len(result_files_list) / self.num_workers))
+        futures = [self.pool.submit(plot_results, result_files_list[i:i + batch_size]) for i in range(0, len(result_files_list), batch_size)]
+        num_plotted = 0
+        for future in futures:
+            try:
+                num_plotted += future.result()
+            except Exception as e:
+                print(f"Error in plotting results: {type(e).__name__}: {e}")
+        print(f"Plotted the results of {num_plotted} runs in {time.time() - start_time:.1f}s")
+
+    def make_batches(self, runs):
+        """Group the runs of each case by `replicas_per_batch`."""
+        batches = []
+        for run in runs:
+            if batches and batches[-1][0].case_name == run.case_name and len(batches[-1]) < self.replicas_per_batch:
+                batches[-1].append(run)
+            else:
+                batches.append([run])
+        return batches
+
+    def make_run(self, case, run_index):
+        """Resolve the configuration of a run of a case, given as `(case_name, config, parameters)`."""
+        case_name, case_config, parameters = case
+        config = yaml.safe_load(yaml.safe_dump(case_config))  # Copy
+        config['simulation']['seed'] = self.run_seed(case_name, run_index)
+        return Run(case_name, run_index, config, run_key(config), parameters, 0)
+
+    def monte_carlo_test(self, cases, num_runs, early_stopping=None):
+        """
+        Perform Monte Carlo testing by running `num_runs` simulations of each case; returns the failed runs.
+        Cases are configuration files, or `(case_name, config, parameters)` (e.g. from `expand_sweep()`).
+        With `early_stopping` (`EarlyStopping`), `num_runs` is ignored: runs are added to each case, once its scheduled
+        runs are completed, until the stopping rule is met.
+        """
+        cases = [(case, load_config(case), None) if isinstance(case, str) else case for case in cases]
+        samples = {case[0]: [] for case in cases}  # Final values of the completed runs, for `early_stopping`
+        num_scheduled = {case[0]: 0 for case in cases}
+        num_in_flight = {case[0]: 0 for case in cases}
+        num_skipped = 0
+        failed = []
+        completed_result_files = []  # To plot at the end
+
+        def schedule(case, num_new_runs):
+            """Make the next `num_new_runs` runs of a case; the runs already in the catalog are skipped."""
+            nonlocal num_skipped
+            case_name = case[0]
+            runs = []
+            for run_index in range(num_scheduled[case_name], num_scheduled[case_name] + num_new_runs):
+                run = self.make_run(case, run_index)
+                final_values = None
+                if self.catalog is not None and self.catalog.has_results(run.key):
+                    final_values = self.catalog.final_values(run.key)
+                    if final_values is not None or early_stopping is None:
+                        num_skipped += 1
+                        if final_values is not None:
+                            samples[case_name].append(final_values)
+                        continue
+                runs.append(run)
+            num_scheduled[case_name] += num_new_runs
+            num_in_flight[case_name] += len(runs)
+            return runs
+
+        def extend(case):
+            """Schedule runs of a case until some are to be run or the stopping rule is met."""
+            while num_in_flight[case[0]] == 0:
+                num_new_runs = early_stopping.num_more_runs(samples[case[0]], num_scheduled[case[0]])
+                if num_new_runs == 0:
+                    print(f"{case[0]}: stopped after {num_scheduled[case[0]]} runs; {early_stopping.summary(samples[case[0]])}")
+                    return []
+                runs = schedule(case, num_new_runs)
+                if runs:
+                    return runs
+            return []
+
+        runs = []
+        for case in cases:
+            runs.extend(schedule(case, num_runs) if early_stopping is None else extend(case))
+        if self.catalog is not None:
+            print(f"Skipping {num_skipped} runs with results in {self.catalog.path}")
+        print(f"Running {len(runs)}{' (initial)' if early_stopping is not None else ''} simulations on {self.num_workers} workers (seed: {self.seed})")
+        if not runs:
+            return []
+
+        self.start_pool()
+        futures = {}
+        for batch in self.make_batches(runs):
+            self.submit(futures, batch)
+
+        start_time = time.time()
+        completed = 0
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            retries = []
+            finished_cases = set()
+            pool_broken = False
+            for future in done:
+                batch = futures.pop(future)
+                run_names = ", ".join(f"run {run.run_index} (seed {run.config['simulation']['seed']})" for run in batch)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        pool_broken = True
+                        error = "worker process terminated abruptly"
+                    else:
+                        error = f"{type(e).__name__}: {e}"
+                    attempt = batch[0].attempt
+                    if attempt < self.max_retries:
+                        print(f"Error in {batch[0].case_name} {run_names}: {error}; retrying ({attempt + 1}/{self.max_retries})")
+                        retries.append([run._replace(attempt=attempt + 1) for run in batch])
+                    else:
+                        print(f"Error in {batch[0].case_name} {run_names}: {error}; giving up")
+                        failed.extend(batch)
+                        completed += len(batch)
+                        num_in_flight[batch[0].case_name] -= len(batch)
+                        finished_cases.add(batch[0].case_name)
+                    continue
+
+                for run, (result_files, run_time, final_values) in zip(batch, results):
+                    if self.catalog is not None:
+                        self.catalog.add_run(run.key, run.case_name, run.run_index, run.config, result_files, run_time, run.parameters, final_values)
+                    samples[run.case_name].append(final_values)
+                    completed_result_files.append(result_files)
+                    num_in_flight[run.case_name] -= 1
+                    finished_cases.add(run.case_name)
+                    completed += 1
+                    num_runs_to_do = sum(num_in_flight.values()) + completed
+                    elapsed_time = time.time() - start_time
+                    eta = elapsed_time / completed * (num_runs_to_do - completed)
+                    print(f"[{completed}/{num_runs_to_do}] {run.case_name} run {run.run_index} (seed {run.config['simulation']['seed']}) done in {run_time:.1f}s; "
+                          f"elapsed: {format_duration(elapsed_time)}; ETA: {format_duration(eta)}")
+
+            if pool_broken:
+                # All the runs in flight are lost along with the pool: restart it and resubmit them
+                retries.extend(futures.values())
+                futures = {}
+                self.start_pool()
+            for batch in retries:
+                self.submit(futures, batch)
+
+            # Add runs to the cases whose scheduled runs are all completed, until their stopping rule is met
+            if early_stopping is not None:
+                for case in cases:
+                    if case[0] in finished_cases:
+                        for batch in self.make_batches(extend(case)):
+                            self.submit(futures, batch)
+
+        if self.plot_results and completed_result_files:
+            self.plot(completed_result_files)
+
+        self.pool.shutdown()
+        self.pool = None
+        print("Monte Carlo testing complete")
+        return failed
 
 
 if __name__ == "__main__":
@@ -34,15 +292,30 @@ if __name__ == "__main__":
     with open(args.config, 'r') as file:
         batch_config = yaml.safe_load(file)
 
-    cases = batch_config['cases']
-    num_runs = batch_config['num_runs']
+    cases = batch_config.get('cases') or []
+    num_runs = batch_config.get('num_runs', 1)
+
+    # Cases of the parameter sweeps are generated in memory
+    for sweep in batch_config.get('sweeps') or []:
+        sweep_cases = expand_sweep(sweep)
+        print(f"Sweep `{sweep['name']}`: {len(sweep_cases)} cases")
+        cases.extend(sweep_cases)
 
-    for config_file in cases:
-        print(f"Running Monte Carlo simulation with config: {config_file}, num_runs: {num_runs}")
-        monte_carlo_test(config_file, num_runs)
-        print(f"Finished running with {config_file}")
+    runner = MonteCarloRunner(num_workers=batch_config.get('num_workers'),
+                              max_retries=batch_config.get('max_retries', 2),
+                              seed=batch_config.get('seed'),
+                              catalog=batch_config.get('catalog'),
+                              replicas_per_batch=batch_config.get('replicas_per_batch', 1),
+                              common_random_numbers=batch_config.get('common_random_numbers', False),
+                              plot_results=batch_config.get('plot_results', False))
+    early_stopping = EarlyStopping(**batch_config['early_stopping']) if batch_config.get('early_stopping') else None
+    failed = runner.monte_carlo_test(cases, num_runs, early_stopping)
+    if failed:
+        print(f"{len(failed)} runs failed:")
+        for run in failed:
+            print(f"  {run.case_name} run {run.run_index} (seed {run.config['simulation']['seed']})")
 
     # Record the end time and calculate the elapsed time
     end_time = time.time()
     elapsed_time = end_time - start_time
-    print(f"Total execution time: {elapsed_time:.2f} seconds")
\ No newline at end of file
+    print(f"Total execution time: {elapsed_time:.2f} seconds")
@@ -1,46 +1,98 @@
 import pygame
 import math
 import copy
-from modules.behavior_tree import *
-from modules.utils import config, generate_positions, parse_behavior_tree
-from modules.task import task_colors
-
-# Load agent configuration
-agent_max_speed = config['agents']['max_speed']
-agent_max_accel = config['agents']['max_accel']
-max_angular_speed = config['agents']['max_angular_speed']
-agent_approaching_to_target_radius = config['agents']['target_approaching_radius']
-agent_track_size = config['simulation']['agent_track_size']
-work_rate = config['agents']['work_rate']
-agent_communication_radius = config['agents']['communication_radius']
-agent_situation_awareness_radius = config.get('agents', {}).get('situation_awareness_radius', 0)
-font = pygame.font.Font(None, 15)
-
-# Load behavior tree
-behavior_tree_xml = config['agents']['behavior_tree_xml']
-xml_root = parse_behavior_tree(f"bt_xml/{behavior_tree_xml}")
+import numpy as np
+from modules.behavior_tree import BehaviorTreeList, build_behavior_tree
+from modules.utils import derive_rng, generate_positions, render_text, format_label_value, get_label_step
+from modules.recorder import RunningTotals
+
+
+class Track:
+    """
+    Fixed-size ring buffer of the latest agent positions (to draw the agent's trajectory tail).
+    """
+    __slots__ = ('_size', '_points', '_head', '_length')
+
+    def __init__(self, size):
+        self._size = size
+        self._points = None  # Allocated on the first `append()`
+        self._head = 0  # Index to write the next position
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, position):
+        if self._size == 0:
+            return
+        if self._points is None:
+            self._points = np.empty((self._size, 2), dtype=np.float32)
+        self._points[self._head] = position
+        self._head = (self._head + 1) % self._size
+        self._length = min(self._length + 1, self._size)
+
+    def points(self):
+        """Positions from the oldest to the latest."""
+        if self._length < self._size:
+            return self._points[:self._length].tolist()
+        return np.concatenate((self._points[self._head:], self._points[:self._head])).tolist()
+
+
+def copy_message(message):
+    """
+    Copy of the containers (dicts, lists and sets) of a message, which plugins may modify in place after sharing it;
+    other objects (e.g. tasks) are shared, not copied.
+    """
+    if isinstance(message, dict):
+        return {key: copy_message(value) for key, value in message.items()}
+    if isinstance(message, list):
+        return [copy_message(value) for value in message]
+    if isinstance(message, set):
+        return set(message)
+    return message
+
 
 class Agent:
-    def __init__(self, agent_id, position, tasks_info):
+    __slots__ = (
+        'agent_id', 'config', 'seed', '_exploration_rng', '_plugin_rng', 'sampling_time',
+        'position', 'velocity', 'acceleration', 'max_speed', 'max_accel', 'max_angular_speed', 'target_approaching_radius', 'work_rate',
+        'memory_location', 'rotation', 'color', 'blackboard', 'tree', 'decision_maker',
+        'tasks_info', 'agents_info', 'communication_radius', 'situation_awareness_radius',
+        'agents_nearby', 'sensed', 'message_to_share', 'published_message', 'messages_received', 'assigned_task_id', 'planned_tasks',
+        'distance_moved', 'task_amount_done', 'totals', 'extensions', 'agent_grid'
+    )
+
+    def __init__(self, agent_id, position, tasks_info, config, seed):
         self.agent_id = agent_id
+        self.config = config  # The simulation's configuration (e.g. for plugins to read their parameters)
+        self.seed = seed  # The simulation's seed, from which the agent's random number streams are derived
+        self._exploration_rng = None
+        self._plugin_rng = None
+        self.sampling_time = 1.0 / config['simulation']['sampling_freq']  # in seconds
         self.position = pygame.Vector2(position)
         self.velocity = pygame.Vector2(0, 0)
         self.acceleration = pygame.Vector2(0, 0)
-        self.max_speed = agent_max_speed
-        self.max_accel = agent_max_accel
-        self.max_angular_speed = max_angular_speed
-        self.work_rate = work_rate
-        self.memory_location = []  # To draw track
+        self.max_speed = config['agents']['max_speed']
+        self.max_accel = config['agents']['max_accel']
+        self.max_angular_speed = config['agents']['max_angular_speed']
+        self.target_approaching_radius = config['agents']['target_approaching_radius']
+        self.work_rate = config['agents']['work_rate']
+        self.memory_location = Track(config['simulation']['agent_track_size'])  # To draw track
         self.rotation = 0  # Initial rotation
         self.color = (0, 0, 255)  # Blue color
         self.blackboard = {}
+        self.tree = None
+        self.decision_maker = None  # Set by `DecisionMakingNode.bind()`
 
         self.tasks_info = tasks_info # global info
         self.agents_info = None # global info
-        self.communication_radius = agent_communication_radius
-        self.situation_awareness_radius = agent_situation_awareness_radius
+        self.agent_grid = None  # Spatial grid of the agents of the simulation, if enabled (see `Simulation`)
+        self.communication_radius = config['agents']['communication_radius']
+        self.situation_awareness_radius = config.get('agents', {}).get('situation_awareness_radius', 0)
         self.agents_nearby = []
+        self.sensed = None  # (local_tasks_info, agents_nearby) sensed in advance for this tick, e.g. by `BatchSimulation`
         self.message_to_share = {}
+        self.published_message = None  # Copy of `message_to_share` read by the other agents in synchronous update mode (see `publish_message()`)
         self.messages_received = []
 
         self.assigned_task_id = None         # Local decision-making result.
@@ -49,32 +101,32 @@ class Agent:
 
         self.distance_moved = 0.0
         self.task_amount_done = 0.0        
+        self.totals = RunningTotals()  # Shared by the agents of a simulation (see `Simulation`)
+
+        # Per-agent state of behavior tree nodes and plugins (key: owner name, e.g. node name)
+        # `Agent` has no `__dict__`, so any additional per-agent state must be stored here.
+        self.extensions = {}
+
+    # Random number streams of the agent, created on first use
+    @property
+    def exploration_rng(self):
+        if self._exploration_rng is None:
+            self._exploration_rng = derive_rng(self.seed, 'exploration', self.agent_id)
+        return self._exploration_rng
 
-    def create_behavior_tree(self):
-        self.tree = self._create_behavior_tree()
+    @property
+    def plugin_rng(self):
+        if self._plugin_rng is None:
+            self._plugin_rng = derive_rng(self.seed, 'plugin', self.agent_id)
+        return self._plugin_rng
 
     # Agent's Behavior Tree
-    def _create_behavior_tree(self):
-        behavior_tree = self._parse_xml_to_bt(xml_root.find('BehaviorTree'))
-        return behavior_tree        
-    
-    def _parse_xml_to_bt(self, xml_node):
-        node_type = xml_node.tag
-        children = []
-
-        for child in xml_node:
-            children.append(self._parse_xml_to_bt(child))
-
-        if node_type in BehaviorTreeList.CONTROL_NODES:
-            control_class = globals()[node_type]  # Control class should be globally available
-            return control_class(node_type, children=children)
-        elif node_type in BehaviorTreeList.ACTION_NODES:
-            action_class = globals()[node_type]  # Action class should be globally available
-            return action_class(node_type, self)
-        elif node_type == "BehaviorTree": # Root
-            return children[0]
-        else:
-            raise ValueError(f"[ERROR] Unknown behavior node type: {node_type}")    
+    # Nodes do not hold any per-agent state, so a single tree can be shared by all the agents
+    def create_behavior_tree(self, behavior_tree=None):
+        if behavior_tree is None:
+            behavior_tree = build_behavior_tree(f"bt_xml/{self.config['agents']['behavior_tree_xml']}", self.config)
+        self.tree = behavior_tree
+        self.tree.bind(self)
 
     def _reset_bt_action_node_status(self):
         action_nodes = BehaviorTreeList.ACTION_NODES
@@ -91,10 +143,10 @@ class Agent:
         desired = target - self.position
         d = desired.length()
 
-        if d < agent_approaching_to_target_radius:
+        if d < self.target_approaching_radius:
             # Apply arrival behavior
             desired.normalize_ip()
-            desired *= self.max_speed * (d / agent_approaching_to_target_radius)  # Adjust speed based on distance
+            desired *= self.max_speed * (d / self.target_approaching_radius)  # Adjust speed based on distance
         else:
             desired.normalize_ip()
             desired *= self.max_speed
@@ -108,18 +160,23 @@ class Agent:
 
     def update(self):
         # Update velocity and position
-        self.velocity += self.acceleration * sampling_time
+        self.velocity += self.acceleration * self.sampling_time
         self.velocity = self.limit(self.velocity, self.max_speed)
-        self.position += self.velocity * sampling_time
+        self.position += self.velocity * self.sampling_time
         self.acceleration *= 0  # Reset acceleration
+        if self.agent_grid is not None:
+            self.agent_grid.move(self.agent_id, self.position.x, self.position.y)
 
         # Calculate the distance moved in this update and add to distance_moved
-        self.distance_moved += self.velocity.length() * sampling_time
+        distance_moved = self.velocity.length() * self.sampling_time
+        self.distance_moved += distance_moved
+        self.totals.distance_moved += distance_moved
         # Memory of positions to draw track
         self.memory_location.append((self.position.x, self.position.y))
-        if len(self.memory_location) > agent_track_size:
-            self.memory_location.pop(0)
 
+        self.update_rotation()
+
+    def update_rotation(self):
         # Update rotation
         desired_rotation = math.atan2(self.velocity.y, self.velocity.x)
         rotation_diff = desired_rotation - self.rotation
@@ -132,7 +189,7 @@ class Agent:
         if abs(rotation_diff) > self.max_angular_speed:
             rotation_diff = math.copysign(self.max_angular_speed, rotation_diff)
 
-        self.rotation += rotation_diff * sampling_time
+        self.rotation += rotation_diff * self.sampling_time
 
     def reset_movement(self):
         self.velocity = pygame.Vector2(0, 0)
@@ -144,16 +201,21 @@ class Agent:
             vector.scale_to_length(max_value)
         return vector
 
-    def local_message_receive(self):
-        self.agents_nearby = self.get_agents_nearby()
+    def local_message_receive(self, agents_nearby=None):
+        self.agents_nearby = self.get_agents_nearby() if agents_nearby is None else agents_nearby
         for other_agent in self.agents_nearby:
             if other_agent.agent_id != self.agent_id:                         
-                self.receive_message(other_agent.message_to_share)
+                self.receive_message(other_agent.message_to_share if other_agent.published_message is None else other_agent.published_message)
                 # other_agent.receive_message(self.message_to_share)                          
 
         return self.agents_nearby
 
 
+    def publish_message(self):
+        # Synchronous update mode: the other agents read the message as of the end of the previous tick
+        if self.published_message is None or self.message_to_share != self.published_message:
+            self.published_message = copy_message(self.message_to_share)
+
     def reset_messages_received(self):
         self.messages_received = []
 
@@ -170,26 +232,28 @@ class Agent:
         p3 = pygame.Vector2(self.position.x + size * math.cos(angle - 2.5), self.position.y + size * math.sin(angle - 2.5))
 
         self.update_color()
-        pygame.draw.polygon(screen, self.color, [p1, p2, p3])
+        return pygame.draw.polygon(screen, self.color, [p1, p2, p3])
 
 
     def draw_tail(self, screen):
         # Draw track
         if len(self.memory_location) >= 2:
-            pygame.draw.lines(screen, self.color, False, self.memory_location, 1)               
+            return pygame.draw.lines(screen, self.color, False, self.memory_location.points(), 1)
         
 
     def draw_communication_topology(self, screen, agents):
      # Draw lines to neighbor agents
+        rects = []
         for neighbor_agent in self.agents_nearby:
             if neighbor_agent.agent_id > self.agent_id:
                 neighbor_position = agents[neighbor_agent.agent_id].position
-                pygame.draw.line(screen, (200, 200, 200), (int(self.position.x), int(self.position.y)), (int(neighbor_position.x), int(neighbor_position.y)))
+                rects.append(pygame.draw.line(screen, (200, 200, 200), (int(self.position.x), int(self.position.y)), (int(neighbor_position.x), int(neighbor_position.y))))
+        return rects
 
     def draw_agent_id(self, screen):
         # Draw assigned_task_id next to agent position
-        text_surface = font.render(f"agent_id: {self.agent_id}", True, (50, 50, 50))
-        screen.blit(text_surface, (self.position[0] + 10, self.position[1] - 10))
+        text_surface = render_text(f"agent_id: {self.agent_id}", 15, (50, 50, 50))
+        return screen.blit(text_surface, (self.position[0] + 10, self.position[1] - 10))
 
     def draw_assigned_task_id(self, screen):
         # Draw assigned_task_id next to agent position
@@ -197,21 +261,22 @@ class Agent:
             assigned_task_id_list = [task.task_id for task in self.planned_tasks]
         else:
             assigned_task_id_list = self.assigned_task_id
-        text_surface = font.render(f"task_id: {assigned_task_id_list}", True, (50, 50, 50))
-        screen.blit(text_surface, (self.position[0] + 10, self.position[1]))
+        text_surface = render_text(f"task_id: {assigned_task_id_list}", 15, (50, 50, 50))
+        return screen.blit(text_surface, (self.position[0] + 10, self.position[1]))
 
     def draw_work_done(self, screen):
         # Draw assigned_task_id next to agent position
-        text_surface = font.render(f"dist: {self.distance_moved:.1f}", True, (50, 50, 50))
-        screen.blit(text_surface, (self.position[0] + 10, self.position[1] + 10))
-        text_surface = font.render(f"work: {self.task_amount_done:.1f}", True, (50, 50, 50))
-        screen.blit(text_surface, (self.position[0] + 10, self.position[1] + 20))
+        label_step = get_label_step(self.config['simulation'].get('rendering_options'))
+        text_surface = render_text(f"dist: {format_label_value(self.distance_moved, label_step)}", 15, (50, 50, 50))
+        rect = screen.blit(text_surface, (self.position[0] + 10, self.position[1] + 10))
+        text_surface = render_text(f"work: {format_label_value(self.task_amount_done, label_step)}", 15, (50, 50, 50))
+        return rect.union(screen.blit(text_surface, (self.position[0] + 10, self.position[1] + 20)))
 
 
     def draw_situation_awareness_circle(self, screen):
         # Draw the situation awareness radius circle    
         if self.situation_awareness_radius > 0:    
-            pygame.draw.circle(screen, self.color, (self.position[0], self.position[1]), self.situation_awareness_radius, 1)
+            return pygame.draw.circle(screen, self.color, (self.position[0], self.position[1]), self.situation_awareness_radius, 1)
 
     def draw_path_to_assigned_tasks(self, screen):
         # Starting position is the agent's current position
@@ -235,22 +300,24 @@ class Agent:
         ]
                 
         # Iterate over the assigned tasks and draw lines connecting them
+        rects = []
         for task in self.planned_tasks:
             task_position = task.position
-            pygame.draw.line(
+            rects.append(pygame.draw.line(
                 screen,
                 # (255, 0, 0),  # Color for the path line (Red)
                 color_list[self.agent_id%len(color_list)], 
                 (int(start_pos.x), int(start_pos.y)),
                 (int(task_position.x), int(task_position.y)),
                 line_thickness  # Thickness of the line
-            )
+            ))
             # Update the start position for the next segment
             start_pos = task_position
+        return rects
 
 
     def update_color(self):        
-        self.color = task_colors.get(self.assigned_task_id, (20, 20, 20))  # Default to Dark Grey if no task is assigned
+        self.color = self.tasks_info.colors.get(self.assigned_task_id, (20, 20, 20))  # Default to Dark Grey if no task is assigned
 
 
     def set_assigned_task_id(self, task_id):
@@ -267,9 +334,12 @@ class Agent:
         _communication_radius = self.communication_radius if radius is None else radius        
         if _communication_radius > 0:
             communication_radius_squared = _communication_radius ** 2        
+            candidate_agents_info = self.agents_info
+            if self.agent_grid is not None:  # Only the agents in the cells within the radius (agent ids are list indices)
+                candidate_agents_info = [self.agents_info[agent_id] for agent_id in sorted(self.agent_grid.query(self.position.x, self.position.y, _communication_radius))]
             local_agents_info = [
                 other_agent
-                for other_agent in self.agents_info
+                for other_agent in candidate_agents_info
                 if (self.position - other_agent.position).length_squared() <= communication_radius_squared and other_agent.agent_id !=self.agent_id
             ]
         else:
@@ -288,27 +358,27 @@ class Agent:
                     if (self.position - task.position).length_squared() <= situation_awareness_radius_squared
                 ]                
             else:
+                candidate_tasks_info = self.tasks_info.active()
+                if self.tasks_info.grid is not None:  # Only the active tasks in the cells within the radius
+                    candidate_tasks_info = self.tasks_info.select(sorted(self.tasks_info.grid.query(self.position.x, self.position.y, _situation_awareness_radius)))
                 local_tasks_info = [
                     task 
-                    for task in self.tasks_info 
-                    if not task.completed and (self.position - task.position).length_squared() <= situation_awareness_radius_squared
+                    for task in candidate_tasks_info 
+                    if (self.position - task.position).length_squared() <= situation_awareness_radius_squared
                 ]                                
         else:
             if with_completed_task: # Default
                 local_tasks_info = self.tasks_info
             else:
-                local_tasks_info = [
-                    task 
-                    for task in self.tasks_info 
-                    if not task.completed
-                ]                                                
+                local_tasks_info = list(self.tasks_info.active())
         
         return local_tasks_info  
     
     def update_task_amount_done(self, amount):
         self.task_amount_done += amount
+        self.totals.task_amount_done += amount
 
-def generate_agents(tasks_info):
+def generate_agents(tasks_info, config, rng, seed):
     agent_quantity = config['agents']['quantity']
     agent_locations = config['agents']['locations']
 
@@ -317,14 +387,16 @@ def generate_agents(tasks_info):
                                       agent_locations['x_max'],
                                       agent_locations['y_min'],
                                       agent_locations['y_max'],
-                                      radius=agent_locations['non_overlap_radius'])
+                                      radius=agent_locations['non_overlap_radius'],
+                                      rng=rng)
 
     # Initialize agents
-    agents = [Agent(idx, pos, tasks_info) for idx, pos in enumerate(agents_positions)]
+    agents = [Agent(idx, pos, tasks_info, config, seed) for idx, pos in enumerate(agents_positions)]
 
-    # Provide the global info and create behavior tree
+    # Provide the global info and create behavior tree (shared by all the agents)
+    behavior_tree = build_behavior_tree(f"bt_xml/{config['agents']['behavior_tree_xml']}", config)
     for agent in agents:
         agent.set_global_info_agents(agents)
-        agent.create_behavior_tree()
+        agent.create_behavior_tree(behavior_tree)
 
     return agents
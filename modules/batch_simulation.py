@@ -0,0 +1,141 @@
+import numpy as np
+from modules.simulation import Simulation, run_coroutine
+
+
+class BatchSimulation:
+    """
+    Independent replicas of a simulation (e.g. the runs of a Monte Carlo case, which differ only by their seed)
+    advanced in lockstep.
+
+    - The positions of the agents and tasks of all the replicas are gathered into arrays with a leading replica
+      dimension, so that the local sensing and the kinematic update of an agent are computed for all the replicas
+      in one array operation.
+    - Within a tick, agents still run one after another as in `Simulation.step()` (each agent senses the agents
+      which have already moved in this tick), so each replica gives the same results as `Simulation(config).run()`.
+    - With `synchronous_update`, all the agents of a tick sense the positions at the end of the previous tick, and
+      move together once all the behavior trees have run, as in `Simulation.run_trees_synchronously()`.
+    - Replicas which are finished drop out of the active mask (`active`).
+    - All the replicas must have the same number of agents and the same update mode.
+    """
+    def __init__(self, configs):
+        self.replicas = [Simulation(config) for config in configs]
+        agent_quantities = {len(replica.agents) for replica in self.replicas}
+        if len(agent_quantities) != 1:
+            raise ValueError("[ERROR] All the replicas of a batch must have the same number of agents")
+        self.num_agents = agent_quantities.pop()
+        if len({replica.synchronous for replica in self.replicas}) != 1:
+            raise ValueError("[ERROR] All the replicas of a batch must have the same `synchronous_update` mode")
+        self.synchronous = self.replicas[0].synchronous
+        if any(replica.num_workers > 0 for replica in self.replicas):
+            raise ValueError("[ERROR] `synchronous_update.workers` is not supported by `BatchSimulation`")
+        self.active = np.ones(len(self.replicas), dtype=bool)
+
+        # Per-agent parameters (replica, agent)
+        self.situation_awareness_radii = np.array([[agent.situation_awareness_radius for agent in replica.agents] for replica in self.replicas], dtype=float)
+        self.communication_radii = np.array([[agent.communication_radius for agent in replica.agents] for replica in self.replicas], dtype=float)
+        self.max_speeds = np.array([[agent.max_speed for agent in replica.agents] for replica in self.replicas], dtype=float)
+        self.sampling_times = np.array([replica.sampling_time for replica in self.replicas])
+
+    def step(self):
+        """Advance every active replica by one sampling time."""
+        replica_indices = np.flatnonzero(self.active)
+        replicas = [self.replicas[k] for k in replica_indices]
+        time_over = [replica.time_over for replica in replicas]  # Checked before the step, as in `Simulation.run()`
+
+        # Let the decision-making plugins prepare the tick for all the agents of all the replicas at once
+        decision_makers = {}
+        for replica in replicas:
+            if hasattr(replica.decision_making_class, 'prepare_tick'):
+                decision_makers.setdefault(replica.decision_making_class, []).extend(agent.decision_maker for agent in replica.agents)
+        for decision_making_class, makers in decision_makers.items():
+            decision_making_class.prepare_tick(makers)
+
+        # Tasks do not move, and are only completed by `TaskStore.commit_work()` at the end of the tick
+        num_tasks = max(len(replica.tasks) for replica in replicas)
+        task_positions = np.zeros((len(replicas), num_tasks, 2))
+        task_active = np.zeros((len(replicas), num_tasks), dtype=bool)
+        for j, replica in enumerate(replicas):
+            tasks = replica.tasks
+            task_positions[j, :len(tasks)] = tasks.positions[:len(tasks)]
+            task_active[j, :len(tasks)] = ~tasks.completed[:len(tasks)]
+
+        agent_positions = np.array([[(agent.position.x, agent.position.y) for agent in replica.agents] for replica in replicas])
+        situation_awareness_radii = self.situation_awareness_radii[replica_indices]
+        communication_radii = self.communication_radii[replica_indices]
+        max_speeds = self.max_speeds[replica_indices]
+        sampling_times = self.sampling_times[replica_indices]
+
+        senses_tasks = (situation_awareness_radii > 0).tolist()  # Radius 0 ("global"): sensed by the agent itself
+        senses_agents = (communication_radii > 0).tolist()
+
+        for i in range(self.num_agents):
+            agents = [replica.agents[i] for replica in replicas]
+            position = agent_positions[:, i]
+
+            # Local sensing (see `Agent.get_tasks_nearby()` and `Agent.get_agents_nearby()`)
+            dx = position[:, None, 0] - task_positions[:, :, 0]
+            dy = position[:, None, 1] - task_positions[:, :, 1]
+            tasks_nearby = (dx * dx + dy * dy <= situation_awareness_radii[:, i, None] ** 2) & task_active
+            dx = position[:, None, 0] - agent_positions[:, :, 0]
+            dy = position[:, None, 1] - agent_positions[:, :, 1]
+            agents_nearby = dx * dx + dy * dy <= communication_radii[:, i, None] ** 2
+            agents_nearby[:, i] = False
+
+            # Behavior trees
+            for j, agent in enumerate(agents):
+                local_tasks_info = None
+                if senses_tasks[j][i]:
+                    local_tasks_info = replicas[j].tasks.select(tasks_nearby[j].nonzero()[0].tolist())
+                local_agents_info = None
+                if senses_agents[j][i]:
+                    agents_info = agent.agents_info
+                    local_agents_info = [agents_info[agent_id] for agent_id in agents_nearby[j].nonzero()[0].tolist()]
+                agent.sensed = (local_tasks_info, local_agents_info)
+                run_coroutine(agent.run_tree())
+
+            if not self.synchronous:
+                self.move(agents, i, agent_positions, max_speeds, sampling_times)
+
+        if self.synchronous:
+            for i in range(self.num_agents):
+                self.move([replica.agents[i] for replica in replicas], i, agent_positions, max_speeds, sampling_times)
+            for replica in replicas:
+                for agent in replica.agents:
+                    agent.publish_message()
+
+        for j, replica in enumerate(replicas):
+            replica.end_step()
+            if replica.decision_holding is not None:
+                replica.decision_holding.try_hold(replica)  # Replicas need not share their simulation time
+            if time_over[j] or replica.mission_completed:
+                self.active[replica_indices[j]] = False
+
+    def move(self, agents, i, agent_positions, max_speeds, sampling_times):
+        """Kinematic update of the agents `agents` (agent `i` of each active replica); see `Agent.update()`."""
+        position = agent_positions[:, i]
+        velocity = np.array([(agent.velocity.x, agent.velocity.y) for agent in agents])
+        acceleration = np.array([(agent.acceleration.x, agent.acceleration.y) for agent in agents])
+        velocity += acceleration * sampling_times[:, None]
+        speed_squared = velocity[:, 0] * velocity[:, 0] + velocity[:, 1] * velocity[:, 1]
+        too_fast = speed_squared > max_speeds[:, i] ** 2
+        velocity[too_fast] *= (max_speeds[too_fast, i] / np.sqrt(speed_squared[too_fast]))[:, None]
+        position = position + velocity * sampling_times[:, None]
+        distance = np.sqrt(velocity[:, 0] * velocity[:, 0] + velocity[:, 1] * velocity[:, 1]) * sampling_times
+        agent_positions[:, i] = position
+
+        for agent, (vx, vy), (x, y), distance_moved in zip(agents, velocity.tolist(), position.tolist(), distance.tolist()):
+            agent.velocity.update(vx, vy)
+            agent.position.update(x, y)
+            if agent.agent_grid is not None:
+                agent.agent_grid.move(agent.agent_id, x, y)
+            agent.acceleration *= 0
+            agent.distance_moved += distance_moved
+            agent.totals.distance_moved += distance_moved
+            agent.memory_location.append((x, y))
+            agent.update_rotation()
+
+    def run(self):
+        """Step until every replica is finished; returns the replicas (`Simulation`)."""
+        while self.active.any():
+            self.step()
+        return self.replicas
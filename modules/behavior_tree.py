@@ -1,6 +1,6 @@
 from enum import Enum
 import math
-import random
+from modules.utils import load_plugin, parse_behavior_tree
 # BT Node List
 class BehaviorTreeList:
     CONTROL_NODES = [        
@@ -23,19 +23,33 @@ class Status(Enum):
     RUNNING = 3
 
 # Base class for all behavior tree nodes
+# NOTE: A behavior tree is shared by all the agents, so nodes must not hold any per-agent state.
+#       Per-agent state is initialised in `bind()` and stored in the agent (e.g. `agent.extensions[self.name]`).
 class Node:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
+    def bind(self, agent):
+        """Initialise the per-agent state of this node. Called once for each agent using the tree."""
+        pass
+
     async def run(self, agent, blackboard):
         raise NotImplementedError
 
 # Sequence node: Runs child nodes in sequence until one fails
 class Sequence(Node):
+    __slots__ = ('children',)
+
     def __init__(self, name, children):
         super().__init__(name)
         self.children = children
 
+    def bind(self, agent):
+        for child in self.children:
+            child.bind(agent)
+
     async def run(self, agent, blackboard):
         for child in self.children:
             status = await child.run(agent, blackboard)
@@ -47,10 +61,16 @@ class Sequence(Node):
 
 # Fallback node: Runs child nodes in sequence until one succeeds
 class Fallback(Node):
+    __slots__ = ('children',)
+
     def __init__(self, name, children):
         super().__init__(name)
         self.children = children
 
+    def bind(self, agent):
+        for child in self.children:
+            child.bind(agent)
+
     async def run(self, agent, blackboard):
         for child in self.children:
             status = await child.run(agent, blackboard)
@@ -61,50 +81,110 @@ class Fallback(Node):
         return Status.FAILURE
 
 # Synchronous action node
+# With a period k > 1 (`agents.node_periods` in the configuration), the action runs in the first tick, so that the nodes
+# which read its results find them, then every k ticks from tick p, the agent's phase (agent id modulo k; tick k for
+# phase 0), so that the load spreads evenly across ticks. In the other ticks, `skip()` is called instead and the node
+# returns the result of its last run.
 class SyncAction(Node):
-    def __init__(self, name, action):
+    __slots__ = ('action', 'period')
+
+    def __init__(self, name, action, config=None):
         super().__init__(name)
         self.action = action
+        self.period = config['agents'].get('node_periods', {}).get(name, 1) if config is not None else 1
+
+    def bind(self, agent):
+        if self.period > 1:
+            agent.extensions[f'{self.name}.schedule'] = {'countdown': 0, 'last_result': None}
 
     async def run(self, agent, blackboard):
-        result = self.action(agent, blackboard)
+        if self.period > 1:
+            schedule = agent.extensions[f'{self.name}.schedule']
+            if schedule['countdown'] > 0:
+                schedule['countdown'] -= 1
+                self.skip(agent, blackboard)
+                result = schedule['last_result']
+                blackboard[self.name] = result
+                return result
+            first_run = schedule['last_result'] is None
+            schedule['countdown'] = (agent.agent_id - 1) % self.period if first_run else self.period - 1
+            result = self.action(agent, blackboard)
+            schedule['last_result'] = result
+        else:
+            result = self.action(agent, blackboard)
         blackboard[self.name] = result
         return result
 
-# Load additional configuration and import decision-making class dynamically
-import importlib
-from modules.utils import config
-from plugins.my_decision_making_plugin import *
-target_arrive_threshold = config['tasks']['threshold_done_by_arrival']
-task_locations = config['tasks']['locations']
-sampling_freq = config['simulation']['sampling_freq']
-sampling_time = 1.0 / sampling_freq  # in seconds
-agent_max_random_movement_duration = config.get('agents', {}).get('random_exploration_duration', None)
-
-decision_making_module_path = config['decision_making']['plugin']
-module_path, class_name = decision_making_module_path.rsplit('.', 1)
-decision_making_module = importlib.import_module(module_path)
-decision_making_class = getattr(decision_making_module, class_name)
+    def skip(self, agent, blackboard):
+        """Called instead of the action in the ticks it does not run in (see `period`)."""
+        pass
+
+# Build the behavior tree described by an XML file (see `bt_xml/`)
+# Action nodes are constructed with the simulation's configuration to read their parameters from.
+def build_behavior_tree(xml_path, config):
+    xml_root = parse_behavior_tree(xml_path)
+    return _parse_xml_to_bt(xml_root.find('BehaviorTree'), config)
+
+def _parse_xml_to_bt(xml_node, config):
+    node_type = xml_node.tag
+    children = []
+
+    for child in xml_node:
+        children.append(_parse_xml_to_bt(child, config))
+
+    if node_type in BehaviorTreeList.CONTROL_NODES:
+        control_class = globals()[node_type]  # Control class should be globally available
+        return control_class(node_type, children=children)
+    elif node_type in BehaviorTreeList.ACTION_NODES:
+        action_class = globals()[node_type]  # Action class should be globally available
+        return action_class(node_type, config)
+    elif node_type == "BehaviorTree": # Root
+        return children[0]
+    else:
+        raise ValueError(f"[ERROR] Unknown behavior node type: {node_type}")
 
 # Local Sensing node
 class LocalSensingNode(SyncAction):
-    def __init__(self, name, agent):
-        super().__init__(name, self._local_sensing)
+    __slots__ = ()
+
+    def __init__(self, name, config):
+        super().__init__(name, self._local_sensing, config)
+
+    def skip(self, agent, blackboard):
+        # The previous `local_tasks_info` and `local_agents_info` stay on the blackboard
+        agent.sensed = None
 
     def _local_sensing(self, agent, blackboard):        
-        blackboard['local_tasks_info'] = agent.get_tasks_nearby(with_completed_task = False)
-        blackboard['local_agents_info'] = agent.local_message_receive()
+        # Use what has been sensed in advance for this tick if any (see `BatchSimulation`)
+        local_tasks_info, agents_nearby = agent.sensed if agent.sensed is not None else (None, None)
+        agent.sensed = None
+        if local_tasks_info is None:
+            local_tasks_info = agent.get_tasks_nearby(with_completed_task = False)
+        blackboard['local_tasks_info'] = local_tasks_info
+        blackboard['local_agents_info'] = agent.local_message_receive(agents_nearby)
 
         return Status.SUCCESS
     
 # Decision-making node
 class DecisionMakingNode(SyncAction):
-    def __init__(self, name, agent):
-        super().__init__(name, self._decide)
-        self.decision_maker = decision_making_class(agent)
+    __slots__ = ('decision_making_class', 'sampling_time')
+
+    def __init__(self, name, config):
+        super().__init__(name, self._decide, config)
+        _, self.decision_making_class = load_plugin(config['decision_making']['plugin'])
+        self.sampling_time = 1.0 / config['simulation']['sampling_freq']  # in seconds
+
+    def bind(self, agent):
+        super().bind(agent)
+        agent.decision_maker = self.decision_making_class(agent)
+
+    def skip(self, agent, blackboard):
+        # The previous assignment stays on the blackboard; the plugin is told the time skipped
+        if hasattr(agent.decision_maker, 'skip_time'):
+            agent.decision_maker.skip_time(self.sampling_time)
 
     def _decide(self, agent, blackboard):
-        assigned_task_id = self.decision_maker.decide(blackboard)      
+        assigned_task_id = agent.decision_maker.decide(blackboard)      
         agent.set_assigned_task_id(assigned_task_id)  
         blackboard['assigned_task_id'] = assigned_task_id
         if assigned_task_id is None:            
@@ -115,8 +195,11 @@ class DecisionMakingNode(SyncAction):
 
 # Task executing node
 class TaskExecutingNode(SyncAction):
-    def __init__(self, name, agent):
-        super().__init__(name, self._execute_task)
+    __slots__ = ('target_arrive_threshold',)
+
+    def __init__(self, name, config):
+        super().__init__(name, self._execute_task, config)
+        self.target_arrive_threshold = config['tasks']['threshold_done_by_arrival']
 
     def _execute_task(self, agent, blackboard):        
         assigned_task_id = blackboard.get('assigned_task_id')        
@@ -127,7 +210,7 @@ class TaskExecutingNode(SyncAction):
             distance = math.sqrt((next_waypoint[0] - agent_position[0])**2 + (next_waypoint[1] - agent_position[1])**2)
             
             assigned_task_id = blackboard.get('assigned_task_id')
-            if distance < agent.tasks_info[assigned_task_id].radius + target_arrive_threshold: # Agent reached the task position                                
+            if distance < agent.tasks_info[assigned_task_id].radius + self.target_arrive_threshold: # Agent reached the task position                                
                 if agent.tasks_info[assigned_task_id].completed:  # 이렇게 먼저 해줘야 중복해서 task_amount_done이 올라가지 않는다.                  
                     return Status.SUCCESS
                 agent.tasks_info[assigned_task_id].reduce_amount(agent.work_rate)
@@ -141,24 +224,35 @@ class TaskExecutingNode(SyncAction):
 
 # Exploration node
 class ExplorationNode(SyncAction):
-    def __init__(self, name, agent):
-        super().__init__(name, self._random_explore)
-        self.random_move_time = float('inf')
-        self.random_waypoint = (0, 0)
+    __slots__ = ('task_locations', 'sampling_time', 'max_random_movement_duration')
+
+    def __init__(self, name, config):
+        super().__init__(name, self._random_explore, config)
+        self.task_locations = config['tasks']['locations']
+        self.sampling_time = 1.0 / config['simulation']['sampling_freq']  # in seconds
+        self.max_random_movement_duration = config.get('agents', {}).get('random_exploration_duration', None)
+
+    def bind(self, agent):
+        super().bind(agent)
+        agent.extensions[self.name] = {
+            'random_move_time': float('inf'),
+            'random_waypoint': (0, 0)
+        }
 
     def _random_explore(self, agent, blackboard):
+        state = agent.extensions[self.name]
+        task_locations = self.task_locations
         # Move towards a random position
-        if self.random_move_time > agent_max_random_movement_duration:
-            self.random_waypoint = self.get_random_position(task_locations['x_min'], task_locations['x_max'], task_locations['y_min'], task_locations['y_max'])
-            self.random_move_time = 0 # Initialisation
+        if state['random_move_time'] > self.max_random_movement_duration:
+            state['random_waypoint'] = self.get_random_position(agent.exploration_rng, task_locations['x_min'], task_locations['x_max'], task_locations['y_min'], task_locations['y_max'])
+            state['random_move_time'] = 0 # Initialisation
         
-        blackboard['random_waypoint'] = self.random_waypoint        
-        self.random_move_time += sampling_time   
-        agent.follow(self.random_waypoint)         
+        blackboard['random_waypoint'] = state['random_waypoint']        
+        state['random_move_time'] += self.sampling_time   
+        agent.follow(state['random_waypoint'])         
         return Status.RUNNING
         
-    def get_random_position(self, x_min, x_max, y_min, y_max):
-        pos = (random.randint(x_min, x_max),
-                random.randint(y_min, y_max))
+    def get_random_position(self, rng, x_min, x_max, y_min, y_max):
+        pos = (rng.randint(x_min, x_max),
+                rng.randint(y_min, y_max))
         return pos
-    
\ No newline at end of file
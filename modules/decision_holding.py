@@ -0,0 +1,151 @@
+import numpy as np
+from modules.behavior_tree import Status
+
+# Action nodes which carry out a decision, and whose action is repeated while the decisions are held
+EXECUTION_NODES = ['TaskExecutingNode', 'ExplorationNode']
+
+
+def find_node(node, name):
+    """Node named `name` in the behavior tree `node`, or None."""
+    if node.name == name:
+        return node
+    for child in getattr(node, 'children', []):
+        found = find_node(child, name)
+        if found is not None:
+            return found
+    return None
+
+
+class DecisionHolding:
+    """
+    Holding of the agents' decisions through quiescent periods (`simulation.decision_holding` in the configuration).
+
+    A period is quiescent once no assignment has changed and no task has been completed or generated for
+    `min_quiet_ticks` ticks. The decisions are then held: in the following ticks, each agent only repeats the action
+    which carries out its decision (`TaskExecutingNode` or `ExplorationNode`, with its kinematic update), skipping
+    the local sensing and the decision-making plugin, which take most of the time of a tick. The ticks are still
+    simulated one by one (`Simulation.end_step()`), so that positions, `distance_moved`, `task_amount_done`,
+    task amounts and the timewise records stay consistent; the time saved is that of sensing and decision-making.
+
+    The decisions are held until the next event, after which regular steps resume:
+    - a task completed or generated (dynamic task generation) or the mission completed,
+    - an agent entering or leaving the communication radius of another agent, or a task entering or leaving
+      the situation awareness radius of an agent,
+    - `max_simulation_time` exceeded, or `max_hold_ticks` ticks held.
+
+    The sensing at the start of the hold is computed once (see `Sensing`), and only recomputed when an agent has
+    moved far enough to possibly cross a radius, so that held ticks cost O(N) instead of O(N^2 + NM).
+
+    Decision-making plugins with time-dependent state are told the time of each held tick through their
+    `skip_time(duration)` method, if they define one. Messages are not exchanged while the decisions are held.
+    Results are therefore close to, not identical with, those of step-by-step simulation.
+    """
+    def __init__(self, config):
+        decision_holding_config = config['simulation'].get('decision_holding', {})
+        self.min_quiet_ticks = decision_holding_config.get('min_quiet_ticks', 3)
+        self.max_hold_ticks = decision_holding_config.get('max_hold_ticks', 1000)
+        self.last_state = None
+        self.quiet_ticks = 0
+        self.held_ticks = 0  # In total, for reporting
+        self.sensing_updates = 0  # Recomputations of the sensing while decisions are held, for reporting
+
+    def try_hold(self, simulation):
+        """Hold the decisions up to the next event if the simulation is quiescent; returns the number of ticks held."""
+        state = ([agent.assigned_task_id for agent in simulation.agents], simulation.tasks.num_remaining, simulation.generation_count)
+        if state != self.last_state:
+            self.last_state = state
+            self.quiet_ticks = 0
+            return 0
+        self.quiet_ticks += 1
+        if self.quiet_ticks < self.min_quiet_ticks or simulation.mission_completed:
+            return 0
+
+        # The action carrying out the decision of each agent in the last tick
+        actions = []
+        for agent in simulation.agents:
+            node_name = next((name for name in EXECUTION_NODES if agent.blackboard.get(name) == Status.RUNNING), None)
+            node = find_node(agent.tree, node_name) if node_name is not None else None
+            if node is None:
+                return 0
+            actions.append(node.action)
+
+        sensing = Sensing(simulation)
+        ticks = 0
+        while ticks < self.max_hold_ticks and not simulation.time_over:
+            for agent, action in zip(simulation.agents, actions):
+                action(agent, agent.blackboard)
+                agent.update()
+                if hasattr(agent.decision_maker, 'skip_time'):
+                    agent.decision_maker.skip_time(simulation.sampling_time)
+            num_remaining, generation_count = simulation.tasks.num_remaining, simulation.generation_count
+            simulation.end_step()
+            ticks += 1
+            if simulation.mission_completed or simulation.tasks.num_remaining != num_remaining or simulation.generation_count != generation_count:
+                break
+            if sensing.may_have_changed(simulation):
+                self.sensing_updates += 1
+                new_sensing = Sensing(simulation)
+                if not new_sensing.same_as(sensing):
+                    break
+                sensing = new_sensing
+
+        # After the event, a regular step is run; if it changes no assignment, the decisions are held again
+        self.held_ticks += ticks
+        self.quiet_ticks = self.min_quiet_ticks - 1
+        return ticks
+
+
+class Sensing:
+    """
+    Which agents each agent communicates with, and which active tasks each agent senses (boolean arrays),
+    with how far each agent is from changing them.
+
+    `agent_margins[i]` is the smallest distance between a pair of agents including agent `i` and the radius
+    deciding whether they communicate; `task_margins[i]` is the smallest distance between agent `i` and a task
+    and its situation awareness radius. Agents `i` and `j` which have moved by at most `d_i` and `d_j` since
+    the sensing was computed cannot have changed their communication unless `d_i + d_j >= agent_margins[i]`,
+    nor agent `i` its sensed tasks unless `d_i >= task_margins[i]` (tasks do not move; completed and generated
+    tasks end the hold anyway).
+    """
+    __slots__ = ('positions', 'neighbors', 'sensed_tasks', 'agent_margins', 'task_margins')
+
+    def __init__(self, simulation):
+        agents = simulation.agents
+        self.positions = agent_positions(agents)
+
+        communication_radii = np.array([agent.communication_radius for agent in agents], dtype=float)
+        distances = np.hypot(self.positions[:, None, 0] - self.positions[None, :, 0], self.positions[:, None, 1] - self.positions[None, :, 1])
+        unlimited = communication_radii == 0
+        self.neighbors = (distances <= communication_radii[:, None]) | unlimited[:, None]
+        gaps = np.abs(distances - communication_radii[:, None])
+        gaps[unlimited] = np.inf
+        gaps = np.minimum(gaps, gaps.T)  # Whether i hears j depends on the radius of i, and whether j hears i on that of j
+        np.fill_diagonal(gaps, np.inf)
+        self.agent_margins = gaps.min(axis=1) if len(agents) > 1 else np.full(len(agents), np.inf)
+
+        tasks = simulation.tasks
+        task_positions = tasks.positions[:len(tasks)]
+        situation_awareness_radii = np.array([agent.situation_awareness_radius for agent in agents], dtype=float)
+        distances = np.hypot(self.positions[:, None, 0] - task_positions[None, :, 0], self.positions[:, None, 1] - task_positions[None, :, 1])
+        unlimited = situation_awareness_radii == 0
+        active = ~tasks.completed[:len(tasks)]
+        self.sensed_tasks = ((distances <= situation_awareness_radii[:, None]) | unlimited[:, None]) & active
+        gaps = np.abs(distances - situation_awareness_radii[:, None])
+        gaps[unlimited] = np.inf
+        gaps[:, ~active] = np.inf
+        self.task_margins = gaps.min(axis=1) if gaps.shape[1] > 0 else np.full(len(agents), np.inf)
+
+    def may_have_changed(self, simulation):
+        """Whether the agents have moved far enough since this sensing for it to have possibly changed (O(N))."""
+        displacements = np.hypot(*(agent_positions(simulation.agents) - self.positions).T)
+        # The margins are compared with a tolerance, as the sensing compares distances computed differently
+        tolerance = 1e-9 * (1.0 + np.abs(self.positions).max(initial=0.0))
+        return bool(np.any(displacements + displacements.max(initial=0.0) + tolerance >= self.agent_margins)
+                    or np.any(displacements + tolerance >= self.task_margins))
+
+    def same_as(self, other):
+        return np.array_equal(self.neighbors, other.neighbors) and np.array_equal(self.sensed_tasks, other.sensed_tasks)
+
+
+def agent_positions(agents):
+    return np.array([(agent.position.x, agent.position.y) for agent in agents], dtype=float).reshape(-1, 2)
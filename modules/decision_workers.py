@@ -0,0 +1,303 @@
+import copy
+import io
+import multiprocessing
+import pickle
+import traceback
+
+import numpy as np
+import pygame
+
+from modules.agent import Agent
+from modules.task import Task
+
+PARTITIONS = ['Agents', 'Space']
+
+# State of an agent which only the worker owning it keeps up to date, sent along when the agent changes owner
+# (`message_to_share` and `planned_tasks` with it, as plugins may keep references to their own state in them)
+PRIVATE_STATE = ['blackboard', 'extensions', 'decision_maker', 'messages_received', 'message_to_share', 'planned_tasks',
+                 'agents_nearby', 'sensed', '_exploration_rng', '_plugin_rng']
+
+
+class DecisionWorkers:
+    """
+    Worker processes running the behavior trees of the agents of a synchronous `Simulation`
+    (`simulation.synchronous_update.workers` in the configuration), so that the sensing and decision-making of a tick,
+    which take most of its time, are spread over CPU cores.
+
+    - Each worker builds a replica of the simulation from its configuration and seed (runs are reproducible, so the
+      replicas start identical), and owns a share of its agents (`owners()`): only the worker which owns an agent runs
+      its behavior tree, and keeps its private state (blackboard, plugin instance, received messages, random streams).
+      The agents are shared round-robin by id (`partition: Agents`), or by region of the arena (`partition: Space`):
+      with spatial shards, an agent crossing the border of a region migrates, with its private state, to the worker
+      owning the region at the end of the tick (`PRIVATE_STATE`).
+    - In each tick, the workers run the trees of their agents on the state at the end of the previous tick, as
+      `Simulation.run_trees_synchronously()` does, and send back what the trees changed that the other agents or the
+      simulation read: movement, assignment, message, neighbors and the work done (`agent_outputs()`).
+    - The outputs of all the workers are then applied to every replica, in the order of the agents, and every replica
+      moves the agents, publishes their messages and ends the tick (`Simulation.end_step()`) identically, so that the
+      replicas stay in lockstep, and the results are the same as with `synchronous_update` in a single process.
+    - The simulation's process only keeps the public state of the agents, for recording and drawing.
+    - Every worker holds the whole arena, and receives the outputs of all the agents, not only of those near the borders
+      of its region: the exchange grows with the number of agents, while the sensing and decision-making are shared.
+
+    Agents and tasks are pickled by reference (their id), and unpickled as the objects of the receiving replica
+    (see `ReplicaPickler`).
+    """
+    def __init__(self, simulation, num_workers, partition='Agents'):
+        self.simulation = simulation
+        self.migrations = 0  # Agents which changed worker, for reporting
+        self.awaiting_departures = False
+        config = copy.deepcopy(simulation.config)
+        simulation_config = config['simulation']
+        simulation_config['rendering_mode'] = "None"
+        simulation_config['saving_options'] = {}
+        simulation_config['synchronous_update'] = {**simulation_config.get('synchronous_update', {}), 'workers': 0}
+
+        context = multiprocessing.get_context('spawn')
+        self.connections = []
+        self.processes = []
+        for index in range(num_workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=run_worker, name=f'space-decision-worker-{index}', daemon=True,
+                                      args=(worker_connection, config, simulation.seed, index, num_workers, partition))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def run_trees(self):
+        """Run the behavior trees of all the agents in the workers, then move the agents and publish their messages."""
+        # Private state of the agents which changed region in the last tick, sent to their new owners
+        arrivals = [[] for _ in self.connections]
+        if self.awaiting_departures:
+            for connection in self.connections:
+                for owner, state in receive(connection, 'departures'):
+                    arrivals[owner].append(state)
+                    self.migrations += 1
+        for connection, worker_arrivals in zip(self.connections, arrivals):
+            connection.send(('step', worker_arrivals))
+        chunks = [receive(connection, 'outputs') for connection in self.connections]
+        for connection in self.connections:
+            connection.send(('apply', chunks))
+
+        apply_outputs(self.simulation, chunks)
+        for agent in self.simulation.agents:
+            agent.update()
+        for agent in self.simulation.agents:
+            agent.publish_message()
+        self.awaiting_departures = True
+
+    def close(self):
+        for connection, process in zip(self.connections, self.processes):
+            if process.is_alive():
+                try:
+                    connection.send(('close', None))
+                except (BrokenPipeError, OSError):
+                    pass
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self.connections = []
+        self.processes = []
+
+
+def owners(simulation, num_workers, partition):
+    """
+    Index of the worker owning each agent:
+    - `Agents`: round-robin over the agent ids, which spreads clusters of agents over the workers.
+    - `Space`: vertical strips of equal width over the locations of the agents and tasks (`locations` in the
+      configuration), so that each worker senses and decides for the agents in its region of the arena.
+    """
+    if partition == 'Agents':
+        return [agent_id % num_workers for agent_id in range(len(simulation.agents))]
+    config = simulation.config
+    x_min = min(config['agents']['locations']['x_min'], config['tasks']['locations']['x_min'])
+    x_max = max(config['agents']['locations']['x_max'], config['tasks']['locations']['x_max'])
+    width = max(x_max - x_min, 1.0) / num_workers
+    return [min(max(int((agent.position.x - x_min) // width), 0), num_workers - 1) for agent in simulation.agents]
+
+
+def run_worker(connection, config, seed, index, num_workers, partition):
+    from modules.simulation import Simulation
+    try:
+        simulation = Simulation(config, seed)
+        agents = simulation.agents
+        owned_ids = {agent_id for agent_id, owner in enumerate(owners(simulation, num_workers, partition)) if owner == index}
+        while True:
+            command, arrivals = connection.recv()
+            if command == 'close':
+                return
+            for state in arrivals:
+                owned_ids.add(load_private_state(simulation, state))
+            owned_agents = [agents[agent_id] for agent_id in sorted(owned_ids)]
+            connection.send(('outputs', dumps(simulation, run_trees(simulation, owned_agents))))
+            command, chunks = connection.recv()
+            apply_outputs(simulation, chunks, owned_ids, neighbors=False)
+            for agent in agents:
+                agent.update()
+            for agent in agents:
+                agent.publish_message()
+            simulation.end_step()
+
+            # Agents which left the region of this worker
+            departures = []
+            if partition == 'Space':
+                agent_owners = owners(simulation, num_workers, partition)
+                for agent_id in sorted(owned_ids):
+                    if agent_owners[agent_id] != index:
+                        departures.append((agent_owners[agent_id], dumps(simulation, private_state(agents[agent_id]))))
+                        owned_ids.discard(agent_id)
+            connection.send(('departures', departures))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def private_state(agent):
+    return agent.agent_id, {name: getattr(agent, name) for name in PRIVATE_STATE}
+
+
+def load_private_state(simulation, state):
+    """Set the private state of an agent arriving from another worker (see `private_state()`); returns its id."""
+    agent_id, private = loads(simulation, state)
+    agent = simulation.agents[agent_id]
+    for name, value in private.items():
+        setattr(agent, name, value)
+    return agent_id
+
+
+def receive(connection, expected):
+    try:
+        kind, payload = connection.recv()
+    except EOFError:
+        raise RuntimeError("[ERROR] A decision worker process terminated abruptly") from None
+    if kind == 'error':
+        raise RuntimeError(f"[ERROR] A decision worker process failed:\n{payload}")
+    assert kind == expected, kind
+    return payload
+
+
+class AmountLog:
+    """Stands in for the simulation's `RunningTotals` while an agent's tree runs: records the task amounts done, in order."""
+    __slots__ = ('amounts',)
+
+    def __init__(self):
+        self.amounts = []
+
+    @property
+    def task_amount_done(self):
+        return 0.0
+
+    @task_amount_done.setter
+    def task_amount_done(self, value):
+        self.amounts.append(value)  # `totals.task_amount_done += amount` sets 0.0 + amount
+
+
+def run_trees(simulation, agents):
+    """Run the behavior trees of `agents`, and return their outputs (see `agent_outputs()`)."""
+    from modules.simulation import run_coroutine
+    if hasattr(simulation.decision_making_class, 'prepare_tick'):
+        simulation.decision_making_class.prepare_tick([agent.decision_maker for agent in agents])
+    outputs = []
+    for agent in agents:
+        totals, agent.totals = agent.totals, AmountLog()
+        try:
+            run_coroutine(agent.run_tree())
+            amounts = agent.totals.amounts
+        finally:
+            agent.totals = totals
+        outputs.append(agent_outputs(agent, simulation.tasks.take_work(), amounts))
+    return outputs
+
+
+def agent_outputs(agent, work, amounts):
+    """What the behavior tree of `agent` changed in a tick that the other agents, the simulation or the drawing read."""
+    message_changed = agent.message_to_share != agent.published_message
+    return (agent.agent_id,
+            (agent.velocity.x, agent.velocity.y), (agent.acceleration.x, agent.acceleration.y),
+            agent.assigned_task_id, list(agent.planned_tasks),
+            message_changed, agent.message_to_share if message_changed else None,
+            np.array([other_agent.agent_id for other_agent in agent.agents_nearby], dtype=np.int32),
+            work, amounts)
+
+
+def apply_outputs(simulation, chunks, owned_ids=(), neighbors=True):
+    """
+    Apply the outputs of the trees of all the agents (`chunks` from the workers) in the order of the agents.
+    The neighbors of the agents (`agents_nearby`), only drawn, are not set with `neighbors=False`.
+    """
+    outputs = [output for chunk in chunks for output in loads(simulation, chunk)]
+    outputs.sort(key=lambda output: output[0])
+    agents = simulation.agents
+    tasks = simulation.tasks
+    totals = simulation.totals
+    for agent_id, velocity, acceleration, assigned_task_id, planned_tasks, message_changed, message, nearby_ids, work, amounts in outputs:
+        agent = agents[agent_id]
+        owned = agent_id in owned_ids
+        if not owned:  # The owner's replica has run the tree
+            agent.velocity = pygame.Vector2(velocity)
+            agent.acceleration = pygame.Vector2(acceleration)
+            agent.assigned_task_id = assigned_task_id
+            agent.planned_tasks = planned_tasks
+            if message_changed:
+                agent.message_to_share = message
+            if neighbors:
+                agent.agents_nearby = [agents[other_agent_id] for other_agent_id in nearby_ids.tolist()]
+        for task_id, task_work in work:
+            tasks.add_work(task_id, task_work)
+        for amount in amounts:
+            if not owned:
+                agent.task_amount_done += amount
+            totals.task_amount_done += amount
+
+
+class ReplicaPickler(pickle.Pickler):
+    """
+    Pickler of the state of a replica, which refers to its agents, tasks and task store by id, so that they are
+    unpickled by `loads()` as the objects of the receiving replica. (`reducer_override()` is not called for plain
+    numbers, strings and containers, which keeps the pickling of outputs at C speed.)
+    """
+    def __init__(self, file, simulation):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.simulation = simulation
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Agent):
+            return replica_agent, (obj.agent_id,)
+        if isinstance(obj, Task):
+            return replica_task, (obj.task_id,)
+        if obj is self.simulation.tasks:
+            return replica_tasks, ()
+        return NotImplemented
+
+
+_replica = None  # Simulation whose objects are referred to by the state being unpickled (see `loads()`)
+
+
+def replica_agent(agent_id):
+    return _replica.agents[agent_id]
+
+
+def replica_task(task_id):
+    return _replica.tasks[task_id]
+
+
+def replica_tasks():
+    return _replica.tasks
+
+
+def dumps(simulation, obj):
+    buffer = io.BytesIO()
+    ReplicaPickler(buffer, simulation).dump(obj)
+    return buffer.getvalue()
+
+
+def loads(simulation, data):
+    global _replica
+    _replica = simulation
+    try:
+        return pickle.loads(data)
+    finally:
+        _replica = None
@@ -0,0 +1,118 @@
+import math
+import statistics
+
+
+def t_cdf(t, dof):
+    """
+    Distribution function of Student's t distribution with an integer number `dof` of degrees of freedom
+    (closed-form series of Abramowitz & Stegun 26.7.3 and 26.7.4).
+    """
+    theta = math.atan(abs(t) / math.sqrt(dof))
+    cos_squared = math.cos(theta) ** 2
+    term = 1.0
+    total = 1.0
+    if dof % 2 == 0:
+        for k in range(2, dof, 2):
+            term *= cos_squared * (k - 1) / k
+            total += term
+        probability = math.sin(theta) * total  # P(|T| < |t|)
+    else:
+        for k in range(3, dof, 2):
+            term *= cos_squared * (k - 1) / k
+            total += term
+        probability = 2 / math.pi * (theta + (math.sin(theta) * math.cos(theta) * total if dof > 1 else 0.0))
+    return 0.5 + math.copysign(probability / 2, t)
+
+
+def t_quantile(p, dof):
+    """
+    Quantile `p` of Student's t distribution with an integer number `dof` (>= 1) of degrees of freedom: Newton iterations
+    on `t_cdf()`, from the Cornish-Fisher expansion around the normal quantile, which alone is several percent low
+    in the tails for few degrees of freedom.
+    """
+    if not 0 < p < 1 or dof < 1 or dof != int(dof):
+        raise ValueError(f"[ERROR] The t quantile needs 0 < p < 1 and an integer number of degrees of freedom >= 1 (p: {p}, dof: {dof})")
+    dof = int(dof)
+    if p < 0.5:
+        return -t_quantile(1 - p, dof)
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    z = statistics.NormalDist().inv_cdf(p)
+    g1 = (z**3 + z) / 4
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384
+    g4 = (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160
+    t = z + g1 / dof + g2 / dof**2 + g3 / dof**3 + g4 / dof**4
+    log_density_constant = math.lgamma((dof + 1) / 2) - math.lgamma(dof / 2) - 0.5 * math.log(dof * math.pi)
+    for _ in range(50):
+        density = math.exp(log_density_constant - (dof + 1) / 2 * math.log1p(t * t / dof))
+        step = (t_cdf(t, dof) - p) / density
+        t -= step
+        if abs(step) <= 1e-12 * max(1.0, abs(t)):
+            break
+    return t
+
+
+class EarlyStopping:
+    """
+    Sequential stopping rule of a Monte Carlo case: runs are added until the confidence interval of the mean
+    of every metric is narrow enough, or `max_runs` runs have been scheduled.
+
+    - `metrics`: timewise result labels (`TIMEWISE_RESULT_LABELS`), whose values at the end of each run are the samples
+      (e.g. `time`: mission completion time; `agents_total_distance_moved`)
+    - `confidence`: confidence level of the intervals
+    - `relative_half_width`: target half-width of the intervals, relative to the absolute value of the mean
+    - `half_widths`: target half-widths of some metrics in their units, instead of `relative_half_width`
+    - `min_runs`, `max_runs`: bounds of the number of runs of a case
+    """
+    def __init__(self, metrics, confidence=0.95, relative_half_width=0.05, half_widths=None, min_runs=5, max_runs=100):
+        from modules.simulation import TIMEWISE_RESULT_LABELS  # Not at module level: `t_quantile()` is used without pygame
+        unknown_metrics = [metric for metric in metrics if metric not in TIMEWISE_RESULT_LABELS]
+        if unknown_metrics:
+            raise ValueError(f"[ERROR] Unknown early stopping metrics {unknown_metrics}; use timewise result labels {TIMEWISE_RESULT_LABELS}")
+        if min_runs < 3:
+            raise ValueError("[ERROR] Early stopping needs `min_runs` >= 3")
+        self.metrics = metrics
+        self.confidence = confidence
+        self.relative_half_width = relative_half_width
+        self.half_widths = half_widths or {}
+        self.min_runs = min_runs
+        self.max_runs = max(max_runs, min_runs)
+
+    def intervals(self, samples):
+        """Mean, half-width and target half-width of each metric over `samples` (final values of the runs)."""
+        t = t_quantile(0.5 + self.confidence / 2, len(samples) - 1)
+        intervals = {}
+        for metric in self.metrics:
+            values = [sample[metric] for sample in samples]
+            mean = statistics.fmean(values)
+            half_width = t * statistics.stdev(values) / math.sqrt(len(values))
+            target = self.half_widths.get(metric, self.relative_half_width * abs(mean))
+            intervals[metric] = (mean, half_width, target)
+        return intervals
+
+    def num_more_runs(self, samples, num_scheduled):
+        """
+        Number of runs to add to a case with the final values `samples` of its completed runs, out of `num_scheduled`
+        (failed runs included); 0 once the case is done.
+        The number of runs needed is estimated from the current half-widths (which shrink as 1/sqrt(n)), and the
+        number of runs is at most doubled at a time, since the estimate is rough with few runs.
+        """
+        remaining = self.max_runs - num_scheduled
+        if remaining <= 0:
+            return 0
+        if len(samples) < self.min_runs:
+            return min(self.min_runs - len(samples), remaining)
+
+        num_needed = len(samples)
+        for mean, half_width, target in self.intervals(samples).values():
+            if half_width > target:
+                num_needed = max(num_needed, math.ceil(len(samples) * (half_width / target) ** 2) if target > 0 else self.max_runs)
+        return min(num_needed - len(samples), len(samples), remaining)
+
+    def summary(self, samples):
+        """Confidence intervals of the metrics, for display."""
+        if len(samples) < 2:
+            return "not enough runs"
+        return "; ".join(f"{metric}: {mean:.4g} ± {half_width:.3g} (target ± {target:.3g})"
+                         for metric, (mean, half_width, target) in self.intervals(samples).items())
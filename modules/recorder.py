@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class RunningTotals:
+    """
+    Totals over the agents of a simulation, updated by the agents as they move and work,
+    so that the timewise results do not sum over all the agents every tick.
+    """
+    __slots__ = ('distance_moved', 'task_amount_done')
+
+    def __init__(self):
+        self.distance_moved = 0.0
+        self.task_amount_done = 0.0
+
+
+class TimewiseRecorder:
+    """
+    Columnar recorder of the timewise results.
+
+    - Records are written into preallocated NumPy chunks of `chunk_size` rows, with one typed field per column
+      (`columns`: list of `(label, type)`); a new chunk is allocated when the last one is full.
+    - With a `writer` (`ResultWriter`), full chunks are written out during the run instead, and their memory reused,
+      so that the memory used does not grow with the length of the run; `flush()` writes the rest.
+    - Decimation: `tick()` is called every tick, and records every `every_ticks` ticks, or every `every_seconds`
+      of simulation time if set. The first tick is always recorded, and `finish()` records the last one.
+    - `records()` returns the records kept in memory (all of them without a `writer`) as one structured array.
+    """
+    def __init__(self, columns, every_ticks=1, every_seconds=0, chunk_size=1024):
+        if every_ticks < 1 or every_seconds < 0 or chunk_size < 1:
+            raise ValueError("[ERROR] The timewise recording interval and chunk size must be positive")
+        self.dtype = np.dtype([(label, column_type) for label, column_type in columns])
+        self.every_ticks = every_ticks
+        self.every_seconds = every_seconds
+        self.chunk_size = chunk_size
+        self.chunks = [np.empty(chunk_size, dtype=self.dtype)]
+        self.num_rows = 0  # In the last chunk
+        self.writer = None
+        self.num_written = 0  # Records written out by the writer
+        self.last_time = None  # Time of the last record
+        self.ticks_since_record = 0
+
+    def __len__(self):
+        return self.num_written + (len(self.chunks) - 1) * self.chunk_size + self.num_rows
+
+    def append(self, values):
+        if self.num_rows == self.chunk_size:
+            if self.writer is not None:
+                self.flush()
+            else:
+                self.chunks.append(np.empty(self.chunk_size, dtype=self.dtype))
+                self.num_rows = 0
+        self.chunks[-1][self.num_rows] = tuple(values)
+        self.num_rows += 1
+
+    def tick(self, time, get_values):
+        """Record `get_values()` (called only if the tick is recorded) if the tick is due."""
+        self.ticks_since_record += 1
+        if self.last_time is not None:
+            if self.every_seconds > 0:
+                if time - self.last_time < self.every_seconds - 1e-9:
+                    return
+            elif self.ticks_since_record < self.every_ticks:
+                return
+        self.append(get_values())
+        self.last_time = time
+        self.ticks_since_record = 0
+
+    def finish(self, get_values):
+        """Record the last tick, if it was skipped by decimation."""
+        if self.ticks_since_record > 0:
+            self.append(get_values())
+            self.ticks_since_record = 0
+
+    def flush(self):
+        """Write the records kept in memory to the writer, and release them."""
+        records = self.records()
+        self.writer.write(records)
+        self.num_written += len(records)
+        self.chunks = self.chunks[-1:]
+        self.num_rows = 0
+
+    def records(self):
+        return np.concatenate(self.chunks[:-1] + [self.chunks[-1][:self.num_rows]])
@@ -0,0 +1,486 @@
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import pygame
+import numpy as np
+from modules.utils import generate_task_colors, pre_render_text, render_text, format_label_value, get_label_step
+
+# Header of the frame buffer (int64 slots)
+SEQUENCE = 0  # Incremented before and after each frame is written: odd while a frame is being written
+READ_SEQUENCE = 1  # Sequence of the last frame read by the renderer
+NUM_TASKS = 2
+TASKS_LEFT = 3
+MISSION_COMPLETED = 4
+QUIT = 5  # Set by the renderer when its window is closed, or by the simulation when it stops
+PAUSED = 6  # Toggled by the renderer (`P` key)
+HEADER_SIZE = 8
+
+# Columns of the agent and task states
+AGENT_COLUMNS = ['x', 'y', 'rotation', 'assigned_task_id', 'distance_moved', 'task_amount_done']
+TASK_COLUMNS = ['x', 'y', 'amount', 'completed']
+
+# Rendering options drawn by the renderer process; the others need the agent objects and are only drawn in `Screen` mode
+PROCESS_RENDERING_OPTIONS = ['agent_situation_awareness_circle', 'agent_id', 'agent_work_done', 'agent_assigned_task_id', 'task_id']
+
+BACKGROUND_COLOR = (224, 224, 224)
+
+
+class FrameBuffer:
+    """
+    Latest state of a simulation (agents, tasks, time), in shared memory between the simulation and the renderer process.
+
+    - Frames are guarded by a sequence number (seqlock): the writer makes it odd while writing, and the reader keeps a copy
+      only if the sequence number is even and unchanged after copying, so that neither side ever waits for the other.
+    - Only the latest frame is kept: intermediate states the renderer has no time to draw are dropped, and with
+      `publish()` the simulation does not even gather them until the renderer has read the last frame.
+    - `max_tasks` is the number of tasks the simulation can have, dynamically generated ones included.
+    """
+    def __init__(self, num_agents, max_tasks, name=None):
+        self.num_agents = num_agents
+        self.max_tasks = max_tasks
+        sizes = [HEADER_SIZE * 8, 8, num_agents * len(AGENT_COLUMNS) * 8, max_tasks * len(TASK_COLUMNS) * 8]
+        if name is None:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=sum(sizes))
+        else:
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+        offsets = np.cumsum([0] + sizes)
+        buffer = self.shared_memory.buf
+        self.header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=buffer, offset=offsets[0])
+        self.time = np.ndarray(1, dtype=np.float64, buffer=buffer, offset=offsets[1])
+        self.agents = np.ndarray((num_agents, len(AGENT_COLUMNS)), dtype=np.float64, buffer=buffer, offset=offsets[2])
+        self.tasks = np.ndarray((max_tasks, len(TASK_COLUMNS)), dtype=np.float64, buffer=buffer, offset=offsets[3])
+        if name is None:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shared_memory.name
+
+    def publish(self, simulation, force=False):
+        """
+        Write the state of `simulation`, unless the renderer has not read the last frame yet (and not `force`).
+        Returns whether the frame was written.
+        """
+        header = self.header
+        if not force and header[READ_SEQUENCE] != header[SEQUENCE]:
+            return False
+        agents = simulation.agents
+        tasks = simulation.tasks
+        num_tasks = min(len(tasks), self.max_tasks)
+        header[SEQUENCE] += 1
+        self.time[0] = simulation.simulation_time
+        self.agents[:] = [(agent.position.x, agent.position.y, agent.rotation,
+                           agent.assigned_task_id if agent.assigned_task_id is not None else -1,
+                           agent.distance_moved, agent.task_amount_done) for agent in agents]
+        self.tasks[:num_tasks, 0:2] = tasks.positions[:num_tasks]
+        self.tasks[:num_tasks, 2] = tasks.amounts[:num_tasks]
+        self.tasks[:num_tasks, 3] = tasks.completed[:num_tasks]
+        header[NUM_TASKS] = num_tasks
+        header[TASKS_LEFT] = simulation.tasks_left
+        header[MISSION_COMPLETED] = simulation.mission_completed
+        header[SEQUENCE] += 1
+        return True
+
+    def read(self):
+        """Copy of the latest frame `(time, agents, tasks, tasks_left, mission_completed)`, or None if there is no new complete frame."""
+        header = self.header
+        sequence = int(header[SEQUENCE])
+        if sequence % 2 == 1 or sequence == header[READ_SEQUENCE]:
+            return None
+        num_tasks = int(header[NUM_TASKS])
+        frame = (float(self.time[0]), self.agents.copy(), self.tasks[:num_tasks].copy(),
+                 int(header[TASKS_LEFT]), bool(header[MISSION_COMPLETED]))
+        if header[SEQUENCE] != sequence:  # Written meanwhile: torn copy
+            return None
+        header[READ_SEQUENCE] = sequence
+        return frame
+
+    @property
+    def quit_requested(self):
+        return bool(self.header[QUIT])
+
+    @property
+    def paused(self):
+        return bool(self.header[PAUSED])
+
+    def close(self, unlink=False):
+        # The arrays are views of the shared memory, which can only be closed once they are released
+        self.header = self.time = self.agents = self.tasks = None
+        self.shared_memory.close()
+        if unlink:
+            self.shared_memory.unlink()
+
+
+class RendererProcess:
+    """
+    Renderer of a simulation in a separate process (`rendering_mode: Process`), so that drawing and display pacing
+    do not slow the simulation down.
+
+    The simulation calls `publish()` after each tick; the renderer draws the latest frame at `frame_rate` frames per second,
+    handles the window events (`ESC`/`Q` to quit, `P` to pause, `R` to record a GIF), and reports them back through the frame buffer.
+    """
+    def __init__(self, simulation, result_saver, frame_rate=30):
+        config = simulation.config
+        rendering_options = config['simulation'].get('rendering_options') or {}
+        not_drawn = [option for option, enabled in rendering_options.items() if enabled is True and option not in PROCESS_RENDERING_OPTIONS]
+        if not_drawn:
+            print(f"[WARNING] Rendering options only drawn in `Screen` mode: {not_drawn}")
+        self.frame_buffer = FrameBuffer(len(simulation.agents), len(simulation.tasks.colors))
+        self.frame_buffer.publish(simulation)
+        context = multiprocessing.get_context('spawn')  # A fresh interpreter: the display is not shared with the simulation process
+        self.process = context.Process(target=run_renderer, name='space-renderer',
+                                       args=(self.frame_buffer.name, self.frame_buffer.num_agents, self.frame_buffer.max_tasks,
+                                             config, result_saver, frame_rate))
+        self.process.start()
+
+    def publish(self, simulation, force=False):
+        return self.frame_buffer.publish(simulation, force)
+
+    @property
+    def running(self):
+        return self.process.is_alive() and not self.frame_buffer.quit_requested
+
+    @property
+    def paused(self):
+        return self.frame_buffer.paused
+
+    def close(self):
+        """Ask the renderer to stop (if the window is still open), wait for it, and release the frame buffer."""
+        self.frame_buffer.header[QUIT] = 1
+        self.process.join()
+        self.frame_buffer.close(unlink=True)
+
+
+class TaskLayer:
+    """
+    Cached surface of the background and the tasks (circles, and their `task_id` labels if `show_task_id`),
+    over which the agents are drawn.
+
+    - Tasks only change when they are worked on, completed or created: `update()` redraws only the regions of the tasks
+      whose drawn radius, label or completion changed since the last update (with the other tasks overlapping these
+      regions, in `task_id` order), and returns these regions, to be copied to the screen.
+    - The whole layer is redrawn on the first update, after `invalidate()` (e.g. the window was resized),
+      or when more than `max_changed_tasks` tasks changed at once.
+    """
+    def __init__(self, size, task_visualisation_factor, show_task_id=False, label_step=1.0, max_changed_tasks=200):
+        self.surface = pygame.Surface(size)
+        self.task_visualisation_factor = task_visualisation_factor
+        self.show_task_id = show_task_id
+        self.label_step = label_step
+        self.max_changed_tasks = max_changed_tasks
+        self.radii = np.zeros(0, dtype=int)  # Radius drawn, by task (-1: not drawn)
+        self.labels = []  # Label drawn, by task (None: not drawn)
+        self.label_values = np.zeros(0)  # Amount shown by the label (in `label_step` units), by task (NaN: not drawn)
+        self.rects = np.zeros((0, 4), dtype=int)  # Region drawn (left, top, right, bottom), by task
+        self.valid = False
+
+    def invalidate(self, size=None):
+        """Redraw the whole layer at the next update, at a new `size` if given."""
+        if size is not None and size != self.surface.get_size():
+            self.surface = pygame.Surface(size)
+        self.valid = False
+
+    def update(self, positions, amounts, completed, colors):
+        """Bring the layer up to date with the tasks (columns indexed by `task_id`); returns the regions redrawn."""
+        num_tasks = len(amounts)
+        num_drawn = len(self.radii)
+        if num_tasks > num_drawn:  # New tasks
+            self.radii = np.concatenate([self.radii, np.full(num_tasks - num_drawn, -1)])
+            self.label_values = np.concatenate([self.label_values, np.full(num_tasks - num_drawn, np.nan)])
+            self.labels += [None] * (num_tasks - num_drawn)
+            self.rects = np.concatenate([self.rects, np.zeros((num_tasks - num_drawn, 4), dtype=int)])
+        radii = np.where(completed, -1, (amounts / self.task_visualisation_factor).astype(int))
+        changed = radii != self.radii
+        if self.show_task_id:
+            # Labels show the amounts rounded to `label_step` (see `format_label_value()`): only those whose rounded amount changed are redrawn
+            label_values = np.where(completed, np.nan, np.round(amounts / self.label_step))
+            changed |= (label_values != self.label_values) & ~(np.isnan(label_values) & np.isnan(self.label_values))
+            self.label_values = label_values
+        if not self.valid:
+            changed[:] = True
+        changed = np.flatnonzero(changed).tolist()
+        if not changed:
+            return []
+
+        old_rects = self.rects.copy()
+        self.radii = radii
+        for task_id in changed:
+            self.labels[task_id] = (f"task_id {task_id}: {format_label_value(amounts[task_id], self.label_step)}"
+                                    if self.show_task_id and not completed[task_id] else None)
+            self.rects[task_id] = self.task_rect(positions[task_id], radii[task_id], self.labels[task_id])
+        if not self.valid or len(changed) > self.max_changed_tasks:
+            self.surface.fill(BACKGROUND_COLOR)
+            self.draw_tasks(np.flatnonzero(radii >= 0), positions, colors)
+            self.valid = True
+            return [self.surface.get_rect()]
+
+        # Region of each changed task: where it was drawn and where it is drawn now
+        old_rects, new_rects = old_rects[changed], self.rects[changed]
+        old_drawn, new_drawn = (old_rects[:, 2] > old_rects[:, 0])[:, None], (new_rects[:, 2] > new_rects[:, 0])[:, None]
+        region_bounds = np.where(old_drawn & new_drawn, np.hstack([np.minimum(old_rects[:, :2], new_rects[:, :2]), np.maximum(old_rects[:, 2:], new_rects[:, 2:])]),
+                                 np.where(old_drawn, old_rects, new_rects))
+        region_bounds = region_bounds[(region_bounds[:, 2] > region_bounds[:, 0])]
+
+        # Tasks overlapping each region, redrawn in it
+        drawn_ids = np.flatnonzero(radii >= 0)
+        drawn_rects = self.rects[drawn_ids]
+        overlapping = ((drawn_rects[None, :, 0] < region_bounds[:, None, 2]) & (drawn_rects[None, :, 2] > region_bounds[:, None, 0])
+                       & (drawn_rects[None, :, 1] < region_bounds[:, None, 3]) & (drawn_rects[None, :, 3] > region_bounds[:, None, 1]))
+        regions = []
+        for (left, top, right, bottom), overlapping_tasks in zip(region_bounds.tolist(), overlapping):
+            region = pygame.Rect(left, top, right - left, bottom - top)
+            self.surface.set_clip(region)
+            self.surface.fill(BACKGROUND_COLOR, region)
+            self.draw_tasks(drawn_ids[overlapping_tasks], positions, colors)
+            regions.append(region)
+        self.surface.set_clip(None)
+        return regions
+
+    def task_rect(self, position, radius, label):
+        """Region covered by a task drawn with `radius` and `label` (left, top, right, bottom); empty if not drawn."""
+        if radius < 0:
+            return (0, 0, 0, 0)
+        x, y = int(position[0]), int(position[1])
+        left, top, right, bottom = x - radius - 1, y - radius - 1, x + radius + 2, y + radius + 2
+        if label is not None:
+            label_rect = render_text(label, 15, (250, 250, 250)).get_rect(topleft=(x, y))
+            left, top, right, bottom = min(left, label_rect.left), min(top, label_rect.top), max(right, label_rect.right), max(bottom, label_rect.bottom)
+        return (left, top, right, bottom)
+
+    def draw_tasks(self, task_ids, positions, colors):
+        """Draw tasks in `task_id` order, as `Task.draw()` and `Task.draw_task_id()`."""
+        for task_id in task_ids.tolist():
+            position = (positions[task_id][0], positions[task_id][1])
+            pygame.draw.circle(self.surface, colors.get(task_id, (0, 0, 0)), position, int(self.radii[task_id]))
+            if self.labels[task_id] is not None:
+                self.surface.blit(render_text(self.labels[task_id], 15, (250, 250, 250)), position)
+
+
+def agent_drawing_mode(num_agents, rendering_options):
+    """
+    How the agents are drawn, by number of agents:
+    - `Polygon`: one polygon per agent (see `Agent.draw()`)
+    - `Sprite`: from `sprite_agent_count` agents, pre-rotated sprites blitted at once (see `AgentSprites`), and communication links drawn as plain lines with one dirty region (see `draw_segments()`)
+    - `Dot`: from `lod_agent_count` agents (level of detail), one dot per agent, without the agents' labels, tails, paths and circles
+    """
+    if num_agents >= rendering_options.get('lod_agent_count', 2000):
+        return 'Dot'
+    if num_agents >= rendering_options.get('sprite_agent_count', 200):
+        return 'Sprite'
+    return 'Polygon'
+
+
+class AgentSprites:
+    """
+    Agent triangles (see `Agent.draw()`) pre-rendered by color and rotation, quantized to `num_rotations` steps,
+    so that all the agents are drawn with one `blits()` call.
+    """
+    COLORKEY = (255, 0, 255)
+
+    def __init__(self, num_rotations=64, size=10):
+        self.num_rotations = num_rotations
+        self.size = size
+        self.half_width = size + 1
+        self.sprites = {}  # (color, rotation index) -> Surface
+
+    def sprite(self, color, rotation_index):
+        key = (color, rotation_index)
+        if key not in self.sprites:
+            width = 2 * self.half_width + 1
+            surface = pygame.Surface((width, width))
+            surface.fill(self.COLORKEY)
+            surface.set_colorkey(self.COLORKEY)
+            angle = rotation_index * 2 * math.pi / self.num_rotations
+            pygame.draw.polygon(surface, color, [(self.half_width + self.size * math.cos(angle + offset), self.half_width + self.size * math.sin(angle + offset))
+                                                 for offset in (0, 2.5, -2.5)])
+            self.sprites[key] = surface
+        return self.sprites[key]
+
+    def draw(self, screen, x, y, rotations, colors):
+        """Draw agents at positions `x`, `y` with `rotations` (arrays) and `colors` (list); returns the regions drawn."""
+        rotation_indices = (np.rint(rotations * self.num_rotations / (2 * math.pi)).astype(int) % self.num_rotations).tolist()
+        lefts = (np.rint(x).astype(int) - self.half_width).tolist()
+        tops = (np.rint(y).astype(int) - self.half_width).tolist()
+        return screen.blits([(self.sprite(color, rotation_index), (left, top))
+                             for color, rotation_index, left, top in zip(colors, rotation_indices, lefts, tops)])
+
+
+def plot_pixels(surface, x, y, colors, radius=0):
+    """
+    Set the pixels at `x`, `y` (integer arrays), and those within `radius` of them (squares), to `colors` (one color, or one per pixel)
+    with array operations. Returns the region drawn, or None.
+    """
+    width, height = surface.get_size()
+    if np.ndim(colors) == 1:
+        mapped_colors = np.full(len(x), surface.map_rgb(colors))
+    else:
+        palette = {color: surface.map_rgb(color) for color in set(colors)}
+        mapped_colors = np.array([palette[color] for color in colors])
+    x_offsets, y_offsets = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1))
+    x = (x[:, None] + x_offsets.ravel()).ravel()
+    y = (y[:, None] + y_offsets.ravel()).ravel()
+    mapped_colors = np.repeat(mapped_colors, x_offsets.size)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    if not inside.any():
+        return None
+    x, y = x[inside], y[inside]
+    pixels = pygame.surfarray.pixels2d(surface)
+    pixels[x, y] = mapped_colors[inside]
+    del pixels  # Unlock the surface
+    return pygame.Rect(int(x.min()), int(y.min()), int(x.max() - x.min()) + 1, int(y.max() - y.min()) + 1)
+
+
+def draw_segments(surface, starts, ends, color):
+    """
+    Draw 1-pixel line segments from `starts` to `ends` (arrays of shape (n, 2)), rounded to pixels at once, with one
+    `pygame.draw.line()` call per segment; returns their bounding region rather than one region per segment.
+    (pygame has no call for disjoint segments, and setting their pixels with array operations is slower than its lines.)
+    """
+    if len(starts) == 0:
+        return None
+    starts = np.rint(np.asarray(starts, dtype=float)).astype(int)
+    ends = np.rint(np.asarray(ends, dtype=float)).astype(int)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        pygame.draw.line(surface, color, start, end)
+    points = np.concatenate([starts, ends])
+    left, top = points.min(axis=0).tolist()
+    right, bottom = points.max(axis=0).tolist()
+    return pygame.Rect(left, top, right - left + 1, bottom - top + 1).clip(surface.get_rect())
+
+
+def draw_agent_dots(surface, x, y, colors):
+    """Level of detail for very large swarms: agents as 3x3 dots of their `colors`."""
+    return plot_pixels(surface, np.rint(x).astype(int), np.rint(y).astype(int), colors, radius=1)
+
+
+def communication_links(agents):
+    """Start and end positions of the communication links between the agents (see `Agent.draw_communication_topology()`)."""
+    starts = []
+    ends = []
+    for agent in agents:
+        for neighbor_agent in agent.agents_nearby:
+            if neighbor_agent.agent_id > agent.agent_id:
+                neighbor_position = agents[neighbor_agent.agent_id].position
+                starts.append((agent.position.x, agent.position.y))
+                ends.append((neighbor_position.x, neighbor_position.y))
+    return starts, ends
+
+
+def add_dirty_rects(dirty_rects, drawn):
+    """Add the region(s) returned by a drawing function (a `Rect`, a list of them, or None) to `dirty_rects`."""
+    if drawn is None:
+        return
+    if isinstance(drawn, pygame.Rect):
+        dirty_rects.append(drawn)
+    else:
+        dirty_rects.extend(rect for rect in drawn if rect is not None)
+
+
+def draw_frame(screen, frame, task_layer, task_colors, config, agent_sprites):
+    """
+    Draw a frame of the frame buffer, as `main.game_loop()` draws the simulation in `Screen` mode, over the task layer,
+    with the agents drawn in the mode of `agent_drawing_mode()`.
+    """
+    simulation_time, agents, tasks, tasks_left, mission_completed = frame
+    simulation_config = config['simulation']
+    rendering_options = simulation_config.get('rendering_options', {})
+    situation_awareness_radius = config.get('agents', {}).get('situation_awareness_radius', 0)
+    label_step = get_label_step(rendering_options)
+
+    # Tasks not completed yet, with a radius proportional to their amount left
+    task_layer.update(tasks[:, 0:2], tasks[:, 2], tasks[:, 3] != 0, task_colors)
+    screen.blit(task_layer.surface, (0, 0))
+
+    # Agents: triangles pointing along their rotation (see `Agent.draw()`), colored by their assigned task
+    size = 10
+    x, y, rotation = agents[:, 0], agents[:, 1], agents[:, 2]
+    assigned_task_ids = agents[:, 3].astype(int).tolist()
+    colors = [task_colors.get(assigned_task_id, (20, 20, 20)) for assigned_task_id in assigned_task_ids]
+    drawing_mode = agent_drawing_mode(len(agents), rendering_options)
+    if drawing_mode == 'Dot':
+        draw_agent_dots(screen, x, y, colors)
+        assigned_task_ids = []  # No labels nor circles
+    elif drawing_mode == 'Sprite':
+        agent_sprites.draw(screen, x, y, rotation, colors)
+    else:
+        corners = [(x + size * np.cos(rotation + offset), y + size * np.sin(rotation + offset)) for offset in (0, 2.5, -2.5)]
+    for agent_id, assigned_task_id in enumerate(assigned_task_ids):
+        color = colors[agent_id]
+        position = (x[agent_id], y[agent_id])
+        if rendering_options.get('agent_id'):
+            screen.blit(render_text(f"agent_id: {agent_id}", 15, (50, 50, 50)), (position[0] + 10, position[1] - 10))
+        if rendering_options.get('agent_assigned_task_id'):
+            text = f"task_id: {assigned_task_id if assigned_task_id >= 0 else None}"
+            screen.blit(render_text(text, 15, (50, 50, 50)), (position[0] + 10, position[1]))
+        if rendering_options.get('agent_work_done'):
+            screen.blit(render_text(f"dist: {format_label_value(agents[agent_id, 4], label_step)}", 15, (50, 50, 50)), (position[0] + 10, position[1] + 10))
+            screen.blit(render_text(f"work: {format_label_value(agents[agent_id, 5], label_step)}", 15, (50, 50, 50)), (position[0] + 10, position[1] + 20))
+        if rendering_options.get('agent_situation_awareness_circle') and situation_awareness_radius > 0:
+            pygame.draw.circle(screen, color, position, situation_awareness_radius, 1)
+        if drawing_mode == 'Polygon':
+            pygame.draw.polygon(screen, color, [(corner_x[agent_id], corner_y[agent_id]) for corner_x, corner_y in corners])
+
+    # Display task quantity and elapsed simulation time
+    screen_width, screen_height = simulation_config['screen_width'], simulation_config['screen_height']
+    screen.blit(pre_render_text(f'Tasks left: {tasks_left}; Time: {simulation_time:.2f}s', 36, (0, 0, 0)), (screen_width - 350, 20))
+    if mission_completed:
+        mission_completed_text = render_text("MISSION COMPLETED", 72, (0, 0, 0))
+        screen.blit(mission_completed_text, mission_completed_text.get_rect(center=(screen_width // 2, screen_height // 2)))
+
+
+def run_renderer(shared_memory_name, num_agents, max_tasks, config, result_saver, frame_rate):
+    """Main loop of the renderer process: draw the latest frame of the frame buffer at `frame_rate` frames per second."""
+    frame_buffer = FrameBuffer(num_agents, max_tasks, name=shared_memory_name)
+    header = frame_buffer.header
+    simulation_config = config['simulation']
+    gif_recording_fps = simulation_config['gif_recording_fps']
+    save_gif = simulation_config.get('saving_options', {}).get('save_gif', False)
+    task_colors = generate_task_colors(max_tasks)
+
+    pygame.init()
+    screen = pygame.display.set_mode((simulation_config['screen_width'], simulation_config['screen_height']), pygame.RESIZABLE)
+    pygame.display.set_icon(pygame.image.load('assets/logo.jpg'))
+    pygame.display.set_caption('SPACE(Swarm Planning And Control Evaluation) Simulator')
+    rendering_options = simulation_config.get('rendering_options') or {}
+    task_layer = TaskLayer(screen.get_size(), simulation_config['task_visualisation_factor'],
+                           rendering_options.get('task_id', False), get_label_step(rendering_options))
+    agent_sprites = AgentSprites()
+    clock = pygame.time.Clock()
+
+    recording = save_gif
+    frames = []
+    last_frame_time = -math.inf
+    if recording:
+        print("Recording started...")
+    while not header[QUIT]:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_q)):
+                header[QUIT] = 1
+            elif event.type == pygame.VIDEORESIZE:
+                task_layer.invalidate(screen.get_size())
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                header[PAUSED] = 1 - header[PAUSED]
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                recording = not recording
+                if recording:
+                    frames = []
+                    last_frame_time = -math.inf
+                    print("Recording started...")
+                else:
+                    print("Recording stopped.")
+                    result_saver.save_gif(frames)
+
+        frame = frame_buffer.read()
+        if frame is not None:
+            draw_frame(screen, frame, task_layer, task_colors, config, agent_sprites)
+            pygame.display.flip()
+            if recording and frame[0] - last_frame_time > 1.0 / gif_recording_fps:
+                frames.append(pygame.surfarray.array3d(screen))
+                last_frame_time = frame[0]
+        clock.tick(frame_rate)
+
+    pygame.quit()
+    if recording:
+        print("Recording stopped.")
+        result_saver.save_gif(frames)
+    frame_buffer.close()
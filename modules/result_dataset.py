@@ -0,0 +1,155 @@
+import os
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from modules.result_writer import read_results
+
+
+class ResultDataset:
+    """
+    Consolidated dataset of the `kind` (`timewise` or `agentwise`) result files of a Monte Carlo analysis.
+
+    - The rows of all the result files are kept in one DataFrame (`data`), with a `case` column (category) and a `run_id`
+      column (integer, one per result file, never reused).
+    - On disk, the rows are stored in partitions, one pickle per update in the `{kind}` subfolder of `folder`, so that
+      an update only writes the rows of the files it read. A manifest (`{kind}_manifest.json`) lists the partitions, and
+      records the size and modification time of each file ingested: `update()` only reads the files which are new or
+      have changed since, and drops those no longer listed.
+    - The rows of dropped files stay in their partitions, and are filtered out when the dataset is loaded, until they
+      outnumber the rows in use: the rows in use are then rewritten into one partition (compaction), so that the
+      partitions hold at most twice the rows in use.
+    - The manifest is written last, through a temporary file: an interrupted update leaves the previous dataset intact,
+      and the partitions it does not list are deleted by the next update.
+    - New files are read in parallel by a pool of `workers` processes (by default one per CPU core).
+    - Without any result file, the DataFrame is empty, with the `columns` expected in the result files.
+    """
+    def __init__(self, folder, kind, workers=None, columns=()):
+        self.folder = folder
+        self.kind = kind
+        self.columns = list(columns)
+        self.workers = workers or os.cpu_count() or 1
+        self.data_path = os.path.join(folder, kind)  # Folder of the partitions
+        self.manifest_path = os.path.join(folder, f"{kind}_manifest.json")
+        self.data = None
+        self.files = {}  # Result file path -> {'case', 'run_id', 'rows', 'size', 'mtime_ns'}
+        self.partitions = []  # {'name', 'rows'}, in the order they were written
+        self.next_run_id = 0
+        self.next_partition = 0
+        os.makedirs(self.data_path, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if 'partitions' in manifest:  # A dataset saved as one pickle by an earlier version is read again from the result files
+                self.files = manifest['files']
+                self.partitions = manifest['partitions']
+                self.next_run_id = manifest['next_run_id']
+                self.next_partition = manifest['next_partition']
+                self.data = self.load()
+
+    def load(self):
+        """Rows of the files of the manifest, from the partitions."""
+        frames = []
+        for partition in self.partitions:
+            with open(os.path.join(self.data_path, partition['name']), 'rb') as f:
+                frames.append(pickle.load(f))
+        return self.build(frames, [entry['run_id'] for entry in self.files.values()])
+
+    def build(self, frames, run_ids):
+        """One DataFrame of the rows of `frames` whose run is in `run_ids`, sorted by run."""
+        if frames:
+            data = pd.concat(frames, ignore_index=True)
+            data = data[data['run_id'].isin(run_ids)]
+        else:
+            data = pd.DataFrame({**{column: np.zeros(0) for column in self.columns}, 'case': [], 'run_id': np.zeros(0, dtype=int)})
+        data['case'] = data['case'].astype('category')
+        return data.sort_values('run_id', kind='stable', ignore_index=True)
+
+    def run_id(self, path):
+        """Run id of the result file `path`, or None if it is not in the dataset."""
+        entry = self.files.get(path)
+        return entry['run_id'] if entry is not None else None
+
+    def update(self, files_by_case):
+        """
+        Bring the dataset up to date with the result files of each case (`{case: [paths]}`), in place.
+        Returns the number of files read.
+        """
+        listed = {path: case for case, paths in files_by_case.items() for path in paths}
+        stale = False
+        new = []
+        for path, case in listed.items():
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry is None or (entry['case'], entry['size'], entry['mtime_ns']) != (case, stat.st_size, stat.st_mtime_ns):
+                stale = stale or entry is not None
+                new.append((path, case, stat))
+        stale = stale or any(path not in listed for path in self.files)
+        if not new and not stale and self.data is not None:
+            return 0
+
+        new_paths = {path for path, _, _ in new}
+        self.files = {path: entry for path, entry in self.files.items() if path in listed and path not in new_paths}
+        frames = [self.data] if self.data is not None else []
+
+        if new:
+            new_data = self.read_files([path for path, _, _ in new])
+            lengths = [len(frame) for frame in new_data]
+            run_ids = np.arange(self.next_run_id, self.next_run_id + len(new))
+            self.next_run_id += len(new)
+            new_data = pd.concat(new_data, ignore_index=True)
+            new_data['case'] = np.repeat([case for _, case, _ in new], lengths)
+            new_data['run_id'] = np.repeat(run_ids, lengths)
+            frames.append(new_data)
+            for (path, case, stat), run_id, length in zip(new, run_ids.tolist(), lengths):
+                self.files[path] = {'case': case, 'run_id': run_id, 'rows': length, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            self.write_partition(new_data)
+
+        self.data = self.build(frames, [entry['run_id'] for entry in self.files.values()])
+        if sum(partition['rows'] for partition in self.partitions) > 2 * len(self.data):
+            self.partitions = []
+            if len(self.data) > 0:
+                self.write_partition(self.data)
+        self.save()
+        return len(new)
+
+    def read_files(self, paths):
+        """Read result files, in parallel if there are several of them and several workers."""
+        if self.workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as executor:
+                return list(executor.map(read_results, paths, chunksize=max(1, len(paths) // (4 * self.workers))))
+        return [read_results(path) for path in paths]
+
+    def write_partition(self, data):
+        """Write the rows `data` to a new partition (listed in the manifest by the next `save()`)."""
+        name = f"part-{self.next_partition:06d}.pkl"
+        self.next_partition += 1
+        path = os.path.join(self.data_path, name)
+        with open(f"{path}.tmp", 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+        self.partitions.append({'name': name, 'rows': len(data)})
+
+    def save(self):
+        """Write the manifest, which commits the partitions written since the last save, and delete the unlisted partitions."""
+        manifest = {'files': self.files, 'partitions': self.partitions, 'next_run_id': self.next_run_id, 'next_partition': self.next_partition}
+        with open(f"{self.manifest_path}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+        listed = {partition['name'] for partition in self.partitions}
+        for name in os.listdir(self.data_path):
+            if name not in listed:
+                os.remove(os.path.join(self.data_path, name))
+        legacy_path = os.path.join(self.folder, f"{self.kind}.pkl")  # Whole dataset, as saved by earlier versions
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def case_data(self, case):
+        """Rows of the runs of `case`."""
+        return self.data[self.data['case'] == case]
+
+    def runs(self, case):
+        """Results of the runs of `case`, one DataFrame per result file, without the `case` and `run_id` columns."""
+        return [frame.drop(columns=['case', 'run_id']).reset_index(drop=True)
+                for _, frame in self.case_data(case).groupby('run_id', sort=True)]
@@ -0,0 +1,83 @@
+import os
+import multiprocessing
+from matplotlib.figure import Figure
+from modules.result_writer import read_results
+
+
+def image_file_path(result_file_path):
+    """Path of the plot of a result file (`.csv` or `.csv.gz`)."""
+    if result_file_path.endswith('.gz'):
+        result_file_path = result_file_path[:-len('.gz')]
+    return f"{os.path.splitext(result_file_path)[0]}.png"
+
+
+def plot_timewise_result(data, img_file_path):
+    """Plot the timewise results (a DataFrame, or the path of a result file) to `img_file_path`."""
+    df = read_results(data) if isinstance(data, str) else data
+    time = df['time']
+
+    # Figures are made without pyplot, which keeps global state, so that plots can be rendered in any thread or process
+    figure = Figure(figsize=(12, 8))
+    subplots = [
+        ('agents_total_distance_moved', 'Total Distance Moved by Agents', 'Distance Moved'),
+        ('agents_total_task_amount_done', 'Total Task Amount Done by Agents', 'Task Amount Done'),
+        ('remaining_tasks', 'The Number of Remaining Tasks', 'The Number of Remaining Tasks'),
+        ('tasks_total_amount_left', 'Total Amount of Tasks', 'Tasks Total Amount'),
+    ]
+    for i, (column, label, y_label) in enumerate(subplots):
+        axes = figure.add_subplot(2, 2, i + 1)
+        axes.plot(time, df[column], label=label)
+        axes.set_xlabel('Time')
+        axes.set_ylabel(y_label)
+        axes.legend()
+        axes.grid(True)
+
+    figure.tight_layout()
+    figure.savefig(img_file_path)
+
+
+def plot_boxplot(data, columns, img_file_path):
+    """Box plots of the `columns` of the results (a DataFrame, or the path of a result file) to `img_file_path`."""
+    df = read_results(data) if isinstance(data, str) else data
+
+    figure = Figure(figsize=(8, 6))
+    for i, column in enumerate(columns):
+        axes = figure.add_subplot(1, len(columns), i + 1)  # Create a subplot for each column
+        axes.boxplot(df[column], patch_artist=True)
+        axes.set_xlabel(column)
+        axes.grid(True)
+
+    figure.tight_layout()  # Adjust layout to prevent overlap
+    figure.savefig(img_file_path)
+
+
+def render_plots(jobs):
+    """Render plots given as `(function, args)`."""
+    for function, args in jobs:
+        function(*args)
+
+
+def render_plots_in_background(jobs):
+    """
+    Render plots in a separate process, so that the caller goes on without waiting for matplotlib.
+    The process is not a daemon: the interpreter waits for it to finish before exiting.
+    """
+    process = multiprocessing.Process(target=render_plots, args=(jobs,), name='space-plots')
+    process.start()
+    return process
+
+
+def plot_result_files(result_files):
+    """
+    Plot saved results (`timewise` and `agentwise` paths, as returned by `Simulation.save_results()`),
+    e.g. at the end of a Monte Carlo campaign rather than after each run. Returns the paths of the plots.
+    """
+    img_file_paths = []
+    if result_files.get('timewise'):
+        img_file_paths.append(image_file_path(result_files['timewise']))
+        plot_timewise_result(result_files['timewise'], img_file_paths[-1])
+    if result_files.get('agentwise'):
+        df = read_results(result_files['agentwise'])
+        img_file_paths.append(image_file_path(result_files['agentwise']))
+        plot_boxplot(df, [column for column in df.columns if column != 'agent_id'], img_file_paths[-1])
+    return img_file_paths
@@ -0,0 +1,184 @@
+import os
+import datetime
+import shutil
+import yaml
+from modules.utils import load_config
+
+# Reporting dependencies (pandas, matplotlib, imageio, PIL) are imported when first needed, in `result_writer.py`,
+# `result_plots.py` and `save_gif()`, so that runs which do not save or plot results do not load them
+PLOT_MODES = ['Inline', 'Background', 'None']
+
+
+class ResultSaver:
+    def __init__(self, config, config_file_path=None, output_subfolder=None, run_tag=None, plot_mode=None):
+        """
+        - output_subfolder: subfolder of the output directory to save to (e.g. one per Monte Carlo worker)
+        - run_tag: appended to the file names, to tell apart runs saved within the same second
+        - plot_mode: how to plot the results (see `plot_results()`); `saving_options.plot_results` by default
+        """
+        self.config = config
+        self.config_file_path = config_file_path
+        self.output_subfolder = output_subfolder
+        self.run_tag = run_tag
+        self.result_file_format = config['simulation'].get('saving_options', {}).get('result_file_format', 'csv')  # `csv` or `csv.gz`
+        self.plot_mode = plot_mode or config['simulation'].get('saving_options', {}).get('plot_results', 'Background')
+        if self.plot_mode not in PLOT_MODES:
+            raise ValueError(f"[ERROR] Unknown `plot_results` option: {self.plot_mode} (options: {PLOT_MODES})")
+        self.result_file_path = self.generate_output_filename()
+        self.timewise_result_file_path = self.generate_output_filename(additional_keyword="timewise")
+        self.agentwise_result_file_path = self.generate_output_filename(additional_keyword="agentwise")
+        self.df_timewise_result = None
+        self.df_agentwise_result = None
+
+    def generate_output_filename(self, extension = "csv", additional_keyword = None):
+        config = self.config
+        agent_quantity = config['agents']['quantity']
+        task_quantity = config['tasks']['quantity']
+        decision_making_module_path = config['decision_making']['plugin']
+        module_path, class_name = decision_making_module_path.rsplit('.', 1)
+        datetime_now = datetime.datetime.now()
+        current_time_string = datetime_now.strftime("%Y-%m-%d_%H-%M-%S")        
+        
+        current_date_string = datetime.datetime.now().strftime("%Y-%m-%d")
+        output_parent_folder = config['simulation']['saving_options'].get('output_folder', 'output')
+        with_date_subfolder = config['simulation']['saving_options'].get('with_date_subfolder', True)
+        if with_date_subfolder:
+            output_dir = os.path.join(output_parent_folder, current_date_string)       
+        else:
+            output_dir = output_parent_folder        
+        if self.output_subfolder is not None:
+            output_dir = os.path.join(output_dir, self.output_subfolder)
+        os.makedirs(output_dir, exist_ok=True) 
+        if self.run_tag is not None:
+            current_time_string = f"{current_time_string}_{self.run_tag}"
+        if additional_keyword == None:
+            file_path = os.path.join(output_dir, f"{class_name}_a{agent_quantity}_t{task_quantity}_{current_time_string}.{extension}")
+        else:
+            file_path = os.path.join(output_dir, f"{class_name}_a{agent_quantity}_t{task_quantity}_{current_time_string}_{additional_keyword}.{extension}")
+
+        return file_path
+
+    def change_file_extension(self, file_path, new_extension):
+        base, _ = os.path.splitext(file_path)  # Split the file path into base and extension
+        new_file_path = f"{base}.{new_extension}"  # Combine base with new extension
+        return new_file_path
+
+
+
+    def save_gif(self, frames):
+        if frames:                  
+            gif_recording_fps = self.config['simulation']['gif_recording_fps']
+            gif_file_path = self.change_file_extension(self.result_file_path, "gif")
+
+            import imageio
+            from PIL import Image
+
+            # Convert pygame surface to PIL Image and save as GIF
+            image_list = []
+            for frame in frames:
+                image = frame.swapaxes(0, 1)  # Swap axes to fix orientation
+                image = Image.fromarray(image)
+                image_list.append(image)
+
+            imageio.mimsave(gif_file_path, image_list, duration=1.0/gif_recording_fps)  # Adjust duration for faster playback                    
+            # imageio.mimsave(gif_file_path, frames)
+            print(f"Saved GIF: {gif_file_path}")            
+
+    def save_config_yaml(self):
+        # Copy config.yaml to the result directory                 
+        yaml_file_path = self.change_file_extension(self.result_file_path, "yaml")    
+        if self.config_file_path is not None and load_config(self.config_file_path) == self.config:
+            shutil.copy(self.config_file_path, yaml_file_path)
+            print(f"Copied {self.config_file_path} to: {yaml_file_path}")        
+        else: # The configuration was not loaded from a file, or was changed (e.g. the seed was set)
+            with open(yaml_file_path, 'w') as f:
+                yaml.safe_dump(self.config, f, sort_keys=False)
+            print(f"Saved config to: {yaml_file_path}")
+        return yaml_file_path
+
+    def result_table_path(self, type):
+        """Path of the result table of `type` ("agentwise", "timewise" or None), in `result_file_format`."""
+        if type == "agentwise":
+            file_path = self.agentwise_result_file_path
+        elif type == "timewise":
+            file_path = self.timewise_result_file_path
+        else:
+            file_path = self.result_file_path
+        return self.change_file_extension(file_path, self.result_file_format)
+
+    def open_writer(self, type, data_labels):
+        """`ResultWriter` of the result table of `type`, to write it by chunks."""
+        from modules.result_writer import ResultWriter
+        return ResultWriter(self.result_table_path(type), data_labels)
+
+    def save_to_csv(self, type, data_records, data_labels):
+        """
+        save list to csv
+        - type: "agentwise" or "timewise" or None
+        - data
+        - label        
+        """
+
+        import pandas as pd
+
+        # Prepare data for DataFrame
+        df = pd.DataFrame(data_records, columns=data_labels)
+        if type == "agentwise":
+            self.df_agentwise_result = df
+        elif type == "timewise":
+            self.df_timewise_result = df
+        
+        # Save the DataFrame to a CSV file    
+        csv_file_path = self.result_table_path(type)
+        self.open_writer(type, data_labels).write(df)
+            
+        return csv_file_path
+
+    def plot_results(self, timewise=None, agentwise=None, agentwise_columns=None):
+        """
+        Plot the timewise and agentwise results (DataFrames, or paths of result files), as set by `plot_mode`:
+        `Inline`, `Background` (in a separate process, without waiting for it) or `None`.
+        """
+        if self.plot_mode == "None" or (timewise is None and agentwise is None):
+            return
+        from modules.result_plots import plot_boxplot, plot_timewise_result, render_plots, render_plots_in_background
+
+        jobs = []
+        if timewise is not None:
+            jobs.append((plot_timewise_result, (timewise, self.change_file_extension(self.timewise_result_file_path, "png"))))
+        if agentwise is not None:
+            jobs.append((plot_boxplot, (agentwise, agentwise_columns, self.change_file_extension(self.agentwise_result_file_path, "png"))))
+        if self.plot_mode == "Background":
+            render_plots_in_background(jobs)
+        else:
+            render_plots(jobs)
+
+    def plot_timewise_result(self, csv_file_path):
+        from modules.result_plots import plot_timewise_result
+        plot_timewise_result(csv_file_path, self.change_file_extension(self.timewise_result_file_path, "png"))
+
+    def plot_boxplot(self, csv_file_path, columns):
+        """
+        Create and save a boxplot for specified columns from a CSV file using subplots.
+        - csv_file_path: Path to the CSV file.
+        - columns: List of column names to plot.
+        """
+        from modules.result_plots import plot_boxplot
+        plot_boxplot(csv_file_path, columns, self.change_file_extension(self.agentwise_result_file_path, "png"))
+
+    def get_agentwise_results(self, agents, variable_list):
+        """
+        Get results for each agent based on specified attributes.
+
+        Args:
+            agents (list): List of agent objects.
+            variable_list (list): List of attribute names as strings to be included in the results.
+
+        Returns:
+            list: A list of tuples where each tuple contains the values of the specified attributes for an agent.
+        """
+        agentwise_results = [
+            tuple(getattr(agent, variable) for variable in variable_list)
+            for agent in agents
+        ]
+        return agentwise_results    
@@ -0,0 +1,46 @@
+import gzip
+import pandas as pd
+
+RESULT_FILE_FORMATS = ['csv', 'csv.gz']
+
+
+class ResultWriter:
+    """
+    Writer of a result table to a CSV file (`.csv`), or a gzip-compressed CSV file (`.csv.gz`), by chunks of rows.
+
+    - The header is written when the writer is created, and each `write()` appends its rows and closes the file,
+      so that the rows written so far are readable even if the run is interrupted.
+    - A compressed file holds one gzip member per write, which gzip readers (and `read_results()`) read as one stream.
+    - Rows are given as a structured array (typed columns, e.g. from `TimewiseRecorder`), a DataFrame or a list of rows;
+      integer columns are written as integers, float columns with their full precision.
+    """
+    def __init__(self, path, labels):
+        if not any(path.endswith(f".{file_format}") for file_format in RESULT_FILE_FORMATS):
+            raise ValueError(f"[ERROR] Unknown result file format: {path} (formats: {RESULT_FILE_FORMATS})")
+        self.path = path
+        self.labels = labels
+        self.num_rows = 0
+        with self.open('w') as f:
+            pd.DataFrame(columns=labels).to_csv(f, index=False)
+
+    def open(self, mode):
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, f'{mode}t', newline='')
+        return open(self.path, mode, newline='')
+
+    def write(self, rows):
+        if len(rows) == 0:
+            return
+        with self.open('a') as f:
+            pd.DataFrame(rows, columns=self.labels).to_csv(f, header=False, index=False)
+        self.num_rows += len(rows)
+
+
+def read_results(path, columns=None, chunksize=None):
+    """
+    Read a result file (`.csv` or `.csv.gz`) into a DataFrame.
+    - columns: only parse these columns
+    - chunksize: return an iterator of DataFrames of `chunksize` rows instead, to go through long files in bounded memory
+    Uncompressed files are memory-mapped rather than read.
+    """
+    return pd.read_csv(path, usecols=columns, chunksize=chunksize, memory_map=not path.endswith('.gz'))
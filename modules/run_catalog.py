@@ -0,0 +1,99 @@
+import os
+import json
+import sqlite3
+import hashlib
+import datetime
+
+# Configuration keys which do not affect the results of a run
+PRESENTATION_KEYS = ['rendering_mode', 'rendering_options', 'speed_up_factor', 'profiling_mode']
+
+
+def run_key(config):
+    """
+    Key of a run: hash of its resolved configuration, including `simulation.seed`.
+    Runs with the same key produce the same results.
+    """
+    config = dict(config)
+    config['simulation'] = {key: value for key, value in config['simulation'].items() if key not in PRESENTATION_KEYS}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class RunCatalog:
+    """
+    SQLite catalog of the runs whose results have been saved, indexed by `run_key()`.
+
+    - `case_name`: name of the case the run belongs to (the configuration file listed in `mc_runner.yaml`, or the sweep case)
+    - `parameters`: values of the sweep parameters of the case (JSON; NULL if the case is not from a sweep)
+    - `timewise_csv`, `agentwise_csv`, `config_yaml`: paths of the saved results (NULL if not saved)
+    - `final_values`: timewise results at the end of the run, by label (JSON; see `Simulation.final_values()`)
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_key TEXT PRIMARY KEY,
+                case_name TEXT NOT NULL,
+                run_index INTEGER,
+                seed INTEGER,
+                config TEXT,
+                timewise_csv TEXT,
+                agentwise_csv TEXT,
+                config_yaml TEXT,
+                run_time REAL,
+                created_at TEXT,
+                parameters TEXT,
+                final_values TEXT
+            )""")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(runs)")]
+        for column in ['parameters', 'final_values']:  # Catalog created by an earlier version
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE runs ADD COLUMN {column} TEXT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS runs_case_name ON runs (case_name)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def has_results(self, key):
+        """Whether the run `key` is in the catalog and its result files still exist."""
+        row = self.connection.execute("SELECT timewise_csv, agentwise_csv, config_yaml FROM runs WHERE run_key = ?", (key,)).fetchone()
+        return row is not None and all(path is None or os.path.exists(path) for path in row)
+
+    def add_run(self, key, case_name, run_index, config, result_files, run_time=None, parameters=None, final_values=None):
+        """Record the results of a run; `result_files` maps `timewise`, `agentwise` and `config` to the saved files."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO runs (run_key, case_name, run_index, seed, config, timewise_csv, agentwise_csv, config_yaml, run_time, created_at, parameters, final_values) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, case_name, run_index, config['simulation'].get('seed'), json.dumps(config),
+             result_files.get('timewise'), result_files.get('agentwise'), result_files.get('config'),
+             run_time, datetime.datetime.now().isoformat(timespec='seconds'),
+             json.dumps(parameters) if parameters is not None else None,
+             json.dumps(final_values) if final_values is not None else None))
+        self.connection.commit()
+
+    def final_values(self, key):
+        """Final timewise results of the run `key`, or None if unknown."""
+        row = self.connection.execute("SELECT final_values FROM runs WHERE run_key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def cases(self):
+        """Names of the cases in the catalog and their sweep parameters (None if not from a sweep)."""
+        rows = self.connection.execute("SELECT case_name, MIN(parameters) FROM runs GROUP BY case_name ORDER BY MIN(rowid)").fetchall()
+        return [(case_name, json.loads(parameters) if parameters is not None else None) for case_name, parameters in rows]
+
+    def result_files(self, case_name, kind):
+        """Paths of the `kind` (`timewise`, `agentwise` or `config`) result files of the runs of `case_name`, in run order."""
+        column = {'timewise': 'timewise_csv', 'agentwise': 'agentwise_csv', 'config': 'config_yaml'}[kind]
+        rows = self.connection.execute(
+            f"SELECT {column} FROM runs WHERE case_name = ? AND {column} IS NOT NULL ORDER BY run_index", (case_name,)).fetchall()
+        return [path for (path,) in rows]
+
+    def result_files_by_seed(self, case_name, kind):
+        """Paths of the `kind` result files of the runs of `case_name`, by seed."""
+        column = {'timewise': 'timewise_csv', 'agentwise': 'agentwise_csv', 'config': 'config_yaml'}[kind]
+        rows = self.connection.execute(
+            f"SELECT seed, {column} FROM runs WHERE case_name = ? AND {column} IS NOT NULL ORDER BY run_index", (case_name,)).fetchall()
+        return dict(rows)
@@ -0,0 +1,263 @@
+import random
+from modules.utils import derive_rng, load_plugin
+from modules.task import TaskStore, generate_tasks
+from modules.agent import generate_agents
+from modules.decision_holding import DecisionHolding
+from modules.decision_workers import DecisionWorkers, PARTITIONS
+from modules.spatial_grid import SpatialGrid
+from modules.recorder import RunningTotals, TimewiseRecorder
+
+TIMEWISE_RESULT_LABELS = ['time', 'agents_total_distance_moved', 'agents_total_task_amount_done', 'remaining_tasks', 'tasks_total_amount_left']
+TIMEWISE_RESULT_TYPES = [float, float, float, int, float]
+AGENTWISE_RESULT_LABELS = ['agent_id', 'task_amount_done', 'distance_moved']
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine which never suspends (behavior tree nodes only await other nodes) without an event loop.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("[ERROR] Behavior tree nodes must not await anything other than behavior tree nodes")
+
+
+class Simulation:
+    """
+    A SPACE simulation. It owns its configuration, random number generators, tasks, agents and
+    decision-making plugin instances, so that several simulations can run in the same process.
+    Runs with the same configuration and seed (`seed`, or `simulation.seed` in the configuration) are identical.
+
+    - `step()`: advance the simulation by one sampling time (or more, through a quiescent period with `decision_holding`).
+      By default, agents run one after another, each sensing the agents which have already moved in this tick.
+      With `synchronous_update`, all the agents sense and decide on the state at the end of the previous tick, then
+      move together, so that the results do not depend on the order of the agents. With `synchronous_update.workers`,
+      the behavior trees run in worker processes (see `DecisionWorkers`), started by the first `step()`.
+    - `run()`: step until the mission is completed or `max_simulation_time` is exceeded.
+    - `close()`: stop the worker processes, if any (done by `run()`).
+    """
+    def __init__(self, config, seed=None):
+        self.config = config
+        simulation_config = config['simulation']
+        self.sampling_time = 1.0 / simulation_config['sampling_freq']  # in seconds
+        self.max_simulation_time = simulation_config.get('max_simulation_time', 0)
+        self.verbose = simulation_config.get('rendering_mode', "Screen") != "None"
+        saving_options = simulation_config.get('saving_options', {})
+        self.record_timewise_result = saving_options.get('save_timewise_result_csv', False)
+
+        # Dynamic task generation parameters
+        dynamic_task_generation = config['tasks'].get('dynamic_task_generation', {})
+        self.generation_enabled = dynamic_task_generation.get('enabled', False)
+        self.generation_interval = dynamic_task_generation.get('interval_seconds', 10)
+        self.max_generations = dynamic_task_generation.get('max_generations', 5)
+        self.tasks_per_generation = dynamic_task_generation.get('tasks_per_generation', 5)
+
+        # Random number streams are derived from the seed: the scenario streams here, and `exploration` and `plugin`
+        # for each agent (see `Agent`). The scenario (initial tasks, agent positions and generated tasks) depends only
+        # on the seed and on the `tasks` and `agents` sections, so runs of different plugins with the same seed
+        # face the same scenario (common random numbers), and the tasks do not change with the number of agents
+        if seed is None:
+            seed = simulation_config.get('seed')
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        simulation_config['seed'] = seed  # Saved with the configuration, so that the run can be reproduced
+        self.seed = seed
+        self.task_rng = derive_rng(seed, 'scenario', 'tasks')
+        self.agent_rng = derive_rng(seed, 'scenario', 'agents')
+        self.generation_rng = derive_rng(seed, 'scenario', 'generation')
+        self.decision_making_module, self.decision_making_class = load_plugin(config['decision_making']['plugin'])
+
+        # Initialize tasks
+        self.tasks = TaskStore(config)
+        generate_tasks(self.tasks, config, self.task_rng)
+
+        # Initialize agents with behavior trees, giving them the information of current tasks
+        self.agents = generate_agents(self.tasks, config, self.agent_rng, seed)
+        self.totals = RunningTotals()  # Distance moved and task amount done by all the agents
+        for agent in self.agents:
+            agent.totals = self.totals
+
+        # Spatial grids of the agents and active tasks, so that local sensing only looks at the nearby cells
+        spatial_grid = simulation_config.get('spatial_grid', {})
+        self.agent_grid = None
+        if spatial_grid.get('enabled', False):
+            cell_size = spatial_grid.get('cell_size') or max(config['agents']['communication_radius'], config['agents'].get('situation_awareness_radius', 0))
+            if cell_size <= 0:  # Both radii unlimited: sensing does not query the grid, whose cells then span the arena
+                agent_locations = config['agents']['locations']
+                cell_size = max(agent_locations['x_max'] - agent_locations['x_min'], agent_locations['y_max'] - agent_locations['y_min'], 1.0)
+            self.agent_grid = SpatialGrid(cell_size)
+            for agent in self.agents:
+                self.agent_grid.insert(agent.agent_id, agent.position.x, agent.position.y)
+                agent.agent_grid = self.agent_grid
+            self.tasks.enable_grid(cell_size)
+
+        self.simulation_time = 0.0
+        self.generation_count = 0
+        self.last_generation_time = 0.0
+        self.mission_completed = False
+        timewise_decimation = saving_options.get('timewise_decimation', {})
+        self.recorder = TimewiseRecorder(zip(TIMEWISE_RESULT_LABELS, TIMEWISE_RESULT_TYPES),
+                                         every_ticks=timewise_decimation.get('ticks', 1),
+                                         every_seconds=timewise_decimation.get('seconds', 0))  # Timewise results
+
+        # Synchronous update: the messages read in a tick are those published at the end of the previous tick
+        synchronous_update = simulation_config.get('synchronous_update', {})
+        self.synchronous = synchronous_update.get('enabled', False)
+        if self.synchronous:
+            for agent in self.agents:
+                agent.publish_message()
+        self.num_workers = synchronous_update.get('workers', 0)
+        if self.num_workers < 0 or (self.num_workers > 0 and not self.synchronous):
+            raise ValueError("[ERROR] `synchronous_update.workers` must be 0, or positive with `synchronous_update.enabled`")
+        self.workers_partition = synchronous_update.get('partition', 'Agents')
+        if self.workers_partition not in PARTITIONS:
+            raise ValueError(f"[ERROR] Unknown `synchronous_update.partition`: {self.workers_partition} (partitions: {PARTITIONS})")
+        self.workers = None  # `DecisionWorkers`, started by the first `step()`
+
+        # Holding of the decisions through quiescent periods (see `DecisionHolding`)
+        self.decision_holding = DecisionHolding(config) if simulation_config.get('decision_holding', {}).get('enabled', False) else None
+        if self.decision_holding is not None and self.num_workers > 0:
+            raise ValueError("[ERROR] `decision_holding` is not supported with `synchronous_update.workers`")
+
+    @property
+    def tasks_left(self):
+        return self.tasks.num_remaining
+
+    @property
+    def time_over(self):
+        return self.max_simulation_time > 0 and self.simulation_time > self.max_simulation_time
+
+    def step(self):
+        if self.num_workers > 0:
+            if self.workers is None:
+                self.workers = DecisionWorkers(self, self.num_workers, self.workers_partition)
+            self.workers.run_trees()
+            self.end_step()
+            return
+
+        # Let the decision-making plugin prepare the tick for all the agents at once, if it supports it
+        if hasattr(self.decision_making_class, 'prepare_tick'):
+            self.decision_making_class.prepare_tick([agent.decision_maker for agent in self.agents])
+
+        # Run behavior trees for each agent
+        if self.synchronous:
+            self.run_trees_synchronously()
+        else:
+            for agent in self.agents:
+                run_coroutine(agent.run_tree())
+                agent.update()
+
+        self.end_step()
+        if self.decision_holding is not None:
+            self.decision_holding.try_hold(self)
+
+    def run_trees_synchronously(self):
+        """
+        Run the behavior trees of all the agents on the state at the end of the previous tick: agents only move once
+        all the trees have run, and read the messages published at the end of the previous tick.
+        """
+        for agent in self.agents:
+            run_coroutine(agent.run_tree())
+        for agent in self.agents:
+            agent.update()
+        for agent in self.agents:
+            agent.publish_message()
+
+    def end_step(self):
+        """Second part of `step()`, once all the agents have run: apply their work, advance the time and record."""
+        # Apply the work done by agents to tasks
+        self.tasks.commit_work()
+
+        # Status retrieval
+        self.simulation_time += self.sampling_time
+        if self.tasks.num_remaining == 0:
+            self.mission_completed = not self.generation_enabled or self.generation_count == self.max_generations
+
+        # Dynamic task generation
+        if self.generation_enabled and self.generation_count < self.max_generations:
+            if self.simulation_time - self.last_generation_time >= self.generation_interval:
+                generate_tasks(self.tasks, self.config, self.generation_rng, task_quantity=self.tasks_per_generation)
+                self.last_generation_time = self.simulation_time
+                self.generation_count += 1
+                if self.verbose:
+                    print(f"[{self.simulation_time:.2f}] Added {self.tasks_per_generation} new tasks: Generation {self.generation_count}.")
+
+        # Record data if time recording mode is enabled
+        if self.record_timewise_result:
+            self.recorder.tick(self.simulation_time, self.timewise_record)
+
+    def timewise_record(self):
+        """Current values of the timewise results (`TIMEWISE_RESULT_LABELS`)."""
+        return [
+            self.simulation_time,
+            self.totals.distance_moved,
+            self.totals.task_amount_done,
+            self.tasks.num_remaining,
+            self.tasks.total_amount
+        ]
+
+    def final_values(self):
+        """Timewise results at the end of the run, by label (recorded whether or not the timewise results are saved)."""
+        return dict(zip(TIMEWISE_RESULT_LABELS, self.timewise_record()))
+
+    def run(self):
+        try:
+            while True:
+                time_over = self.time_over  # The step in which the time limit is found exceeded is still run, as in `main.py`
+                self.step()
+                if time_over or self.mission_completed:
+                    return self
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the worker processes running the behavior trees, if any."""
+        if self.workers is not None:
+            self.workers.close()
+            self.workers = None
+
+    def stream_results(self, result_saver):
+        """
+        Write the timewise results to the file of the `ResultSaver` during the run, by chunks (see `TimewiseRecorder`),
+        rather than all at once in `save_results()`, which must then be given the same `ResultSaver`.
+        """
+        if self.record_timewise_result:
+            self.recorder.writer = result_saver.open_writer("timewise", TIMEWISE_RESULT_LABELS)
+
+    def save_results(self, result_saver):
+        """
+        Save the results enabled in `simulation.saving_options` with the `ResultSaver`.
+        Returns the paths of the saved files (keys: `timewise`, `agentwise`, `config`).
+        """
+        saving_options = self.config['simulation'].get('saving_options', {})
+        result_files = {}
+        timewise_plot_data = agentwise_plot_data = None  # Plotted from memory, or from the file if written during the run
+
+        # Save time series data
+        if saving_options.get('save_timewise_result_csv', False):
+            self.recorder.finish(self.timewise_record)
+            if self.recorder.writer is not None:
+                self.recorder.flush()
+                csv_file_path = self.recorder.writer.path
+                timewise_plot_data = csv_file_path
+            else:
+                csv_file_path = result_saver.save_to_csv("timewise", self.recorder.records(), TIMEWISE_RESULT_LABELS)
+                timewise_plot_data = result_saver.df_timewise_result
+            result_files['timewise'] = csv_file_path
+
+        # Save agent-wise data
+        if saving_options.get('save_agentwise_result_csv', False):
+            agentwise_results = result_saver.get_agentwise_results(self.agents, AGENTWISE_RESULT_LABELS)
+            csv_file_path = result_saver.save_to_csv('agentwise', agentwise_results, AGENTWISE_RESULT_LABELS)
+            agentwise_plot_data = result_saver.df_agentwise_result
+            result_files['agentwise'] = csv_file_path
+
+        result_saver.plot_results(timewise_plot_data, agentwise_plot_data, AGENTWISE_RESULT_LABELS[1:])
+
+        # Save yaml
+        if saving_options.get('save_config_yaml', False):
+            result_files['config'] = result_saver.save_config_yaml()
+
+        return result_files
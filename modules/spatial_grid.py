@@ -0,0 +1,55 @@
+import math
+
+
+class SpatialGrid:
+    """
+    Uniform grid of square cells over the arena, bucketing objects (agents or tasks, keyed by their id) by position,
+    so that the objects near a position are found by looking at the cells within the radius only.
+
+    - `insert(key, x, y)`, `move(key, x, y)` and `remove(key)` keep the buckets up to date; `move()` only changes
+      buckets when an object crosses a cell border.
+    - `query(x, y, radius)` returns the keys in the cells overlapping the square around the circle, i.e. a superset
+      of the objects within `radius`, in no particular order: callers apply their exact distance test and sort.
+    The cell size is best set to the usual query radius (communication or situation awareness radius).
+    Each process holding a replica of the simulation has its own grid: to spread the agents over processes by region
+    of the arena, see `DecisionWorkers` (`synchronous_update.partition: Space`).
+    """
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("[ERROR] The cell size of a spatial grid must be positive")
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> set of keys
+        self.key_cells = {}  # key -> (column, row)
+
+    def cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, key, x, y):
+        cell = self.cell(x, y)
+        self.cells.setdefault(cell, set()).add(key)
+        self.key_cells[key] = cell
+
+    def move(self, key, x, y):
+        cell = self.cell(x, y)
+        old_cell = self.key_cells[key]
+        if cell != old_cell:
+            self.cells[old_cell].discard(key)
+            self.cells.setdefault(cell, set()).add(key)
+            self.key_cells[key] = cell
+
+    def remove(self, key):
+        cell = self.key_cells.pop(key, None)
+        if cell is not None:
+            self.cells[cell].discard(key)
+
+    def query(self, x, y, radius):
+        column_min, row_min = self.cell(x - radius, y - radius)
+        column_max, row_max = self.cell(x + radius, y + radius)
+        keys = []
+        cells = self.cells
+        for column in range(column_min, column_max + 1):
+            for row in range(row_min, row_max + 1):
+                bucket = cells.get((column, row))
+                if bucket:
+                    keys.extend(bucket)
+        return keys
@@ -0,0 +1,64 @@
+import os
+import copy
+import itertools
+from modules.utils import load_config
+
+
+def set_dotted(config, dotted_key, value):
+    """Set `config['a']['b']['c'] = value` for the dotted key `a.b.c`; the parent sections must exist."""
+    *section_keys, key = dotted_key.split('.')
+    section = config
+    for section_key in section_keys:
+        if not isinstance(section.get(section_key), dict):
+            raise KeyError(f"[ERROR] Unknown configuration section `{section_key}` in sweep parameter `{dotted_key}`")
+        section = section[section_key]
+    section[key] = value
+
+
+def format_value(value):
+    """Short form of a parameter value for case names and folders (e.g. `GRAPE` for `plugins.grape.grape.GRAPE`)."""
+    if isinstance(value, str):
+        return value.rsplit('.', 1)[-1]
+    return str(value)
+
+
+def expand_sweep(sweep):
+    """
+    Expand a sweep specification into cases. A sweep is a dictionary with:
+    - `name`: name of the sweep, prefix of the case names
+    - `base`: path of the base configuration file
+    - `grid`: dotted configuration keys and their values; all the combinations are generated
+    - `zip`: dotted configuration keys and their values, taken together (the lists must have the same length);
+      combined with every point of `grid`
+    Returns a list of `(case_name, config, parameters)`, where `parameters` maps the dotted keys to their values.
+    """
+    name = sweep['name']
+    base_config = load_config(sweep['base'])
+    grid = sweep.get('grid', {})
+    zipped = sweep.get('zip', {})
+
+    zipped_lengths = {len(values) for values in zipped.values()}
+    if len(zipped_lengths) > 1:
+        raise ValueError(f"[ERROR] The `zip` parameters of sweep `{name}` must have the same number of values")
+    zipped_points = [dict(zip(zipped.keys(), values)) for values in zip(*zipped.values())] if zipped else [{}]
+    grid_points = [dict(zip(grid.keys(), values)) for values in itertools.product(*grid.values())]
+
+    cases = []
+    for grid_point in grid_points:
+        for zipped_point in zipped_points:
+            parameters = {**grid_point, **zipped_point}
+            config = copy.deepcopy(base_config)
+            for dotted_key, value in parameters.items():
+                set_dotted(config, dotted_key, value)
+
+            # Tag the outputs with the parameter values
+            tag = "_".join(f"{dotted_key.rsplit('.', 1)[-1]}={format_value(value)}" for dotted_key, value in parameters.items())
+            saving_options = config['simulation'].setdefault('saving_options', {})
+            saving_options['output_folder'] = os.path.join(saving_options.get('output_folder', 'output'), name, tag)
+
+            case_name = f"{name}[{tag}]"
+            cases.append((case_name, config, parameters))
+
+    if len({case_name for case_name, _, _ in cases}) != len(cases):
+        raise ValueError(f"[ERROR] The parameters of sweep `{name}` give identical case names; use parameters with distinct last keys")
+    return cases
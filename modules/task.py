@@ -1,45 +1,189 @@
 import pygame
-import random
-from modules.utils import config, generate_positions, generate_task_colors
-dynamic_task_generation = config['tasks'].get('dynamic_task_generation', {})
-max_generations = dynamic_task_generation.get('max_generations', 0) if dynamic_task_generation.get('enabled', False) else 0
-tasks_per_generation = dynamic_task_generation.get('tasks_per_generation', 0) if dynamic_task_generation.get('enabled', False) else 0
+import numpy as np
+from modules.utils import generate_positions, generate_task_colors, render_text, format_label_value, get_label_step
+from modules.spatial_grid import SpatialGrid
 
-task_colors = generate_task_colors(config['tasks']['quantity'] + tasks_per_generation*max_generations)
-
-sampling_freq = config['simulation']['sampling_freq']
-sampling_time = 1.0 / sampling_freq  # in seconds
 class Task:
-    def __init__(self, task_id, position):
+    """
+    Thin view over one row of the `TaskStore` columns.
+    """
+    __slots__ = ('store', 'task_id', 'position', 'color')
+
+    def __init__(self, store, task_id):
+        self.store = store
         self.task_id = task_id
-        self.position = pygame.Vector2(position)
-        self.amount = random.uniform(config['tasks']['amounts']['min'], config['tasks']['amounts']['max'])
-        self.radius = self.amount / config['simulation']['task_visualisation_factor']
-        self.completed = False
-        self.color = task_colors.get(self.task_id, (0, 0, 0))  # Default to black if task_id not found
+        self.position = pygame.Vector2(store.positions[task_id].tolist())  # Tasks do not move; cached for vector arithmetic
+        self.color = store.colors.get(self.task_id, (0, 0, 0))  # Default to black if task_id not found
+
+    @property
+    def amount(self):
+        return float(self.store.amounts[self.task_id])
+
+    @amount.setter
+    def amount(self, value):
+        self.store.set_amount(self.task_id, value)
+
+    @property
+    def radius(self):
+        return float(self.store.radii[self.task_id])
+
+    @property
+    def completed(self):
+        return bool(self.store.completed[self.task_id])
 
     def set_done(self):
-        self.completed = True
+        self.store.set_done(self.task_id)
 
     def reduce_amount(self, work_rate):
-        self.amount -= work_rate * sampling_time
-        if self.amount <= 0:
-            self.set_done()
+        # Applied to the store columns at the end of the tick by `TaskStore.commit_work()`
+        self.store.add_work(self.task_id, work_rate * self.store.sampling_time)
 
     def draw(self, screen):
-        self.radius = self.amount / config['simulation']['task_visualisation_factor']        
         if not self.completed:
-            pygame.draw.circle(screen, self.color, self.position, int(self.radius))
+            pygame.draw.circle(screen, self.color, self.position, int(self.amount / self.store.task_visualisation_factor))
 
     def draw_task_id(self, screen):
         if not self.completed:
-            font = pygame.font.Font(None, 15)
-            text_surface = font.render(f"task_id {self.task_id}: {self.amount:.2f}", True, (250, 250, 250))
+            text_surface = render_text(f"task_id {self.task_id}: {format_label_value(self.amount, self.store.label_step)}", 15, (250, 250, 250))
             screen.blit(text_surface, (self.position[0], self.position[1]))
 
-def generate_tasks(task_quantity=None, task_id_start = 0):
+class TaskStore:
+    """
+    Container of all the tasks created during a simulation.
+
+    - Task state is stored in NumPy columns (`positions`, `amounts`, `radii`, `completed`) indexed by `task_id`;
+      `Task` objects are views over these columns, i.e. `tasks[task_id]` returns the task with that id.
+    - `radii` holds the arrival radius used by `TaskExecutingNode`, set from the initial amount.
+    - The work applied by agents during a tick is accumulated and applied at once by `commit_work()`.
+    - Keeps an index of the active (not completed) tasks and running totals so that per-tick aggregates are O(1).
+    - With `enable_grid()`, the active tasks are also bucketed in a `SpatialGrid` (`grid`) for local sensing.
+    """
+    def __init__(self, config, capacity=0):
+        dynamic_task_generation = config['tasks'].get('dynamic_task_generation', {})
+        max_generations = dynamic_task_generation.get('max_generations', 0) if dynamic_task_generation.get('enabled', False) else 0
+        tasks_per_generation = dynamic_task_generation.get('tasks_per_generation', 0) if dynamic_task_generation.get('enabled', False) else 0
+        self.colors = generate_task_colors(config['tasks']['quantity'] + tasks_per_generation*max_generations)
+        self.sampling_time = 1.0 / config['simulation']['sampling_freq']  # in seconds
+        self.task_visualisation_factor = config['simulation']['task_visualisation_factor']
+        self.label_step = get_label_step(config['simulation'].get('rendering_options'))  # See `format_label_value()`
+
+        self._tasks = []
+        self._active_tasks = {}  # Ordered set of active tasks (key: task_id; value: task)
+        self.total_amount = 0.0  # Sum of `amount` over all the tasks (completed ones included)
+        self.positions = np.zeros((capacity, 2))
+        self.amounts = np.zeros(capacity)
+        self.radii = np.zeros(capacity)
+        self.completed = np.zeros(capacity, dtype=bool)
+        self._pending_work = []  # (task_id, work) applied during the current tick
+        self.grid = None  # Spatial grid of the active tasks (see `enable_grid()`)
+
+    def __getitem__(self, task_id):
+        return self._tasks[task_id]
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        return iter(self._tasks)
+
+    def _reserve(self, size):
+        capacity = len(self.amounts)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        self.positions = np.resize(self.positions, (capacity, 2))
+        self.amounts = np.resize(self.amounts, capacity)
+        self.radii = np.resize(self.radii, capacity)
+        self.completed = np.resize(self.completed, capacity)
+
+    def add_tasks(self, positions, amounts):
+        """Append new tasks; their ids follow the existing ones. Returns the new `Task` objects."""
+        if len(amounts) == 0:
+            return []
+        task_id_start = len(self._tasks)
+        task_id_end = task_id_start + len(amounts)
+        self._reserve(task_id_end)
+        self.positions[task_id_start:task_id_end] = positions
+        self.amounts[task_id_start:task_id_end] = amounts
+        self.radii[task_id_start:task_id_end] = self.amounts[task_id_start:task_id_end] / self.task_visualisation_factor
+        self.completed[task_id_start:task_id_end] = False
+        self.total_amount += sum(amounts)
+
+        new_tasks = [Task(self, task_id) for task_id in range(task_id_start, task_id_end)]
+        self._tasks.extend(new_tasks)
+        for task in new_tasks:
+            self._active_tasks[task.task_id] = task
+            if self.grid is not None:
+                self.grid.insert(task.task_id, task.position.x, task.position.y)
+        return new_tasks
+
+    def enable_grid(self, cell_size):
+        """Bucket the active tasks, current and future, in a `SpatialGrid` of the given cell size."""
+        self.grid = SpatialGrid(cell_size)
+        for task in self.active():
+            self.grid.insert(task.task_id, task.position.x, task.position.y)
+
+    def select(self, task_ids):
+        """Tasks with the given ids."""
+        tasks = self._tasks
+        return [tasks[task_id] for task_id in task_ids]
+
+    def active(self):
+        """Iterate over the tasks not completed yet, in ascending `task_id` order."""
+        return self._active_tasks.values()
+
+    @property
+    def num_remaining(self):
+        return len(self._active_tasks)
+
+    def set_done(self, task_id):
+        self.completed[task_id] = True
+        self._active_tasks.pop(task_id, None)
+        if self.grid is not None:
+            self.grid.remove(task_id)
+
+    def set_amount(self, task_id, amount):
+        self.total_amount += amount - float(self.amounts[task_id])
+        self.amounts[task_id] = amount
+
+    def add_work(self, task_id, work):
+        self._pending_work.append((task_id, work))  # Applied at the end of the tick by `commit_work()`
+
+    def take_work(self):
+        """Remove and return the work added since the last commit, as `(task_id, work)` (see `DecisionWorkers`)."""
+        pending_work, self._pending_work = self._pending_work, []
+        return pending_work
+
+    def commit_work(self):
+        """
+        Apply all the work accumulated during the tick with one scatter-add, and detect the completed tasks.
+        Returns the ids of the tasks completed by this commit.
+        """
+        if not self._pending_work:
+            return []
+        pending_work = np.array(self._pending_work)
+        task_ids = pending_work[:, 0].astype(np.intp)
+        work = pending_work[:, 1]
+        self._pending_work = []
+
+        np.subtract.at(self.amounts, task_ids, work)
+        self.total_amount -= float(work.sum())
+
+        worked_task_ids = np.unique(task_ids)
+        done_task_ids = worked_task_ids[(self.amounts[worked_task_ids] <= 0) & ~self.completed[worked_task_ids]]
+        self.completed[done_task_ids] = True
+        done_task_ids = done_task_ids.tolist()
+        for task_id in done_task_ids:
+            self._active_tasks.pop(task_id, None)
+            if self.grid is not None:
+                self.grid.remove(task_id)
+        return done_task_ids
+
+
+def generate_tasks(tasks, config, rng, task_quantity=None):
+    """Generate `task_quantity` new tasks into the `TaskStore` `tasks`, and return them."""
     if task_quantity is None:
-        task_quantity = config['tasks']['quantity']        
+        task_quantity = config['tasks']['quantity']
     task_locations = config['tasks']['locations']
 
     tasks_positions = generate_positions(task_quantity,
@@ -47,8 +191,9 @@ def generate_tasks(task_quantity=None, task_id_start = 0):
                                         task_locations['x_max'],
                                         task_locations['y_min'],
                                         task_locations['y_max'],
-                                        radius=task_locations['non_overlap_radius'])
+                                        radius=task_locations['non_overlap_radius'],
+                                        rng=rng)
+    tasks_amounts = [rng.uniform(config['tasks']['amounts']['min'], config['tasks']['amounts']['max']) for _ in tasks_positions]
 
     # Initialize tasks
-    tasks = [Task(idx + task_id_start, pos) for idx, pos in enumerate(tasks_positions)]
-    return tasks
+    return tasks.add_tasks(tasks_positions, tasks_amounts)
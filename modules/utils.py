@@ -1,37 +1,86 @@
 import yaml
+import math
 import random
+import functools
 import pygame
-import imageio
-import datetime
-from PIL import Image
-import os
-import matplotlib.cm as cm
-import shutil
-import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import xml.etree.ElementTree as ET
+import importlib
+
+# Colors of the 'tab20' colormap of matplotlib (RGB, 0-255), for the task colors
+TAB20_COLORS = [
+    (31, 119, 180), (174, 199, 232), (255, 127, 14), (255, 187, 120), (44, 160, 44),
+    (152, 223, 138), (214, 39, 40), (255, 152, 150), (148, 103, 189), (197, 176, 213),
+    (140, 86, 75), (196, 156, 148), (227, 119, 194), (247, 182, 210), (127, 127, 127),
+    (199, 199, 199), (188, 189, 34), (219, 219, 141), (23, 190, 207), (158, 218, 229),
+]
 
 def load_config(config_file):
     with open(config_file, 'r') as f:
         return yaml.safe_load(f)
 
-# Global variable to hold the configuration
-config = None
-
-def set_config(config_file):
-    global config
-    config = load_config(config_file)
-
-# Pre-render static elements
+def load_plugin(plugin_path):
+    """
+    Import a decision-making plugin given as `package.module.ClassName`.
+    Returns the module and the class.
+    """
+    module_path, class_name = plugin_path.rsplit('.', 1)
+    module = importlib.import_module(module_path)
+    return module, getattr(module, class_name)
+
+# Fonts are created on first use, since `pygame.font` is only initialised when rendering
+_fonts = {}
+
+def get_font(font_size):
+    if font_size not in _fonts:
+        _fonts[font_size] = pygame.font.Font(None, font_size)
+    return _fonts[font_size]
+
+# Number of rendered text surfaces kept by `render_text()`
+TEXT_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, font_size, color):
+    """
+    Surface of `text` rendered with the shared font of `font_size` (see `get_font()`), cached by (text, font size, color)
+    with least-recently-used eviction: labels drawn every frame are rendered once. The surface is shared: blit it, do not modify it.
+    Text which changes every frame is rendered with `pre_render_text()` instead.
+    """
+    return get_font(font_size).render(text, True, color)
+
+# Text which changes every frame (e.g. the elapsed time) is rendered without the cache, which it would only fill
 def pre_render_text(text, font_size, color):
-    font = pygame.font.Font(None, font_size)
-    return font.render(text, True, color)
-
-def generate_positions(quantity, x_min, x_max, y_min, y_max, radius=10):
+    return get_font(font_size).render(text, True, color)
+
+def get_label_step(rendering_options):
+    """`label_step` of the `rendering_options` (default: 1.0), see `format_label_value()`."""
+    label_step = (rendering_options or {}).get('label_step', 1.0)
+    if not label_step > 0:
+        raise ValueError(f"[ERROR] `rendering_options.label_step` must be positive: {label_step}")
+    return label_step
+
+def format_label_value(value, step=1.0):
+    """
+    `value` rounded to a multiple of `step` (`rendering_options.label_step`, positive), with as many decimals as `step`,
+    so that labels of values which differ by less than `step` are the same text, rendered once by `render_text()`.
+    """
+    if not step > 0:
+        raise ValueError(f"[ERROR] The step of a label value must be positive: {step}")
+    decimals = max(0, math.ceil(-math.log10(step) - 1e-9))
+    return f"{round(value / step) * step:.{decimals}f}"
+
+def derive_rng(seed, *stream_names):
+    """
+    Random number generator of the stream `stream_names` (e.g. `'exploration', agent_id`) derived from `seed`.
+    Streams with different names are independent of each other, and of the order in which they are created and used.
+    """
+    return random.Random("/".join(str(name) for name in (seed, *stream_names)))
+
+def generate_positions(quantity, x_min, x_max, y_min, y_max, radius=10, rng=random):
     positions = []
     while len(positions) < quantity:
-        pos = (random.randint(x_min + radius, x_max - radius),
-               random.randint(y_min + radius, y_max - radius))
+        pos = (rng.randint(x_min + radius, x_max - radius),
+               rng.randint(y_min + radius, y_max - radius))
         if radius > 0:
             if all((abs(pos[0] - p[0]) > radius and abs(pos[1] - p[1]) > radius) for p in positions):
                 positions.append(pos)
@@ -41,13 +90,12 @@ def generate_positions(quantity, x_min, x_max, y_min, y_max, radius=10):
 
 
 # Generate task_colors based on tasks.quantity
+# The 'tab20' colormap is sampled at `quantity` evenly spaced points, as `matplotlib.cm.get_cmap('tab20', quantity)`
+# (without importing matplotlib)
 def generate_task_colors(quantity):
-    colors = cm.get_cmap('tab20', quantity)  # 'tab20' is a colormap with 20 distinct colors
-    task_colors = {}
-    for i in range(quantity):
-        color = colors(i)  # Get color from colormap
-        task_colors[i] = (int(color[0] * 255), int(color[1] * 255), int(color[2] * 255))  # Convert to RGB tuple
-    return task_colors
+    num_colors = len(TAB20_COLORS)
+    indices = np.minimum((np.linspace(0, 1, quantity) * num_colors).astype(int), num_colors - 1)
+    return {i: TAB20_COLORS[index] for i, index in enumerate(indices.tolist())}
 
 
 
@@ -72,190 +120,4 @@ def merge_dicts(dict1, dict2):
             # 새로운 키일 경우 추가합니다.
             merged_dict[key] = value
             
-    return merged_dict    
-
-
-# Results saving
-class ResultSaver:
-    def __init__(self, config_file_path):
-        self.config_file_path = config_file_path
-        self.result_file_path = self.generate_output_filename()
-        self.timewise_result_file_path = self.generate_output_filename(additional_keyword="timewise")
-        self.agentwise_result_file_path = self.generate_output_filename(additional_keyword="agentwise")
-        self.df_timewise_result = None
-        self.df_agentwise_result = None
-
-    def generate_output_filename(self, extension = "csv", additional_keyword = None):
-        agent_quantity = config['agents']['quantity']
-        task_quantity = config['tasks']['quantity']
-        decision_making_module_path = config['decision_making']['plugin']
-        module_path, class_name = decision_making_module_path.rsplit('.', 1)
-        datetime_now = datetime.datetime.now()
-        current_time_string = datetime_now.strftime("%Y-%m-%d_%H-%M-%S")        
-        
-        current_date_string = datetime.datetime.now().strftime("%Y-%m-%d")
-        output_parent_folder = config['simulation']['saving_options'].get('output_folder', 'output')
-        with_date_subfolder = config['simulation']['saving_options'].get('with_date_subfolder', True)
-        if with_date_subfolder:
-            output_dir = os.path.join(output_parent_folder, current_date_string)       
-        else:
-            output_dir = output_parent_folder        
-        os.makedirs(output_dir, exist_ok=True) 
-        if additional_keyword == None:
-            file_path = os.path.join(output_dir, f"{class_name}_a{agent_quantity}_t{task_quantity}_{current_time_string}.{extension}")
-        else:
-            file_path = os.path.join(output_dir, f"{class_name}_a{agent_quantity}_t{task_quantity}_{current_time_string}_{additional_keyword}.{extension}")
-
-        return file_path
-
-    def change_file_extension(self, file_path, new_extension):
-        base, _ = os.path.splitext(file_path)  # Split the file path into base and extension
-        new_file_path = f"{base}.{new_extension}"  # Combine base with new extension
-        return new_file_path
-
-
-
-    def save_gif(self, frames):
-        if frames:                  
-            gif_recording_fps = config['simulation']['gif_recording_fps']
-            gif_file_path = self.change_file_extension(self.result_file_path, "gif")
-
-            # Convert pygame surface to PIL Image and save as GIF
-            image_list = []
-            for frame in frames:
-                image = frame.swapaxes(0, 1)  # Swap axes to fix orientation
-                image = Image.fromarray(image)
-                image_list.append(image)
-
-            imageio.mimsave(gif_file_path, image_list, duration=1.0/gif_recording_fps)  # Adjust duration for faster playback                    
-            # imageio.mimsave(gif_file_path, frames)
-            print(f"Saved GIF: {gif_file_path}")            
-
-    def save_config_yaml(self):
-        # Copy config.yaml to the result directory                 
-        yaml_file_path = self.change_file_extension(self.result_file_path, "yaml")    
-        shutil.copy(self.config_file_path, yaml_file_path)
-        print(f"Copied {self.config_file_path} to: {yaml_file_path}")        
-
-    def save_to_csv(self, type, data_records, data_labels):
-        """
-        save list to csv
-        - type: "agentwise" or "timewise" or None
-        - data
-        - label        
-        """
-
-        # Prepare data for DataFrame
-        df = pd.DataFrame(data_records, columns=data_labels)
-        if type == "agentwise":
-            csv_file_path = self.change_file_extension(self.agentwise_result_file_path, "csv")
-            self.df_timewise_result = df
-        elif type == "timewise":
-            csv_file_path = self.change_file_extension(self.timewise_result_file_path, "csv")
-            self.df_agentwise_result = df
-        else:
-            csv_file_path = self.change_file_extension(self.result_file_path, "csv")
-        
-        # Save the DataFrame to a CSV file    
-        df.to_csv(csv_file_path, index=False)    
-            
-        return csv_file_path
-
-    def plot_timewise_result(self, csv_file_path):
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-        
-        # Extract time and data columns
-        time = df['time']
-        agents_total_distance_moved = df['agents_total_distance_moved']
-        agents_total_task_amount_done = df['agents_total_task_amount_done']
-        remaining_tasks = df['remaining_tasks']
-        tasks_total_amount_left = df['tasks_total_amount_left']
-
-
-        plt.figure(figsize=(12, 8))
-
-        plt.subplot(2, 2, 1)
-        plt.plot(time, agents_total_distance_moved, label='Total Distance Moved by Agents')
-        plt.xlabel('Time')
-        plt.ylabel('Distance Moved')
-        plt.legend()
-        plt.grid(True)  
-
-        plt.subplot(2, 2, 2)
-        plt.plot(time, agents_total_task_amount_done, label='Total Task Amount Done by Agents')
-        plt.xlabel('Time')
-        plt.ylabel('Task Amount Done')
-        plt.legend()
-        plt.grid(True)  
-
-        plt.subplot(2, 2, 3)
-        plt.plot(time, remaining_tasks, label='The Number of Remaining Tasks')
-        plt.xlabel('Time')
-        plt.ylabel('The Number of Remaining Tasks')
-        plt.legend()
-        plt.grid(True)  
-
-        plt.subplot(2, 2, 4)
-        plt.plot(time, tasks_total_amount_left, label='Total Amount of Tasks')
-        plt.xlabel('Time')
-        plt.ylabel('Tasks Total Amount')
-        plt.legend()
-        plt.grid(True)  
-
-        plt.tight_layout()
-
-        img_file_path = self.change_file_extension(self.timewise_result_file_path, "png")   
-        
-        plt.savefig(img_file_path)
-        # plt.show()
-
-    def plot_boxplot(self, csv_file_path, columns):
-        """
-        Create and save a boxplot for specified columns from a CSV file using subplots.
-        - csv_file_path: Path to the CSV file.
-        - columns: List of column names to plot.
-        - title: Title of the plot.
-        - y_label: Label for the y-axis.
-        - file_name: Name of the file to save the plot.
-        """
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
-        
-        # Number of subplots needed
-        num_plots = len(columns)
-        
-        # Create a figure with subplots
-        plt.figure(figsize=(8, 6))
-        # plt.figure(figsize=(15, 5 * num_plots))
-        
-        for i, col in enumerate(columns):
-            plt.subplot(1, num_plots, i + 1)  # Create a subplot for each column
-            plt.boxplot(df[col], patch_artist=True)                        
-            plt.xlabel(col)
-            plt.grid(True)  
-        
-        plt.tight_layout()  # Adjust layout to prevent overlap
-
-        img_file_path = self.change_file_extension(self.agentwise_result_file_path, "png")  
-
-        plt.savefig(img_file_path)
-        plt.close()
-
-   
-    def get_agentwise_results(self, agents, variable_list):
-        """
-        Get results for each agent based on specified attributes.
-
-        Args:
-            agents (list): List of agent objects.
-            variable_list (list): List of attribute names as strings to be included in the results.
-
-        Returns:
-            list: A list of tuples where each tuple contains the values of the specified attributes for an agent.
-        """
-        agentwise_results = [
-            tuple(getattr(agent, variable) for variable in variable_list)
-            for agent in agents
-        ]
-        return agentwise_results    
+    return merged_dict
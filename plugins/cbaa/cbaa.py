@@ -1,5 +1,4 @@
-from modules.utils import config, merge_dicts
-# MY_PARAMETER = config['decision_making']['my_decision_making_plugin']['my_parameter']
+from modules.utils import merge_dicts
 
 # Define decision-making class
 class CBAA:
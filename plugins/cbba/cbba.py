@@ -1,20 +1,9 @@
-import random
 import pygame
-from modules.utils import config
 from enum import Enum
 import numpy as np
 import copy
-import time
 from modules.utils import merge_dicts
 
-KEEP_MOVING_DURING_CONVERGENCE = config['decision_making']['CBBA'].get('execute_movements_during_convergence', False)
-MAX_TASKS_PER_AGENT = config['decision_making']['CBBA']['max_tasks_per_agent']
-LAMBDA = config['decision_making']['CBBA']['task_reward_discount_factor']
-WINNING_BID_CANCEL = config['decision_making']['CBBA']['winning_bid_cancel']
-NO_BUNDLE_DURATION = config['decision_making']['CBBA']['acceptable_empty_bundle_duration']
-SAMPLE_FREQ = config['simulation']['sampling_freq']
-SAMPLE_TIME = 1.0 / SAMPLE_FREQ  # in seconds
-
 class Phase(Enum):
     BUILD_BUNDLE = 1
     ASSIGNMENT_CONSENSUS = 2
@@ -22,6 +11,13 @@ class Phase(Enum):
 class CBBA:  
     def __init__(self, agent):
         self.agent = agent        
+        params = agent.config['decision_making']['CBBA']
+        self.keep_moving_during_convergence = params.get('execute_movements_during_convergence', False)
+        self.max_tasks_per_agent = params['max_tasks_per_agent']
+        self.task_reward_discount_factor = params['task_reward_discount_factor']
+        self.winning_bid_cancel = params['winning_bid_cancel']
+        self.acceptable_empty_bundle_duration = params['acceptable_empty_bundle_duration']
+        self.sampling_time = 1.0 / agent.config['simulation']['sampling_freq']  # in seconds
 
         self.z = {} # Winning agent list (key: task_id; value: agent_id)
         self.y = {} # Winning bid list (key: task_id; value: bid value)
@@ -41,6 +37,7 @@ class CBBA:
         
         self.assigned_task = None
         self.no_bundle_duration = 0
+        self.time_elapsed = 0.0 # Simulation time, used for time stamps (decide() is called once per sampling time)
 
     def decide(self, blackboard):
         # Place your decision-making code for each agent
@@ -50,6 +47,7 @@ class CBBA:
             - `None`, otherwise
         '''        
         local_tasks_info = blackboard['local_tasks_info']
+        self.time_elapsed += self.sampling_time
 
         # Check if the existing task is done
         if self.assigned_task is not None and self.assigned_task.completed:
@@ -67,11 +65,11 @@ class CBBA:
             return None
         
         # Neutralize all the winning bid information if there are local tasks nearby but the agent cannot choose any of them for a certain period
-        if WINNING_BID_CANCEL:
+        if self.winning_bid_cancel:
             if len(self.bundle) == 0:
-                self.no_bundle_duration += SAMPLE_TIME                   
+                self.no_bundle_duration += self.sampling_time                   
 
-            if self.no_bundle_duration > NO_BUNDLE_DURATION:
+            if self.no_bundle_duration > self.acceptable_empty_bundle_duration:
                 # Neutralize
                 self.z = {} 
                 self.y = {} 
@@ -212,7 +210,7 @@ class CBBA:
             
             # Reset Message
             self.agent.reset_messages_received()
-            if WINNING_BID_CANCEL:
+            if self.winning_bid_cancel:
                 if len(updated_bundle) > 0:
                     self.no_bundle_duration = 0
 
@@ -231,7 +229,7 @@ class CBBA:
                 self.assigned_task = None # NOTE: 불만족 상황이 되었으니 assigned_task 초기화
                 self.phase = Phase.BUILD_BUNDLE
         
-        if KEEP_MOVING_DURING_CONVERGENCE:
+        if self.keep_moving_during_convergence:
             # Even though not being converged, let's move to the first task that I prefer to go
             self.assigned_task = self.path[0] if self.path else None
             return self.assigned_task.task_id if self.assigned_task is not None else None
@@ -239,6 +237,12 @@ class CBBA:
             self.agent.reset_movement()  # Neutralise the agent's current movement during converging to a consensus
             return None
     
+    def skip_time(self, duration):
+        # Called instead of `decide()` for the ticks in which the simulation holds the decisions
+        self.time_elapsed += duration
+        if self.winning_bid_cancel and len(self.bundle) == 0 and self.agent.blackboard.get('local_tasks_info'):
+            self.no_bundle_duration += duration
+
     def _update(self, task_id, y_k, z_k):
         self.y[task_id] = y_k[task_id]   # Winning bid update
         self.z[task_id] = z_k[task_id]   # Winning agent update
@@ -274,7 +278,7 @@ class CBBA:
         # J = list(range(self.task_num))
         
 
-        while len(self.bundle) < min(MAX_TASKS_PER_AGENT, len(local_tasks_info)):
+        while len(self.bundle) < min(self.max_tasks_per_agent, len(local_tasks_info)):
             # Calculate S_p for the constructed path list
             
 
@@ -305,7 +309,7 @@ class CBBA:
         """
 
         # For neighbor agents
-        current_timestamp = int(time.time())
+        current_timestamp = self.time_elapsed
         for other_agent in self.agent.agents_nearby:            
             self.s[other_agent.agent_id] = current_timestamp
 
@@ -392,7 +396,7 @@ class CBBA:
             next_position = pygame.Vector2(task.position)
             distance_to_next_task_from_start += current_position.distance_to(next_position)
             # Time-discounted reward
-            expected_reward_from_task += LAMBDA**(distance_to_next_task_from_start/self.agent.max_speed + task.amount/self.agent.work_rate)*task.amount            
+            expected_reward_from_task += self.task_reward_discount_factor**(distance_to_next_task_from_start/self.agent.max_speed + task.amount/self.agent.work_rate)*task.amount            
             # expected_reward_from_task += (task.amount - (distance_to_next_task_from_start/self.agent.max_speed + task.amount/self.agent.work_rate))
             current_position = next_position
 
@@ -1,16 +1,16 @@
-import random
 import copy
-from modules.utils import config, pre_render_text
-
-KEEP_MOVING_DURING_CONVERGENCE = config['decision_making']['GRAPE'].get('execute_movements_during_convergence', False)
-INITIALIZE_PARTITION = config['decision_making']['GRAPE']['initialize_partition']
-REINITIALIZE_PARTITION = config['decision_making']['GRAPE']['reinitialize_partition_on_completion']
-COST_WEIGHT_FACTOR = config['decision_making']['GRAPE']['cost_weight_factor']
-SOCIAL_INHIBITION_FACTOR = config['decision_making']['GRAPE']['social_inhibition_factor']
+from modules.utils import pre_render_text
 
 class GRAPE:
     def __init__(self, agent):
         self.agent = agent        
+        params = agent.config['decision_making']['GRAPE']
+        self.keep_moving_during_convergence = params.get('execute_movements_during_convergence', False)
+        self.initialize_partition = params['initialize_partition']
+        self.reinitialize_partition = params['reinitialize_partition_on_completion']
+        self.cost_weight_factor = params['cost_weight_factor']
+        self.social_inhibition_factor = params['social_inhibition_factor']
+
         self.satisfied = False
         self.evolution_number = 0  # Initialize evolution_number
         self.time_stamp = 0  # Initialize time_stamp            
@@ -18,7 +18,7 @@ class GRAPE:
         self.assigned_task = None
         _local_tasks_info = self.agent.get_tasks_nearby()
         _local_agents_info = self.agent.get_agents_nearby()
-        if INITIALIZE_PARTITION == "Distance": 
+        if self.initialize_partition == "Distance": 
             if _local_tasks_info and _local_agents_info:                                
                 self.partition = self.initialize_partition_by_distance(_local_agents_info, _local_tasks_info, self.partition)
                 self.assigned_task = self.get_assigned_task_from_partition(self.partition)                 
@@ -63,7 +63,7 @@ class GRAPE:
             self.satisfied = False
             
             # Special routine
-            if REINITIALIZE_PARTITION == "Distance":                                    
+            if self.reinitialize_partition == "Distance":                                    
                 self.partition = self.initialize_partition_by_distance(_neighbor_agents_info, _local_tasks_info, self.partition)   
                 self.assigned_task = self.get_assigned_task_from_partition(self.partition)                         
 
@@ -81,7 +81,7 @@ class GRAPE:
             if _max_utility > self.compute_utility(self.assigned_task):                
                 self.update_partition(_max_task_id)
                 self.evolution_number += 1
-                self.time_stamp = random.uniform(0, 1)                   
+                self.time_stamp = self.agent.plugin_rng.uniform(0, 1)                   
             
             self.satisfied = True
 
@@ -103,7 +103,7 @@ class GRAPE:
         self.assigned_task = self.get_assigned_task_from_partition(self.partition)        
 
         if not self.satisfied:
-            if not KEEP_MOVING_DURING_CONVERGENCE:
+            if not self.keep_moving_during_convergence:
                 self.agent.reset_movement()  # Neutralise the agent's current movement during converging to a Nash stable partition
 
         return copy.deepcopy(self.assigned_task.task_id) if self.assigned_task is not None else None
@@ -144,7 +144,7 @@ class GRAPE:
             num_collaborator += 1
 
         distance = (self.agent.position - task.position).length()              
-        utility = task.amount / (num_collaborator) - COST_WEIGHT_FACTOR * distance * (num_collaborator ** SOCIAL_INHIBITION_FACTOR) 
+        utility = task.amount / (num_collaborator) - self.cost_weight_factor * distance * (num_collaborator ** self.social_inhibition_factor) 
         return utility
 
     def distributed_mutex(self, messages_received):        
@@ -177,4 +177,4 @@ def draw_decision_making_status(screen, agent):
     if 'evolution_number' in agent.message_to_share: # For GRAPE
         partition_evolution_number = agent.message_to_share['evolution_number']
         partition_evolution_number_text = pre_render_text(f'Partition evolution number: {partition_evolution_number}', 36, (0, 0, 0))
-        screen.blit(partition_evolution_number_text, (20, 20))    
+        return screen.blit(partition_evolution_number_text, (20, 20))    
@@ -1,13 +1,12 @@
-import random
 import pygame
-from modules.utils import config
-MODE = config['decision_making']['FirstClaimGreedy']['mode']
-W_FACTOR_COST = config['decision_making']['FirstClaimGreedy']['weight_factor_cost']
-ENFORCED_COLLABORATION = config['decision_making']['FirstClaimGreedy'].get('enforced_collaboration', False)
 
 class FirstClaimGreedy: # Task selection within each agent's `situation_awareness_radius`
     def __init__(self, agent):
         self.agent = agent
+        params = agent.config['decision_making']['FirstClaimGreedy']
+        self.mode = params['mode']
+        self.weight_factor_cost = params['weight_factor_cost']
+        self.enforced_collaboration = params.get('enforced_collaboration', False)
         self.assigned_task = None
 
     def decide(self, blackboard):
@@ -33,7 +32,7 @@ class FirstClaimGreedy: # Task selection within each agent's `situation_awarenes
             return None
         
         # Given that there is only one task nearby, then enforced to select this
-        if ENFORCED_COLLABORATION and len(local_tasks_info) == 1:
+        if self.enforced_collaboration and len(local_tasks_info) == 1:
             self.assigned_task = local_tasks_info[0] 
             return self.assigned_task.task_id
 
@@ -50,13 +49,13 @@ class FirstClaimGreedy: # Task selection within each agent's `situation_awarenes
                 return None
             
 
-            if MODE == "Random": # Choose a task randomly
-                target_task_id = random.choice(unassigned_tasks_info).task_id
+            if self.mode == "Random": # Choose a task randomly
+                target_task_id = self.agent.plugin_rng.choice(unassigned_tasks_info).task_id
             
-            elif MODE == "MinDist": # Choose the closest task                
+            elif self.mode == "MinDist": # Choose the closest task                
                 target_task_id = self.find_min_dist_task(unassigned_tasks_info)
             
-            elif MODE == "MaxUtil": # Choose the task providing the maximum utility                
+            elif self.mode == "MaxUtil": # Choose the task providing the maximum utility                
                 target_task_id = self.find_max_utility_task(unassigned_tasks_info)
                 
             self.assigned_task = self.agent.tasks_info[target_task_id]            
@@ -101,7 +100,7 @@ class FirstClaimGreedy: # Task selection within each agent's `situation_awarenes
             return float('-inf')
 
         distance = (self.agent.position - task.position).length()        
-        return task.amount - W_FACTOR_COST * distance
+        return task.amount - self.weight_factor_cost * distance
     
     def compute_distance(self, task): # Individual Utility Function  
         if task is None:
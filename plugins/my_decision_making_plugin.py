@@ -1,10 +1,8 @@
-from modules.utils import config
-# MY_PARAMETER = config['decision_making']['my_decision_making_plugin']['my_parameter']
-
 # Define decision-making class
 class MyDecisionMakingClass:
     def __init__(self, agent):
         self.agent = agent        
+        # self.my_parameter = agent.config['decision_making']['MyDecisionMakingClass']['my_parameter']
         self.assigned_task = None
         self.satisfied = False # Rename if necessary
         # Define any variables if necessary
@@ -0,0 +1,35 @@
+import copy
+import os
+import sys
+
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # pygame without a display
+
+from modules.utils import load_config
+
+_CONFIG = load_config(os.path.join(REPOSITORY_ROOT, 'config.yaml'))
+
+PLUGINS = {
+    'CBBA': _CONFIG['decision_making'],
+    'FirstClaimGreedy': {'plugin': 'plugins.greedy.greedy.FirstClaimGreedy',
+                         'FirstClaimGreedy': {'mode': 'MinDist', 'weight_factor_cost': 10000.0, 'enforced_collaboration': False}},
+}
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    """Behavior trees (`bt_xml/`) and plugins are resolved from the repository root."""
+    monkeypatch.chdir(REPOSITORY_ROOT)
+
+
+@pytest.fixture
+def config():
+    """`config.yaml` without rendering or saving, and with a time limit."""
+    config = copy.deepcopy(_CONFIG)
+    config['simulation']['rendering_mode'] = 'None'
+    config['simulation']['saving_options'] = {}
+    config['simulation']['max_simulation_time'] = 200
+    return config
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import PLUGINS
+from modules.behavior_tree import Status, SyncAction
+from modules.simulation import Simulation, run_coroutine
+
+
+def run_ticks(node, agent, ticks):
+    """Ticks in which the action of `node` ran for `agent`."""
+    ran = []
+    for tick in range(ticks):
+        node.action = lambda agent, blackboard, tick=tick: ran.append(tick) or Status.SUCCESS
+        run_coroutine(node.run(agent, {}))
+    return ran
+
+
+@pytest.mark.parametrize('agent_id, expected', [
+    (0, [0, 3, 6, 9]),
+    (1, [0, 1, 4, 7, 10]),
+    (2, [0, 2, 5, 8, 11]),
+    (5, [0, 2, 5, 8, 11]),
+])
+def test_periodic_node_runs_in_first_tick_then_in_its_phase(agent_id, expected):
+    node = SyncAction('Node', None, {'agents': {'node_periods': {'Node': 3}}})
+    agent = SimpleNamespace(agent_id=agent_id, extensions={})
+    node.bind(agent)
+    assert run_ticks(node, agent, 12) == expected
+
+
+def test_periodic_node_returns_its_last_result_when_skipped():
+    node = SyncAction('Node', None, {'agents': {'node_periods': {'Node': 2}}})
+    agent = SimpleNamespace(agent_id=0, extensions={})
+    node.bind(agent)
+    blackboard = {}
+    results = iter([Status.RUNNING, Status.FAILURE])
+    node.action = lambda agent, blackboard: next(results)
+    statuses = [run_coroutine(node.run(agent, blackboard)) for _ in range(4)]
+    assert statuses == [Status.RUNNING, Status.RUNNING, Status.FAILURE, Status.FAILURE]
+    assert blackboard['Node'] == Status.FAILURE
+
+
+@pytest.mark.parametrize('plugin', sorted(PLUGINS))
+@pytest.mark.parametrize('node_periods', [
+    {'LocalSensingNode': 2},
+    {'LocalSensingNode': 2, 'DecisionMakingNode': 3},
+])
+def test_staggered_periods_run_with_decision_making_plugins(config, plugin, node_periods):
+    # Regression: the decision-making node ran before the first sensing of agents with a nonzero phase
+    config['decision_making'] = PLUGINS[plugin]
+    config['agents']['node_periods'] = node_periods
+    simulation = Simulation(config, seed=0)
+    for _ in range(20):
+        simulation.step()
+    assert simulation.totals.distance_moved > 0
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mc_analyzer import MonteCarloAnalyzer, concatenate_runs, grouped_gini, run_bounds
+
+
+def gini(values):
+    """Gini coefficient computed run by run, as `mc_analyzer.py` did before the statistics were array-based."""
+    sorted_values = sorted(values)
+    sum_values = sum(sorted_values)
+    if sum_values == 0:
+        return 0
+    n = len(values)
+    return (2 * sum((i + 1) * value for i, value in enumerate(sorted_values))) / (n * sum_values) - (n + 1) / n
+
+
+def timewise_statistics(runs):
+    """Reference loop over the runs (see `gini()`)."""
+    statistics = {'final_times': [], 'final_distances': [], 'final_tasks_done': [],
+                  'quartile_distances': [[] for _ in range(4)], 'quartile_tasks_done': [[] for _ in range(4)]}
+    for data in runs:
+        statistics['final_times'].append(data['time'].iloc[-1])
+        statistics['final_distances'].append(data['agents_total_distance_moved'].iloc[-1])
+        statistics['final_tasks_done'].append(data['agents_total_task_amount_done'].iloc[-1])
+        indices = [0] + [int(len(data) * q) - 1 for q in [0.25, 0.5, 0.75, 1.0]]
+        for i in range(4):
+            start, end = indices[i], indices[i + 1]
+            time_difference = data['time'].iloc[end] - data['time'].iloc[start]
+            if time_difference > 0:
+                for column, key in [('agents_total_distance_moved', 'quartile_distances'), ('agents_total_task_amount_done', 'quartile_tasks_done')]:
+                    statistics[key][i].append((data[column].iloc[end] - data[column].iloc[start]) / time_difference)
+    return statistics
+
+
+def timewise_runs(rng):
+    runs = []
+    for length in [1, 2, 3, 7, 40]:
+        time = np.cumsum(rng.choice([0.0, 0.5, 1.0], size=length))  # Repeated times give empty quartiles
+        runs.append(pd.DataFrame({'time': time,
+                                  'agents_total_distance_moved': np.cumsum(rng.random(length)),
+                                  'agents_total_task_amount_done': np.cumsum(rng.random(length))}))
+    return runs
+
+
+def agentwise_runs(rng):
+    return [pd.DataFrame({'task_amount_done': rng.random(length) * rng.integers(0, 2, size=length),
+                          'distance_moved': rng.random(length)})
+            for length in [1, 2, 5, 30]] + [pd.DataFrame({'task_amount_done': np.zeros(4), 'distance_moved': np.ones(4)})]
+
+
+@pytest.fixture
+def analyzer():
+    return MonteCarloAnalyzer.__new__(MonteCarloAnalyzer)  # The statistics do not read the configuration
+
+
+def test_run_bounds():
+    starts, lengths = run_bounds(np.array([3, 3, 5, 8, 8, 8]))
+    assert starts.tolist() == [0, 2, 3]
+    assert lengths.tolist() == [2, 1, 3]
+    assert [bounds.tolist() for bounds in run_bounds(np.zeros(0, dtype=int))] == [[], []]
+
+
+def test_grouped_gini_matches_the_gini_of_each_run():
+    rng = np.random.default_rng(0)
+    runs = [rng.random(length) for length in [1, 2, 9, 50]] + [np.zeros(3), np.array([0.0, 0.0, 2.0])]
+    starts, lengths = run_bounds(np.repeat(np.arange(len(runs)), [len(run) for run in runs]))
+    assert np.allclose(grouped_gini(np.concatenate(runs), starts, lengths), [gini(run.tolist()) for run in runs], rtol=1e-12, atol=1e-12)
+
+
+def test_timewise_statistics_match_the_loop_over_runs(analyzer):
+    runs = timewise_runs(np.random.default_rng(1))
+    statistics = analyzer.analyze_timewise_data(runs)
+    expected = timewise_statistics(runs)
+    assert statistics.keys() == expected.keys()
+    for key in ['final_times', 'final_distances', 'final_tasks_done']:
+        assert np.allclose(statistics[key], expected[key], rtol=1e-12, atol=0)
+    for key in ['quartile_distances', 'quartile_tasks_done']:
+        for quartile, expected_quartile in zip(statistics[key], expected[key]):
+            assert len(quartile) == len(expected_quartile)
+            assert np.allclose(quartile, expected_quartile, rtol=1e-12, atol=0)
+    # The same runs as one DataFrame with a `run_id` column, as given by the dataset
+    assert analyzer.analyze_timewise_data(concatenate_runs(runs, [])) == statistics
+
+
+def test_agentwise_statistics_match_the_loop_over_runs(analyzer):
+    runs = agentwise_runs(np.random.default_rng(2))
+    statistics = analyzer.analyze_agentwise_data(runs)
+    for column in ['task_amount_done', 'distance_moved']:
+        values = [run[column].tolist() for run in runs]
+        assert np.allclose(statistics[f'gini_coeff_{column}'], [gini(run) for run in values], rtol=1e-12, atol=1e-12)
+        assert np.allclose(statistics[f'average_{column}_per_agent'], [sum(run) / len(run) for run in values], rtol=1e-12, atol=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coefficients_of_variation = [np.std(run) / np.mean(run) for run in values]
+        assert np.allclose(statistics[f'std_{column}'], coefficients_of_variation, rtol=1e-12, atol=1e-12, equal_nan=True)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from conftest import PLUGINS
+from modules.recorder import TimewiseRecorder
+from modules.result_writer import ResultWriter, read_results
+from modules.simulation import Simulation
+
+COLUMNS = [('time', 'f8'), ('count', 'i8')]
+
+
+def record(recorder, num_ticks, sampling_time=1.0):
+    for tick in range(num_ticks):
+        time = tick * sampling_time
+        recorder.tick(time, lambda: (time, tick))
+    recorder.finish(lambda: (time, tick))
+
+
+@pytest.mark.parametrize('every_ticks, num_ticks, expected', [
+    (1, 5, [0, 1, 2, 3, 4]),
+    (3, 10, [0, 3, 6, 9]),
+    (3, 9, [0, 3, 6, 8]),  # The last tick is recorded by `finish()`
+    (4, 1, [0]),
+])
+def test_decimation_by_ticks(every_ticks, num_ticks, expected):
+    recorder = TimewiseRecorder(COLUMNS, every_ticks=every_ticks)
+    record(recorder, num_ticks)
+    assert recorder.records()['count'].tolist() == expected
+    assert len(recorder) == len(expected)
+
+
+def test_decimation_by_seconds():
+    recorder = TimewiseRecorder(COLUMNS, every_ticks=100, every_seconds=1.0)  # `every_seconds` takes precedence
+    record(recorder, 12, sampling_time=0.25)
+    assert recorder.records()['count'].tolist() == [0, 4, 8, 11]
+
+
+def test_records_span_chunks():
+    recorder = TimewiseRecorder(COLUMNS, chunk_size=4)
+    record(recorder, 10)
+    assert len(recorder.chunks) == 3
+    assert recorder.records()['count'].tolist() == list(range(10))
+    assert recorder.records().dtype == np.dtype(COLUMNS)
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'csv.gz'])
+def test_chunks_are_written_out_during_the_run(tmp_path, file_format):
+    recorder = TimewiseRecorder(COLUMNS, chunk_size=4)
+    recorder.writer = ResultWriter(str(tmp_path / f'timewise.{file_format}'), [label for label, _ in COLUMNS])
+    for tick in range(10):
+        recorder.tick(float(tick), lambda: (float(tick), tick))
+        assert len(recorder.chunks) == 1  # Memory does not grow with the run
+    assert recorder.writer.num_rows == 8
+    recorder.flush()
+    assert len(recorder) == 10
+    results = read_results(recorder.writer.path)
+    assert results['count'].tolist() == list(range(10))
+    assert results['time'].tolist() == [float(tick) for tick in range(10)]
+
+
+def test_invalid_intervals():
+    with pytest.raises(ValueError):
+        TimewiseRecorder(COLUMNS, every_ticks=0)
+    with pytest.raises(ValueError):
+        TimewiseRecorder(COLUMNS, chunk_size=0)
+
+
+def test_running_totals_match_the_agents(config):
+    config['decision_making'] = PLUGINS['FirstClaimGreedy']
+    config['simulation']['saving_options'] = {'save_timewise_result_csv': True, 'timewise_decimation': {'ticks': 7}}
+    simulation = Simulation(config, seed=1).run()
+    final_values = simulation.final_values()
+    assert final_values['agents_total_task_amount_done'] > 0
+    assert final_values['agents_total_distance_moved'] == pytest.approx(sum(agent.distance_moved for agent in simulation.agents))
+    assert final_values['agents_total_task_amount_done'] == pytest.approx(sum(agent.task_amount_done for agent in simulation.agents))
+    simulation.recorder.finish(simulation.timewise_record)
+    records = simulation.recorder.records()
+    assert np.all(np.diff(records['time']) > 0)
+    assert records[-1]['time'] == final_values['time']
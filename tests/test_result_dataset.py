@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+
+from modules.result_dataset import ResultDataset
+
+COLUMNS = ['time', 'value']
+
+
+def write_result(folder, name, values):
+    path = os.path.join(folder, name)
+    pd.DataFrame({'time': range(len(values)), 'value': values}).to_csv(path, index=False)
+    return path
+
+
+def contents(dataset):
+    """Values of each run, by case and result file, in the order of the runs."""
+    return {(dataset.files[path]['case'], path): dataset.data.loc[dataset.data['run_id'] == entry['run_id'], 'value'].tolist()
+            for path, entry in sorted(dataset.files.items(), key=lambda item: item[1]['run_id'])}
+
+
+def partitions(folder):
+    return sorted(os.listdir(os.path.join(folder, 'timewise')))
+
+
+def test_updates_only_read_and_write_new_files(tmp_path):
+    folder = str(tmp_path)
+    a = write_result(folder, 'a.csv', [1, 2])
+    dataset = ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)
+    assert dataset.update({'A': [a]}) == 1
+    first_partition = partitions(folder)
+    first_mtime = os.stat(os.path.join(dataset.data_path, first_partition[0])).st_mtime_ns
+
+    b = write_result(folder, 'b.csv', [3])
+    dataset = ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)
+    assert dataset.update({'A': [a], 'B': [b]}) == 1
+    assert len(partitions(folder)) == 2  # One partition per update, earlier ones untouched
+    assert os.stat(os.path.join(dataset.data_path, first_partition[0])).st_mtime_ns == first_mtime
+    assert dataset.update({'A': [a], 'B': [b]}) == 0
+    assert contents(dataset) == {('A', a): [1, 2], ('B', b): [3]}
+    assert dataset.runs('A')[0]['value'].tolist() == [1, 2]
+
+
+def test_changed_and_removed_files_are_dropped(tmp_path):
+    folder = str(tmp_path)
+    paths = [write_result(folder, f'{index}.csv', [index] * 3) for index in range(3)]
+    dataset = ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)
+    dataset.update({'A': paths})
+    write_result(folder, '0.csv', [10, 11, 12, 13])
+    os.utime(paths[0], ns=(0, 1))  # A modification time which differs from the first one's, whatever the clock resolution
+    assert dataset.update({'A': paths[:2]}) == 1
+
+    expected = {('A', paths[1]): [1, 1, 1], ('A', paths[0]): [10, 11, 12, 13]}
+    assert contents(dataset) == expected
+    reloaded = ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)
+    assert contents(reloaded) == expected  # The rows of the dropped runs are filtered out of the partitions
+    assert reloaded.run_id(paths[2]) is None
+    assert len(reloaded.data) == 7
+
+
+def test_partitions_are_compacted_when_most_rows_are_dropped(tmp_path):
+    folder = str(tmp_path)
+    a = write_result(folder, 'a.csv', [1])
+    b = write_result(folder, 'b.csv', [2] * 5)
+    dataset = ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)
+    dataset.update({'A': [a]})
+    dataset.update({'A': [a], 'B': [b]})
+    assert len(partitions(folder)) == 2
+    dataset.update({'A': [a]})  # 5 dropped rows for 1 in use
+    assert len(partitions(folder)) == 1
+    assert sum(partition['rows'] for partition in dataset.partitions) == 1
+    assert contents(ResultDataset(folder, 'timewise', workers=1, columns=COLUMNS)) == {('A', a): [1]}
+
+
+def test_empty_dataset_has_the_expected_columns(tmp_path):
+    dataset = ResultDataset(str(tmp_path), 'timewise', workers=1, columns=COLUMNS)
+    assert dataset.update({}) == 0
+    assert list(dataset.data.columns) == COLUMNS + ['case', 'run_id']
+    assert len(dataset.data) == 0
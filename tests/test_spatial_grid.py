@@ -0,0 +1,80 @@
+import copy
+import random
+
+import pygame
+import pytest
+
+from conftest import PLUGINS
+from modules.simulation import Simulation
+from modules.spatial_grid import SpatialGrid
+
+
+def test_query_finds_every_point_within_the_radius():
+    rng = random.Random(0)
+    points = {key: (rng.uniform(-500, 500), rng.uniform(-500, 500)) for key in range(500)}
+    grid = SpatialGrid(40.0)
+    for key, (x, y) in points.items():
+        grid.insert(key, x, y)
+    for key in range(0, 500, 3):  # Move some points, across cells or not
+        points[key] = (points[key][0] + rng.uniform(-60, 60), points[key][1] + rng.uniform(-60, 60))
+        grid.move(key, *points[key])
+    for key in range(1, 500, 7):
+        grid.remove(key)
+        del points[key]
+
+    for _ in range(200):
+        x, y, radius = rng.uniform(-600, 600), rng.uniform(-600, 600), rng.uniform(0, 150)
+        found = grid.query(x, y, radius)
+        assert len(found) == len(set(found))
+        within = {key for key, (px, py) in points.items() if (px - x) ** 2 + (py - y) ** 2 <= radius ** 2}
+        assert within <= set(found)
+
+
+def test_cell_size_must_be_positive():
+    with pytest.raises(ValueError):
+        SpatialGrid(0)
+
+
+@pytest.fixture
+def grid_config(config):
+    config['decision_making'] = PLUGINS['FirstClaimGreedy']
+    config['agents']['quantity'] = 40
+    config['simulation']['spatial_grid'] = {'enabled': True}
+    return config
+
+
+def test_grid_sensing_matches_brute_force(grid_config):
+    simulation = Simulation(grid_config, seed=3)
+    rng = random.Random(3)
+    for _ in range(30):
+        simulation.step()
+        for agent in simulation.agents:  # Also at random positions, away from the ones of the run
+            if rng.random() < 0.3:
+                agent.position = pygame.math.Vector2(rng.uniform(0, 1400), rng.uniform(0, 1000))
+                agent.agent_grid.move(agent.agent_id, agent.position.x, agent.position.y)
+        for agent in simulation.agents:
+            with_grid = ([other.agent_id for other in agent.get_agents_nearby()],
+                         [task.task_id for task in agent.get_tasks_nearby(with_completed_task=False)])
+            agent.agent_grid, task_grid = None, agent.tasks_info.grid
+            agent.tasks_info.grid = None
+            brute_force = ([other.agent_id for other in agent.get_agents_nearby()],
+                           [task.task_id for task in agent.get_tasks_nearby(with_completed_task=False)])
+            agent.agent_grid, agent.tasks_info.grid = simulation.agent_grid, task_grid
+            assert with_grid == brute_force
+
+
+def test_grid_does_not_change_the_results(grid_config):
+    without_grid = copy.deepcopy(grid_config)
+    without_grid['simulation']['spatial_grid'] = {'enabled': False}
+    results = [Simulation(config, seed=7).run().final_values() for config in (grid_config, without_grid)]
+    assert results[0] == results[1]
+
+
+def test_zero_cell_size_with_unlimited_radii(grid_config):
+    grid_config['agents']['communication_radius'] = 0
+    grid_config['agents']['situation_awareness_radius'] = 0
+    grid_config['simulation']['spatial_grid'] = {'enabled': True, 'cell_size': 0}
+    simulation = Simulation(grid_config, seed=0)
+    assert simulation.agent_grid.cell_size > 0
+    for _ in range(5):
+        simulation.step()
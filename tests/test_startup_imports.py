@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPOSITORY_ROOT
+
+REPORTING_MODULES = ['pandas', 'matplotlib', 'imageio', 'PIL']
+
+# Run in a fresh interpreter, so that the modules imported by the other tests do not count
+SCRIPT = """
+import json, sys
+{imports}
+print(json.dumps(sorted(name for name in {reporting_modules} if name in sys.modules)))
+"""
+
+
+def reporting_modules_loaded(imports):
+    script = SCRIPT.format(imports=imports, reporting_modules=REPORTING_MODULES)
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPOSITORY_ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'SDL_VIDEODRIVER': 'dummy'}, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('imports', [
+    'import main',
+    'import mc_runner',
+    'from modules.result_saver import ResultSaver',
+])
+def test_entry_points_do_not_import_reporting_dependencies(imports):
+    assert reporting_modules_loaded(imports) == []
+
+
+def test_simulation_runs_without_reporting_dependencies():
+    imports = """
+from modules.utils import load_config
+from modules.simulation import Simulation
+config = load_config('config.yaml')
+config['simulation']['rendering_mode'] = 'None'
+config['simulation']['saving_options'] = {}
+simulation = Simulation(config, seed=0)
+for _ in range(3):
+    simulation.step()
+"""
+    assert reporting_modules_loaded(imports) == []
+
+
+def test_monte_carlo_worker_initialisation_does_not_import_reporting_dependencies():
+    imports = """
+import multiprocessing
+import mc_runner
+mc_runner.init_worker(multiprocessing.Value('i', 0))
+sys.stdout = sys.__stdout__
+"""
+    assert reporting_modules_loaded(imports) == []
+
+
+def test_result_saving_imports_them_when_needed():
+    assert reporting_modules_loaded('from modules.result_writer import read_results') == ['pandas']
@@ -0,0 +1,102 @@
+import copy
+
+import numpy as np
+import pytest
+
+from conftest import PLUGINS
+from modules.simulation import Simulation, run_coroutine
+
+
+class ReversedSimulation(Simulation):
+    """Runs the behavior trees, moves and publishes in the reverse order of the agents."""
+    def run_trees_synchronously(self):
+        agents = self.agents[::-1]
+        for agent in agents:
+            run_coroutine(agent.run_tree())
+        for agent in agents:
+            agent.update()
+        for agent in agents:
+            agent.publish_message()
+
+
+def synchronous_config(config, plugin, workers=0):
+    config = copy.deepcopy(config)
+    config['decision_making'] = PLUGINS[plugin]
+    config['simulation']['synchronous_update'] = {'enabled': True, 'workers': workers}
+    config['simulation']['saving_options'] = {'save_timewise_result_csv': True}
+    return config
+
+
+def outcome(simulation):
+    return (simulation.recorder.records().tolist(),
+            [(agent.position.x, agent.position.y, agent.task_amount_done, agent.assigned_task_id) for agent in simulation.agents])
+
+
+@pytest.mark.parametrize('plugin', sorted(PLUGINS))
+def test_results_do_not_depend_on_the_order_of_the_agents(config, plugin):
+    config = synchronous_config(config, plugin)
+    (records, agents), (reversed_records, reversed_agents) = [outcome(simulation_class(copy.deepcopy(config), seed=2).run())
+                                                              for simulation_class in (Simulation, ReversedSimulation)]
+    assert agents == reversed_agents
+    # The running totals add the agents' contributions in their order, so only their last digits may differ
+    assert np.allclose(records, reversed_records, rtol=1e-12, atol=0)
+
+
+def test_agents_sense_the_positions_of_the_previous_tick(config):
+    simulation = Simulation(synchronous_config(config, 'FirstClaimGreedy'), seed=4)
+    for _ in range(10):
+        positions = {agent.agent_id: agent.position.copy() for agent in simulation.agents}
+        simulation.step()
+        for agent in simulation.agents:
+            expected = [other.agent_id for other in simulation.agents if other is not agent
+                        and (positions[agent.agent_id] - positions[other.agent_id]).length_squared() <= agent.communication_radius ** 2]
+            assert [other.agent_id for other in agent.agents_nearby] == expected
+
+
+def test_agents_read_the_messages_published_in_the_previous_tick(config):
+    simulation = Simulation(synchronous_config(config, 'CBBA'), seed=4)
+    for _ in range(5):
+        for agent in simulation.agents:
+            messages_received, agent.messages_received = agent.messages_received, []
+            agent.local_message_receive()
+            assert all(message is other.published_message for message, other in zip(agent.messages_received, agent.agents_nearby))
+            agent.messages_received = messages_received
+        simulation.step()
+        for agent in simulation.agents:  # Published at the end of the tick, as copies which the plugin cannot modify
+            assert agent.published_message == agent.message_to_share
+            assert agent.published_message is not agent.message_to_share
+
+
+@pytest.mark.parametrize('plugin', sorted(PLUGINS))
+def test_workers_give_the_results_of_a_single_process(config, plugin):
+    config['simulation']['max_simulation_time'] = 100
+    single_process = Simulation(synchronous_config(config, plugin), seed=6).run()
+    workers = Simulation(synchronous_config(config, plugin, workers=2), seed=6).run()
+    assert workers.workers is None  # Stopped by `run()`
+    assert outcome(workers) == outcome(single_process)
+
+
+def test_workers_need_synchronous_update(config):
+    config['simulation']['synchronous_update'] = {'enabled': False, 'workers': 2}
+    with pytest.raises(ValueError):
+        Simulation(config, seed=0)
+
+
+@pytest.mark.parametrize('plugin', sorted(PLUGINS))
+def test_spatial_shards_give_the_results_of_a_single_process(config, plugin):
+    config['agents']['quantity'] = 30
+    config['simulation']['max_simulation_time'] = 300
+    single_process = Simulation(synchronous_config(config, plugin), seed=5).run()
+    shards_config = synchronous_config(config, plugin, workers=3)
+    shards_config['simulation']['synchronous_update']['partition'] = 'Space'
+    shards = Simulation(shards_config, seed=5)
+    try:
+        while True:  # As `run()`, without closing the workers
+            time_over = shards.time_over
+            shards.step()
+            if time_over or shards.mission_completed:
+                break
+        assert shards.workers.migrations > 0  # Agents have crossed the borders of the regions, with their private state
+    finally:
+        shards.close()
+    assert outcome(shards) == outcome(single_process)